@@ -0,0 +1,21 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Benchmarks for mast_aladin, run with `asv <https://asv.readthedocs.io>`_::
+
+    asv run
+    asv run --python=same --quick  # against the current environment
+"""
+import tracemalloc
+
+
+def traced_peak_memory(func, *args, **kwargs):
+    """
+    Return the peak memory in bytes allocated by Python while calling
+    ``func``, as measured by `tracemalloc`.
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,208 @@
+"""
+Benchmarks of the footprint generation stack in
+`mast_aladin.utils.footprint_generator`.
+
+Every benchmark runs offline against the SIAF data bundled with pysiaf.
+``time_*`` methods track wall time and ``track_*_peak_memory`` methods the
+peak memory allocated by Python, as measured by `tracemalloc`.
+"""
+import os
+
+from astropy.coordinates import Angle
+import astropy.units as u
+
+from mast_aladin.utils.aperture_store import _load_aperture_store, build_aperture_store
+from mast_aladin.utils.footprint_generator import (
+    CustomPattern, DitherPattern, Exposure, Observation, Program, exp_list_to_table,
+)
+from mast_aladin.utils.selectSIAF import siaf_cache
+
+from . import traced_peak_memory
+
+TARGET_RA = Angle(80.5 * u.deg)
+TARGET_DEC = Angle(-69.5 * u.deg)
+
+# (telescope, instrument, aperture) of the exposures used below
+ROMAN_WFI = ('roman', 'WFI', 'ALL')
+ROMAN_WFI01 = ('roman', 'WFI', 'WFI01_FULL')
+JWST_NIRCAM = ('jwst', 'NIRCAM', 'ALL')
+
+STORE_FILE = 'apertures.npy'
+
+
+def _exposure(config, **kwargs):
+    telescope, instrument, aperture = config
+    return Exposure(TARGET_RA, TARGET_DEC, telescope=telescope, instrument=instrument,
+                    aperture=aperture, **kwargs)
+
+
+def _program(n_obs):
+    program = Program(1)
+    for i in range(n_obs):
+        observation = program.add_observation(Observation(pa=i % 360))
+        observation.add_exposure(_exposure(ROMAN_WFI))
+        observation.add_pattern(DitherPattern(_exposure(ROMAN_WFI01), 3, 3, 60, 0, 0, 60))
+        observation.add_pattern(CustomPattern(_exposure(JWST_NIRCAM), [(0, 0), (10, 10)]))
+    return program
+
+
+class SiafLoad:
+    """
+    Creating the first JWST NIRCam exposure, whose SIAF is the largest to
+    parse, with the SIAF parsed by pysiaf or read from the aperture store,
+    either cold or already cached.
+    """
+    params = (['pysiaf', 'store'], ['cold', 'warm'])
+    param_names = ['source', 'cache']
+    # cold loads must not be warmed up by asv
+    number = 1
+    repeat = 5
+    warmup_time = 0
+
+    def setup_cache(self):
+        build_aperture_store(STORE_FILE, siaf_names=('nircam',))
+        return os.path.abspath(STORE_FILE)
+
+    def setup(self, store_path, source, cache):
+        self.kwargs = {'aperture_store': store_path} if source == 'store' else {}
+        siaf_cache.clear()
+        _load_aperture_store.cache_clear()
+        if cache == 'warm':
+            _exposure(JWST_NIRCAM, **self.kwargs)
+
+    def time_exposure(self, store_path, source, cache):
+        _exposure(JWST_NIRCAM, **self.kwargs)
+
+    def track_exposure_peak_memory(self, store_path, source, cache):
+        return traced_peak_memory(_exposure, JWST_NIRCAM, **self.kwargs)
+    track_exposure_peak_memory.unit = 'bytes'
+
+
+class RomanWFIExposure:
+    """One Roman WFI 'ALL' exposure, which gives one row per detector."""
+
+    def setup(self):
+        self.exposure = _exposure(ROMAN_WFI)
+        self.exposure.get_exp_list()
+
+    def time_get_exp_list(self):
+        self.exposure.get_exp_list(pa=30)
+
+    def time_get_exp_table(self):
+        self.exposure.get_exp_table(pa=30)
+
+    def time_sweep_pa(self):
+        self.exposure.sweep_pa(range(360))
+
+    def track_get_exp_list_peak_memory(self):
+        return traced_peak_memory(self.exposure.get_exp_list, pa=30)
+    track_get_exp_list_peak_memory.unit = 'bytes'
+
+
+class DitherGrid:
+    """N x N dither grids of a single-detector exposure, up to 900 points."""
+    params = [10, 30]
+    param_names = ['n']
+
+    def setup(self, n):
+        self.exposure = _exposure(ROMAN_WFI01)
+        self.pattern = DitherPattern(self.exposure, n, n, 60, 0, 0, 60)
+
+    def time_pointings(self, n):
+        DitherPattern(self.exposure, n, n, 60, 0, 0, 60)
+
+    def time_get_exp_list(self, n):
+        self.pattern.get_exp_list()
+
+    def time_get_exp_table(self, n):
+        self.pattern.get_exp_table()
+
+    def track_get_exp_list_peak_memory(self, n):
+        return traced_peak_memory(self.pattern.get_exp_list)
+    track_get_exp_list_peak_memory.unit = 'bytes'
+
+    def track_get_exp_table_peak_memory(self, n):
+        return traced_peak_memory(self.pattern.get_exp_table)
+    track_get_exp_table_peak_memory.unit = 'bytes'
+
+
+class CustomPatternOffsets:
+    """A custom pattern of many offsets of a Roman WFI 'ALL' exposure."""
+    params = [100]
+    param_names = ['n_offsets']
+
+    def setup(self, n_offsets):
+        self.exposure = _exposure(ROMAN_WFI)
+        self.offsets = [(10 * i, -5 * i) for i in range(n_offsets)]
+        self.pattern = CustomPattern(self.exposure, self.offsets)
+
+    def time_pointings(self, n_offsets):
+        CustomPattern(self.exposure, self.offsets)
+
+    def time_get_exp_list(self, n_offsets):
+        self.pattern.get_exp_list()
+
+
+class MultiObservationProgram:
+    """Programs of observations mixing Roman and JWST exposures and patterns."""
+    params = [50]
+    param_names = ['n_obs']
+
+    def setup(self, n_obs):
+        self.program = _program(n_obs)
+
+    def time_get_exp_list(self, n_obs):
+        self.program.get_exp_list()
+
+    def time_get_exp_table(self, n_obs):
+        self.program.get_exp_table()
+
+    def time_iter_exposures(self, n_obs):
+        for _ in self.program.iter_exposures(chunk_size=1000):
+            pass
+
+    def track_get_exp_list_peak_memory(self, n_obs):
+        return traced_peak_memory(self.program.get_exp_list)
+    track_get_exp_list_peak_memory.unit = 'bytes'
+
+    def track_iter_exposures_peak_memory(self, n_obs):
+        def consume():
+            for _ in self.program.iter_exposures(chunk_size=1000):
+                pass
+        return traced_peak_memory(consume)
+    track_iter_exposures_peak_memory.unit = 'bytes'
+
+
+class ProgramWorkers:
+    """
+    Expanding the observations of a program in a pool of worker processes,
+    against the serial expansion (``workers=None``).
+    """
+    params = [None, 2]
+    param_names = ['workers']
+
+    def setup(self, workers):
+        self.program = _program(50)
+        self.program.get_exp_list()
+
+    def time_get_exp_list(self, workers):
+        self.program.get_exp_list(workers=workers)
+
+    def time_get_exp_table(self, workers):
+        self.program.get_exp_table(workers=workers)
+
+
+class ExpListToTable:
+    """Converting the exposure list of a program to an astropy Table."""
+    params = [50]
+    param_names = ['n_obs']
+
+    def setup(self, n_obs):
+        self.exp_list = _program(n_obs).get_exp_list()
+
+    def time_exp_list_to_table(self, n_obs):
+        exp_list_to_table(self.exp_list)
+
+    def track_exp_list_to_table_peak_memory(self, n_obs):
+        return traced_peak_memory(exp_list_to_table, self.exp_list)
+    track_exp_list_to_table_peak_memory.unit = 'bytes'
@@ -1,8 +1,19 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import itertools
+import logging
+import os
+import time
+
+from IPython.display import display
 from ipyaladin import Aladin
+from ipyaladin.widget import widget_should_be_loaded
 from mast_table import MastTable
 
 from astropy.coordinates import SkyCoord
 from astropy.io import fits
+from astropy.table import Table
 from regions import (
     PolygonSkyRegion
 )
@@ -10,7 +21,17 @@ from pathlib import Path
 from astropy.wcs import WCS
 
 from mast_aladin.aida import AID
+from mast_aladin.footprint_upload import FootprintUpload
 from mast_aladin.mixins import DelayUntilRendered
+from mast_aladin.utils.fits_ingest import (
+    SCALING_KEYWORDS, binned_wcs, block_mean, content_hash, image_payload, peak_rss,
+    progressive_factors, supports_payload,
+)
+from mast_aladin.utils.hips import HipsServer
+from mast_aladin.utils.resample import resample_to_linear
+from mast_aladin.utils.wcs_cache import gwcs_to_fits_header
+from mast_aladin.viewport_footprints import ViewportFootprints
+from mast_aladin.windowed_image import WindowedImage
 
 import roman_datamodels.datamodels as rdd
 
@@ -19,16 +40,116 @@ __all__ = [
     'gca',
 ]
 
+log = logging.getLogger(__name__)
+
+# numbers the image layers named by mast-aladin
+_image_layers = itertools.count(1)
+
 # store reference to the latest instantiation:
 _latest_instantiated_app = None
 
 
+def _read_fits(f, extension=1, memmap=True, undistort=False):
+    """
+    Read the image and WCS of a FITS file for `MastAladin.add_fits`.
+
+    Returns the data, the WCS without SIP, the scaling keywords of raw
+    data, and the file if it was opened here, else `None`.
+    """
+    is_path = isinstance(f, (Path, str))
+    if is_path:
+        fits_file = fits.open(f, memmap=memmap, do_not_scale_image_data=memmap)
+    else:
+        fits_file = f
+
+    try:
+        if len(fits_file) == 1:
+            extension = 0
+
+        hdu = fits_file[extension]
+        data = hdu.data
+        wcs = WCS(hdu.header)
+
+        if data is None:
+            raise ValueError(
+                f"No data in extension {extension}."
+            )
+
+        scaling = {
+            keyword: hdu.header[keyword]
+            for keyword in SCALING_KEYWORDS
+            if is_path and memmap and keyword in hdu.header
+        }
+
+        if undistort and data.ndim == 2 and wcs.has_distortion:
+            if scaling:
+                data = block_mean(data, 1, scaling)
+                scaling = {}
+            data, wcs = resample_to_linear(data, wcs)
+        else:
+            wcs.sip = None
+    except BaseException:
+        if is_path:
+            fits_file.close()
+        raise
+
+    return data, wcs, scaling, fits_file if is_path else None
+
+
+def _read_asdf(asdf, memmap=True, wcs_cache=True, fit_options=None):
+    """
+    Read the image and WCS of a Roman ASDF file for `MastAladin.add_asdf`,
+    returned as by `_read_fits`.
+    """
+    is_path = not isinstance(asdf, rdd.DataModel)
+    asdf_file = rdd.open(asdf, memmap=memmap) if is_path else asdf
+
+    try:
+        wcs = WCS(gwcs_to_fits_header(
+            asdf_file.meta.wcs, path=asdf if is_path else None, cache=wcs_cache,
+            **(fit_options or {})
+        ))
+        wcs.sip = None
+    except BaseException:
+        if is_path:
+            asdf_file.close()
+        raise
+
+    return asdf_file.data, wcs, {}, asdf_file if is_path else None
+
+
+def _is_asdf(image):
+    return isinstance(image, rdd.DataModel) or (
+        isinstance(image, (Path, str)) and Path(image).suffix.lower() == '.asdf'
+    )
+
+
+def _image_key(data, wcs_header, scaling, encoding, clip_percentiles, image_options):
+    """
+    Return the key of an image in `MastAladin._sent_images`: a hash of its
+    content and the options it is sent with, except its layer name.
+    """
+    return (
+        content_hash(data, wcs_header),
+        repr(sorted(scaling.items())), encoding, tuple(clip_percentiles),
+        repr(sorted((option, value) for option, value in image_options.items()
+                    if option != 'name')),
+    )
+
+
 class MastAladin(Aladin, DelayUntilRendered):
     """
     An Aladin-lite widget with enhanced support for
     datasets from `MAST <https://mast.stsci.edu/>`_, built on
     top of `ipyaladin.widget.Aladin`.
     """
+    # maximum number of images remembered by `add_fits` and `add_asdf`, to
+    # switch to their layer instead of sending them again
+    sent_images_maxsize = 32
+    # number of rows above which `load_table` only sends the footprints
+    # around the viewport, by default
+    viewport_culling_rows = 100_000
+
     def __init__(self, *args, **kwargs):
         # set ICRSd as the default visible coordinate system
         # in aladin-lite:
@@ -36,6 +157,15 @@ class MastAladin(Aladin, DelayUntilRendered):
 
         super().__init__(*args, **kwargs)
 
+        # layer names of the images sent to the widget, by content hash
+        self._sent_images = OrderedDict()
+        # servers of the local HiPS shown in the widget, by directory
+        self._hips_servers = {}
+        # the footprints sent by the last `load_table`, all of them or only
+        # the ones around the viewport
+        self.footprint_upload = None
+        self.viewport_footprints = None
+
         # the `aid` attribute gives access to methods from the
         # Astro Image Display (AID) API
         self.aid = AID(self)
@@ -50,8 +180,73 @@ class MastAladin(Aladin, DelayUntilRendered):
         table,
         load_footprints=True,
         update_viewport=True,
-        unique_column=None
+        unique_column=None,
+        chunk_size=1000,
+        show_progress=True,
+        collapse_duplicates=True,
+        viewport_culling=None,
+        lod=False,
+        max_vertices=100_000,
+        lod_fov=None,
     ):
+        """Show a table in a `~mast_table.MastTable` widget, and the
+        footprints in its ``s_region`` column in this widget.
+
+        Footprints are sent in overlays of ``chunk_size`` footprints: the
+        first one right away, and the others in the background, see
+        `~mast_aladin.footprint_upload.FootprintUpload`. The upload is kept
+        as the ``footprint_upload`` attribute, e.g. to cancel it, or to find
+        the footprint of a row when rows with the same footprint are only
+        drawn once. With ``viewport_culling``, only the footprints around
+        the viewport are sent, and updated when the view changes, see
+        `~mast_aladin.viewport_footprints.ViewportFootprints`, kept as the
+        ``viewport_footprints`` attribute. With ``lod``, they are summarized
+        by the HEALPix cells they cover when the view is too wide to draw
+        them. The footprints of the previous table are removed, and their
+        upload cancelled.
+
+        Parameters
+        ----------
+        table : `~astropy.table.Table`
+            The table.
+        load_footprints : bool, optional
+            If `True` (default), show the footprints of the table.
+        update_viewport : bool, optional
+            If `True` (default), move the view to the rows selected in the
+            table widget.
+        unique_column : str, optional
+            Column identifying the rows of the table.
+        chunk_size : int, optional
+            Number of footprints per overlay. Defaults to 1000.
+        show_progress : bool, optional
+            If `True` (default), display a progress bar of the footprints
+            sent, if there is more than one chunk.
+        collapse_duplicates : bool, optional
+            If `True` (default), draw the footprints shared by several rows,
+            to 1e-5 degrees, once.
+        viewport_culling : bool, optional
+            If `True`, only send the footprints around the viewport. Defaults
+            to `None`, which culls the footprints of tables with more than
+            ``viewport_culling_rows`` rows, 100000 by default, unless they
+            cannot be parsed, or with ``lod``.
+        lod : bool, optional
+            If `True`, draw the coverage of the footprints instead of the
+            footprints in wide views. Requires astropy-healpix. Defaults to
+            False.
+        max_vertices : int, optional
+            Maximum number of vertices drawn at once with ``lod``. Defaults to
+            100000.
+        lod_fov : float, optional
+            Size of the view in degrees, along its diagonal, above which the
+            coverage is always drawn with ``lod``. Defaults to `None`, which
+            only draws the coverage of views with more than ``max_vertices``
+            vertices.
+
+        Returns
+        -------
+        `~mast_table.MastTable`
+            The table widget, usable while the footprints are being sent.
+        """
         table_widget = MastTable(
             table,
             app=self,
@@ -61,7 +256,11 @@ class MastAladin(Aladin, DelayUntilRendered):
 
         if load_footprints:
             if 's_region' in table.colnames:
-                self.add_graphic_overlay_from_stcs(table['s_region'])
+                self._load_footprints(
+                    table['s_region'], chunk_size, show_progress, viewport_culling,
+                    collapse_duplicates=collapse_duplicates,
+                    lod_options=dict(lod=lod, max_vertices=max_vertices, lod_fov=lod_fov),
+                )
             else:
                 raise ValueError(
                     "The table does not contain an `s_region` column, so no "
@@ -70,45 +269,126 @@ class MastAladin(Aladin, DelayUntilRendered):
 
         return table_widget
 
+    def _load_footprints(
+            self, s_region, chunk_size, show_progress, viewport_culling,
+            collapse_duplicates, lod_options
+            ):
+        if lod_options['lod'] and viewport_culling is False:
+            raise ValueError("Footprints can only be summarized with `viewport_culling`.")
+        if self.footprint_upload is not None:
+            self.footprint_upload.cancel(remove=True)
+            self.footprint_upload = None
+        if self.viewport_footprints is not None:
+            self.viewport_footprints.close(remove=True)
+            self.viewport_footprints = None
+
+        culling_by_default = viewport_culling is None and not lod_options['lod']
+        if viewport_culling is None:
+            viewport_culling = lod_options['lod'] or len(s_region) > self.viewport_culling_rows
+        if viewport_culling:
+            try:
+                self.viewport_footprints = ViewportFootprints(
+                    self, s_region, collapse_duplicates=collapse_duplicates, **lod_options
+                )
+                return
+            except ValueError as err:
+                if not culling_by_default:
+                    raise
+                log.warning("Sending all footprints, which cannot be indexed: %s", err)
+
+        self.footprint_upload = FootprintUpload(
+            self, s_region, chunk_size=chunk_size, collapse_duplicates=collapse_duplicates
+        )
+        if show_progress and self.footprint_upload.progress.max > chunk_size:
+            display(self.footprint_upload.progress)
+
     def add_asdf(
-        self, asdf, **image_options
+        self, asdf, memmap=True, progressive=False, preview_size=512, windowed=False,
+        encoding=None, clip_percentiles=(0.5, 99.5), wcs_cache=True, fit_options=None,
+        reload=False, **image_options
     ):
         """Load an ASDF image into the widget.
 
+        Files are opened lazily: only the WCS and the blocks of the image
+        data are read, and with ``memmap``, only the parts of the image
+        data that are sent. Files opened here are closed once the image is
+        sent, or when the windowed image is closed.
+
+        The FITS WCS sent with the image is fitted to the GWCS of the image
+        by `gwcs.wcs.WCS.to_fits`, and cached on disk, see
+        `~mast_aladin.utils.wcs_cache`.
+
         Parameters
         ----------
         asdf : Union[str or Path-like, rdd]
             The ASDF image to load in the widget. It can be given as a path (either a
             string or as a `roman_datamodels.datamodels._datamodels.ImageModel`).
+        memmap : bool, optional
+            If `True` (default), memory-map the image data of files given as
+            a path, and copy the image once, straight into the message sent
+            to the widget, see `add_fits`.
+        progressive : bool, optional
+            If `True`, load the image progressively, see `add_fits`.
+        preview_size : int, optional
+            Maximum size in pixels of the first level of a progressive load.
+        windowed : bool, optional
+            If `True`, only send cutouts of the current viewport, see
+            `add_fits`.
+        encoding : {'float32', 'int16', 'uint8'}, optional
+            Reduced precision encoding of the image, see `add_fits`.
+        clip_percentiles : tuple of float, optional
+            Clipping percentiles of the integer encodings, see `add_fits`.
+        wcs_cache : bool or `~mast_aladin.utils.wcs_cache.FitsHeaderCache`, optional
+            Cache of the FITS WCS. `True` (default) uses the default cache,
+            `False` fits the GWCS again.
+        fit_options : dict, optional
+            Keyword arguments of `gwcs.wcs.WCS.to_fits`, e.g. ``degree`` or
+            ``npoints``, to control the fit of the FITS WCS.
+        reload : bool, optional
+            If `True`, send the image even if it is already in its layer, see
+            `add_fits`.
         image_options : any
             The options for the image. See the `Aladin Lite image options
             <https://cds-astro.github.io/aladin-lite/global.html#ImageOptions>`_
 
+        Returns
+        -------
+        `~mast_aladin.windowed_image.WindowedImage` or None
+            The windowed image, if ``windowed`` is `True`.
         """
-        if isinstance(asdf, rdd._datamodels.ImageModel):
-            asdf_file = asdf
-        else:
-            asdf_file = rdd.open(asdf)
-
-        wcs_header = fits.Header(asdf_file.meta.wcs.to_fits()[0])
-
-        hdu_list = fits.HDUList(
-            [
-                fits.PrimaryHDU(header=wcs_header),
-                fits.ImageHDU(
-                    header=wcs_header,
-                    data=asdf_file.data
-                )
-            ]
+        data, wcs, scaling, asdf_file = _read_asdf(
+            asdf, memmap=memmap, wcs_cache=wcs_cache, fit_options=fit_options
         )
 
-        self.add_fits(hdu_list, **image_options)
+        try:
+            windowed_image = self._add_image(
+                data, wcs, scaling, image_options, memmap=memmap,
+                progressive=progressive, preview_size=preview_size,
+                windowed=windowed, encoding=encoding, clip_percentiles=clip_percentiles,
+                file=asdf_file, reload=reload,
+            )
+            if windowed:
+                # the file is closed with the windowed image
+                asdf_file = None
+            return windowed_image
+        finally:
+            # only close files opened here
+            if asdf_file is not None:
+                asdf_file.close()
 
     def add_fits(
-        self, f, extension=1, **image_options
+        self, f, extension=1, memmap=True, progressive=False, preview_size=512,
+        windowed=False, undistort=False, encoding=None, clip_percentiles=(0.5, 99.5),
+        reload=False, **image_options
     ):
         """Load a FITS image into the widget.
 
+        The widget remembers the last ``sent_images_maxsize`` images sent
+        to it, by a hash of their WCS and data. An image that is still in
+        its layer is not sent again with the same options, unless
+        ``reload`` is `True`: the view only moves to it, as when it is
+        loaded.
+
         Parameters
         ----------
         f : Union[str, Path, HDUList]
@@ -116,35 +396,349 @@ class MastAladin(Aladin, DelayUntilRendered):
             string or a `pathlib.Path` object), or as an `astropy.io.fits.HDUList`.
         extension: int, optional
             FITS extension containing the image data to load. Default is 1.
+        memmap : bool, optional
+            If `True` (default), memory-map FITS files given as a path and
+            copy the image once, straight into the message sent to the
+            widget. Integer images are sent unscaled with their BSCALE/BZERO
+            keywords. The size of the message and the peak resident memory
+            of the kernel are logged at the INFO level. If `False`, read the
+            image in full and serialize it with `ipyaladin`.
+        progressive : bool, optional
+            If `True`, first send a preview of the image binned by block
+            means to at most ``preview_size`` pixels along each axis, with a
+            correspondingly scaled WCS, then levels of twice the resolution
+            of the previous one up to the full resolution image. Each level
+            replaces the previous one in the same image layer. Default is
+            `False`.
+        preview_size : int, optional
+            Maximum size in pixels of the first level of a progressive load.
+            Default is 512.
+        windowed : bool, optional
+            If `True`, only send a cutout of the 2D image around the current
+            viewport, binned to about the resolution of the screen, and send
+            a new cutout whenever the view changes, see
+            `~mast_aladin.windowed_image.WindowedImage`. Files given as a
+            path are kept open until the returned object is closed. Default
+            is `False`.
+        undistort : bool, optional
+            Aladin Lite does not support distortions of the WCS (SIP), which
+            are dropped by default, so that overlays are misregistered on
+            distorted images. If `True`, 2D images with distortions are
+            instead resampled onto the grid of their WCS without
+            distortions, see `~mast_aladin.utils.resample.resample_to_linear`.
+            The pixel mappings of the last two distorted images are kept in
+            `~mast_aladin.utils.resample.mapping_cache`, e.g. 128 MB each
+            for 4k x 4k images, until freed with ``mapping_cache.clear()``.
+            Default is `False`.
+        encoding : {'float32', 'int16', 'uint8'}, optional
+            Send the image at a reduced precision, for visual browsing:
+            as float32, or as int16 or uint8 codes of the values between
+            ``clip_percentiles`` with BSCALE/BZERO keywords and NaN pixels
+            as BLANK. The bytes saved are logged at the INFO level. By
+            default, the image is sent with its own data type.
+        clip_percentiles : tuple of float, optional
+            Percentiles of the image clipped by the int16 and uint8
+            encodings. Default is ``(0.5, 99.5)``.
+        reload : bool, optional
+            If `True`, send the image even if it is already in its layer.
+            Default is `False`.
         image_options : any
             The options for the image. See the `Aladin Lite image options
             <https://cds-astro.github.io/aladin-lite/global.html#ImageOptions>`_
 
+        Returns
+        -------
+        `~mast_aladin.windowed_image.WindowedImage` or None
+            The windowed image, if ``windowed`` is `True`.
         """
 
         # Wraps add_fits in ipyaladin to temporarily handle SIP.
         # See ipyaladin for definitions of parameters.
 
-        is_path = isinstance(f, (Path, str))
-        if is_path:
-            fits_file = fits.open(f)
-        else:
-            fits_file = f
+        data, wcs, scaling, fits_file = _read_fits(
+            f, extension=extension, memmap=memmap, undistort=undistort
+        )
 
-        if len(fits_file) == 1:
-            extension = 0
+        try:
+            windowed_image = self._add_image(
+                data, wcs, scaling, image_options, memmap=memmap,
+                progressive=progressive, preview_size=preview_size,
+                windowed=windowed, encoding=encoding, clip_percentiles=clip_percentiles,
+                file=fits_file, reload=reload,
+            )
+            if windowed:
+                # the file is closed with the windowed image
+                fits_file = None
+            return windowed_image
+        finally:
+            # only close files opened here
+            if fits_file is not None:
+                fits_file.close()
+
+    def add_images(
+        self, images, workers=None, names=None, extension=1, memmap=True,
+        undistort=False, encoding=None, clip_percentiles=(0.5, 99.5), wcs_cache=True,
+        fit_options=None, reload=False, **image_options
+    ):
+        """Load several FITS and ASDF images into the widget, e.g. the
+        exposures of an association or the detectors of a visit.
 
-        data = fits_file[extension].data
-        wcs = WCS(fits_file[extension].header)
+        The images are read, and their messages to the widget serialized, by
+        a pool of threads, while the images already prepared are sent in the
+        order of ``images``, so that their layers are stacked in that order.
+        Loading takes about the time of the slowest image when there are as
+        many ``workers`` as images. The timings of every image are logged at
+        the INFO level and returned.
 
-        if data is None:
+        Parameters
+        ----------
+        images : list
+            The images to load: FITS images given as a path or as an
+            `astropy.io.fits.HDUList`, and ASDF images given as a path with an
+            ``.asdf`` suffix or as a `roman_datamodels.datamodels.DataModel`.
+        workers : int, optional
+            Number of threads. Defaults to the number of CPUs, and at most
+            the number of images.
+        names : list of str, optional
+            Names of the image layers, one per image. Defaults to
+            ``image_NNN``, as do `None` names.
+        extension : int, optional
+            FITS extension containing the image data, see `add_fits`.
+        memmap : bool, optional
+            If `True` (default), memory-map files given as a path, see
+            `add_fits`.
+        undistort : bool, optional
+            Resample distorted FITS images onto a linear grid, see `add_fits`.
+        encoding : {'float32', 'int16', 'uint8'}, optional
+            Reduced precision encoding of the images, see `add_fits`.
+        clip_percentiles : tuple of float, optional
+            Clipping percentiles of the integer encodings, see `add_fits`.
+        wcs_cache : bool or `~mast_aladin.utils.wcs_cache.FitsHeaderCache`, optional
+            Cache of the FITS WCS of ASDF images, see `add_asdf`.
+        fit_options : dict, optional
+            Options of the fit of the FITS WCS of ASDF images, see `add_asdf`.
+        reload : bool, optional
+            If `True`, send the images even if they are already in their
+            layers, see `add_fits`.
+        image_options : any
+            The options for every image. See the `Aladin Lite image options
+            <https://cds-astro.github.io/aladin-lite/global.html#ImageOptions>`_
+
+        Returns
+        -------
+        `~astropy.table.Table`
+            One row per image, with the ``layer`` it was sent to, the time in
+            seconds spent to ``read`` it (including the WCS conversions), to
+            ``prepare`` its messages and to ``send`` them, and their size in
+            ``bytes``, 0 for images already in their layer.
+        """
+        images = list(images)
+        if names is not None and len(names) != len(images):
             raise ValueError(
-                f"No data in extension {extension}."
+                f"Got {len(names)} layer names for {len(images)} images."
             )
+        workers = min(workers or os.cpu_count(), max(len(images), 1))
+
+        def image_options_of(index):
+            options = dict(image_options)
+            if names is not None and names[index] is not None:
+                options['name'] = names[index]
+            return options
+
+        def prepare(index, check_sent=True):
+            image = images[index]
+            start = time.perf_counter()
+            if _is_asdf(image):
+                data, wcs, scaling, file = _read_asdf(
+                    image, memmap=memmap, wcs_cache=wcs_cache, fit_options=fit_options
+                )
+            else:
+                data, wcs, scaling, file = _read_fits(
+                    image, extension=extension, memmap=memmap, undistort=undistort
+                )
+            read = time.perf_counter()
 
-        wcs.sip = None
+            try:
+                wcs_header = wcs.to_header()
+                image_key = _image_key(
+                    data, wcs_header, scaling, encoding, clip_percentiles, image_options
+                )
+                # images already in the widget are only sent if they are
+                # replaced by the time their turn comes, see below
+                payloads = None
+                if not (check_sent and self._shown_layer(
+                        image_key, image_options_of(index), reload) is not None):
+                    payloads = list(self._image_payloads(
+                        data, wcs, wcs_header, scaling, memmap=memmap, encoding=encoding,
+                        clip_percentiles=clip_percentiles,
+                    ))
+                shape = data.shape
+            finally:
+                if file is not None:
+                    file.close()
+            return image_key, shape, wcs, payloads, read - start, time.perf_counter() - read
+
+        timings = Table(
+            names=['image', 'layer', 'read', 'prepare', 'send', 'bytes'],
+            dtype=[str, str, float, float, float, int],
+        )
+        executor = ThreadPoolExecutor(workers)
+        try:
+            # the images are sent in order, each as soon as it is prepared,
+            # and at most `workers` images are prepared ahead of the one
+            # being sent, to bound the memory held by their payloads
+            pending = deque(executor.submit(prepare, index) for index in range(workers))
+            for index, image in enumerate(images):
+                prepared = pending.popleft().result()
+                if index + workers < len(images):
+                    pending.append(executor.submit(prepare, index + workers))
+
+                image_key, shape, wcs, payloads, read, prepare_time = prepared
+                options = image_options_of(index)
+                if payloads is None and self._shown_layer(image_key, options, reload) is None:
+                    # replaced by an image sent since it was prepared
+                    image_key, shape, wcs, payloads, read, prepare_time = prepare(
+                        index, check_sent=False
+                    )
+
+                start = time.perf_counter()
+                layer = self._send_image(image_key, shape, wcs, payloads or [], options, reload)
+                send = time.perf_counter() - start
+
+                label = str(image) if isinstance(image, (Path, str)) else type(image).__name__
+                n_bytes = sum(len(payload) for payload in payloads or [])
+                log.info(
+                    "Loaded %s in layer %s: read in %.3f s, prepared in %.3f s, "
+                    "sent in %.3f s (%d bytes)",
+                    label, layer, read, prepare_time, send, n_bytes
+                )
+                timings.add_row([label, layer, read, prepare_time, send, n_bytes])
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+        return timings
+
+    def add_hips(self, hips, overlay=True, url=None):
+        """Show a local HiPS in the widget, e.g. a mosaic built by
+        `~mast_aladin.utils.hips.HipsBuilder`.
+
+        The HiPS directory is served over HTTP from the kernel by a
+        `~mast_aladin.utils.hips.HipsServer`, started on the first call for
+        each directory, and Aladin Lite streams the tiles of the current
+        view from it.
+
+        Parameters
+        ----------
+        hips : str, Path or `~mast_aladin.utils.hips.HipsBuilder`
+            The HiPS directory, or its builder.
+        overlay : bool, optional
+            If `True` (default), show the HiPS as the overlay survey, above
+            the base survey, otherwise as the base survey.
+        url : str, optional
+            URL of the HiPS for the browser, if the server is exposed through
+            a proxy, see `~mast_aladin.utils.hips.HipsServer`.
+
+        Returns
+        -------
+        `~mast_aladin.utils.hips.HipsServer`
+        """
+        directory = Path(getattr(hips, 'directory', hips)).resolve()
+        if not (directory / 'properties').exists():
+            raise ValueError(f"{directory} does not contain a HiPS.")
+
+        server = self._hips_servers.get(directory)
+        if server is None:
+            server = self._hips_servers[directory] = HipsServer(directory, url=url)
+
+        if overlay:
+            self.overlay_survey = server.url
+        else:
+            self.survey = server.url
+        return server
+
+    def remove_hips(self, hips):
+        """Stop serving a local HiPS shown by `add_hips`.
+
+        The servers of all the HiPS are also stopped when the widget is
+        closed.
+
+        Parameters
+        ----------
+        hips : str, Path or `~mast_aladin.utils.hips.HipsBuilder`
+            The HiPS directory, or its builder.
+        """
+        directory = Path(getattr(hips, 'directory', hips)).resolve()
+        server = self._hips_servers.pop(directory, None)
+        if server is None:
+            raise ValueError(f"The HiPS in {directory} is not served by this widget.")
+        server.close()
+
+    def close(self):
+        for server in self._hips_servers.values():
+            server.close()
+        self._hips_servers.clear()
+        super().close()
+
+    def _add_image(
+        self, data, wcs, scaling, image_options, memmap=True, progressive=False,
+        preview_size=512, windowed=False, encoding=None, clip_percentiles=(0.5, 99.5),
+        file=None, reload=False
+    ):
+        """
+        Send an image read by `add_fits` or `add_asdf`, in the mode requested
+        by their arguments. ``file`` is the open file of ``data``, kept open
+        by windowed images only.
+        """
+        if windowed:
+            return WindowedImage(
+                self, data, wcs, scaling, image_options, encoding=encoding,
+                clip_percentiles=clip_percentiles, file=file,
+            )
 
         wcs_header = wcs.to_header()
+        image_key = _image_key(
+            data, wcs_header, scaling, encoding, clip_percentiles, image_options
+        )
+        # payloads are only built if the image is sent
+        payloads = self._image_payloads(
+            data, wcs, wcs_header, scaling, memmap=memmap, progressive=progressive,
+            preview_size=preview_size, encoding=encoding,
+            clip_percentiles=clip_percentiles,
+        )
+        self._send_image(image_key, data.shape, wcs, payloads, image_options, reload)
+
+    def _image_payloads(
+        self, data, wcs, wcs_header, scaling, memmap=True, progressive=False,
+        preview_size=512, encoding=None, clip_percentiles=(0.5, 99.5)
+    ):
+        """
+        Yield the FITS payloads sent for an image: the levels of a
+        progressive load, or the full image.
+        """
+        if encoding is not None or ((memmap or progressive) and supports_payload(data)):
+            factors = [1]
+            # levels sent before the widget is loaded would all be
+            # queued, so only the full image is sent then
+            if progressive and data.ndim == 2 and getattr(self, '_is_loaded', False):
+                factors = progressive_factors(data.shape, preview_size)
+
+            for factor in factors:
+                if factor == 1:
+                    payload = image_payload(
+                        data, wcs_header, scaling, encoding, clip_percentiles
+                    )
+                else:
+                    payload = image_payload(
+                        block_mean(data, factor, scaling),
+                        binned_wcs(wcs, factor).to_header(),
+                        encoding=encoding, percentiles=clip_percentiles,
+                    )
+                log.info(
+                    "Serialized a %d-byte FITS image binned by %d, peak RSS %s bytes",
+                    len(payload), factor, peak_rss()
+                )
+                yield payload
+            return
 
         hdu_list = fits.HDUList(
             [
@@ -155,8 +749,75 @@ class MastAladin(Aladin, DelayUntilRendered):
                 )
             ]
         )
+        # serialized as by ipyaladin's add_fits
+        fits_bytes = io.BytesIO()
+        hdu_list.writeto(fits_bytes)
+        yield fits_bytes.getvalue()
 
-        super().add_fits(hdu_list, **image_options)
+    def _send_image(self, image_key, shape, wcs, payloads, image_options, reload=False):
+        """
+        Send the ``payloads`` of an image to its layer, unless the image
+        with key ``image_key`` is already in it, and return the layer name.
+        With ``reload``, the image is sent again to the layer it is in.
+        """
+        layer = self._shown_layer(image_key, image_options, reload)
+        if layer is not None:
+            log.info("The image is already in layer %s, not sending it again", layer)
+            self._sent_images.move_to_end(image_key)
+            self._goto_image(shape, wcs)
+            return layer
+        if reload and image_key in self._sent_images:
+            # reloaded in the layer it is in
+            image_options.setdefault('name', self._sent_images[image_key])
+
+        # the layer is named here so that the image can be found in it
+        image_options.setdefault('name', f'image_{next(_image_layers):03d}')
+        self._forget_layer(image_options['name'])
+
+        for payload in payloads:
+            self._send_fits_payload(payload, image_options)
+        self._remember_image(image_key, image_options['name'])
+        return image_options['name']
+
+    def _shown_layer(self, image_key, image_options, reload=False):
+        """
+        Return the layer of the image with key ``image_key``, if it is in
+        the layer it would be sent to with ``image_options`` and ``reload``
+        is `False`, otherwise `None`.
+        """
+        layer = self._sent_images.get(image_key)
+        if reload or layer is None or image_options.get('name', layer) != layer:
+            return None
+        return layer
+
+    def _remember_image(self, image_key, layer):
+        self._sent_images[image_key] = layer
+        while len(self._sent_images) > self.sent_images_maxsize:
+            self._sent_images.popitem(last=False)
+
+    def _forget_layer(self, layer):
+        # drop the images replaced in, or removed with, a layer
+        for image_key in [key for key, name in self._sent_images.items() if name == layer]:
+            del self._sent_images[image_key]
+
+    def _goto_image(self, shape, wcs):
+        # the view moves to the center of the image when it is loaded
+        if getattr(self, '_is_loaded', False):
+            center = wcs.pixel_to_world_values((shape[-1] - 1) / 2, (shape[-2] - 1) / 2)
+            self.target = SkyCoord(*center, unit='deg')
+
+    def handle_overlay_removed(self, overlay_name):
+        super().handle_overlay_removed(overlay_name)
+        self._forget_layer(overlay_name)
+
+    @widget_should_be_loaded
+    def _send_fits_payload(self, payload, image_options):
+        # the same message as ipyaladin's add_fits, with a prebuilt payload
+        self._wcs = {}
+        self.send(
+            {"event_name": "add_fits", "options": image_options},
+            buffers=[payload],
+        )
 
     def get_viewport_region(self, center=False):
         """Return a `regions.PolygonSkyRegion` representing the perimeter of the
@@ -4,12 +4,30 @@ from astropy.table import Table
 from mast_aladin import MastAladin
 import jdaviz
 
+from mast_aladin.utils.wcs_cache import fits_header_cache
+
+
+@pytest.fixture(autouse=True)
+def wcs_cache_dir(tmp_path, monkeypatch):
+    # keep the FITS WCS headers cached by tests out of the user cache
+    monkeypatch.setattr(fits_header_cache, 'directory', tmp_path / 'wcs_headers')
+    return fits_header_cache.directory
+
 
 @pytest.fixture
 def MastAladin_app():
     return MastAladin()
 
 
+@pytest.fixture
+def sent(MastAladin_app):
+    """The (message, buffers) sent by ``MastAladin_app``, marked as loaded."""
+    sent = []
+    MastAladin_app._is_loaded = True
+    MastAladin_app.send = lambda message, buffers=None: sent.append((message, buffers))
+    return sent
+
+
 @pytest.fixture
 def imviz_helper():
     return jdaviz.gca()
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+
+import ipywidgets
+import numpy as np
+
+from mast_aladin.utils.footprint_array import FootprintArray
+from mast_aladin.windowed_image import _call_later
+
+__all__ = [
+    'FootprintUpload',
+]
+
+log = logging.getLogger(__name__)
+
+
+class FootprintUpload:
+    """
+    Footprints sent to a mast-aladin widget in chunks, in the background.
+
+    Each chunk of ``chunk_size`` STC-S strings is sent as its own overlay
+    layer, in a message small enough for the widget to draw without
+    freezing the browser. The first chunk is sent when the upload is
+    created, and the others ``delay`` seconds apart by the IO loop of the
+    kernel, which also sends the other messages of the widget, so that the
+    kernel and the widget stay responsive in between. Instances are created
+    by `~mast_aladin.MastAladin.load_table`.
+
+    Rows with the same footprint, such as the products of one observation
+    in several filters, can be drawn once: see
+    `~mast_aladin.utils.footprint_array.FootprintArray.unique`. The
+    ``row_footprints`` attribute then maps each row to the footprint drawn
+    for it, so that the footprint of a row, and the rows of a footprint, can
+    still be found with `row_overlay` and `footprint_rows`.
+
+    Parameters
+    ----------
+    aladin : `~mast_aladin.MastAladin`
+        The widget the footprints are sent to.
+    stcs : sequence of str or `~mast_aladin.utils.footprint_array.FootprintArray`
+        The STC-S strings of the footprints. Footprint arrays are formatted
+        to STC-S in bulk when the upload is created.
+    chunk_size : int, optional
+        Number of footprints per overlay layer. Defaults to 1000.
+    delay : float, optional
+        Time in seconds between chunks. Defaults to 0.05.
+    name : str, optional
+        Name of the first overlay layer; the next ones are suffixed with
+        ``_1``, ``_2``, etc. Defaults to ``footprints``.
+    overlay_options : dict, optional
+        The overlay options of the footprints. See `Aladin Lite's graphic
+        overlay options <https://cds-astro.github.io/aladin-lite/A.html>`_
+    collapse_duplicates : bool, optional
+        If `True`, draw the footprints of rows with the same footprint once.
+        Defaults to False.
+    tolerance : float, optional
+        Rounding of the coordinates in degrees when comparing footprints.
+        Defaults to 1e-5 degrees.
+    """
+
+    def __init__(
+            self, aladin, stcs, chunk_size=1000, delay=0.05, name='footprints',
+            overlay_options=None, collapse_duplicates=False, tolerance=1e-5
+            ):
+        if chunk_size < 1:
+            raise ValueError(f"The chunk size must be positive, got {chunk_size}.")
+
+        self.n_rows = len(stcs)
+        self.row_footprints = np.arange(self.n_rows)
+        if collapse_duplicates:
+            stcs = self._collapse_duplicates(stcs, tolerance)
+        if isinstance(stcs, FootprintArray):
+            stcs = stcs.to_stcs()
+
+        self.aladin = aladin
+        self.stcs = stcs
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.name = name
+        self.overlay_options = dict(overlay_options or {})
+        self.overlays = []
+
+        self.progress = ipywidgets.IntProgress(
+            value=0, min=0, max=len(stcs), description='Footprints:'
+        )
+        self._start_time = time.perf_counter()
+        # set when all footprints are sent, or the upload is cancelled or fails
+        self._finished = threading.Event()
+        # held while a chunk is sent, outside of a kernel the chunks are sent
+        # by timer threads
+        self._lock = threading.Lock()
+        self._timer = None
+        self._next_start = 0
+
+        self._send_next()
+
+    def _collapse_duplicates(self, stcs, tolerance):
+        try:
+            footprints = stcs if isinstance(stcs, FootprintArray) else (
+                FootprintArray.from_stcs(stcs)
+            )
+        except ValueError as err:
+            log.warning("Footprints are not collapsed: %s", err)
+            return stcs
+
+        rows, self.row_footprints = footprints.unique(tolerance)
+        log.info("Collapsed %d footprints into %d", self.n_rows, len(rows))
+        if isinstance(stcs, FootprintArray):
+            return stcs.take(rows)
+        return np.asarray(stcs)[rows]
+
+    def footprint_rows(self, footprint):
+        """Return the indices of the rows drawn with the footprint ``footprint``."""
+        return np.flatnonzero(self.row_footprints == footprint)
+
+    def row_overlay(self, row):
+        """
+        Return the name of the overlay layer with the footprint of row
+        ``row``, or `None` if it was not sent yet.
+        """
+        chunk = self.row_footprints[row] // self.chunk_size
+        return self.overlays[chunk] if chunk < len(self.overlays) else None
+
+    @property
+    def n_sent(self):
+        """Number of footprints sent."""
+        return self.progress.value
+
+    @property
+    def done(self):
+        """Whether all footprints were sent, or the upload was cancelled."""
+        return self._finished.is_set()
+
+    def _send_chunk(self, start):
+        stop = min(start + self.chunk_size, len(self.stcs))
+        if start >= stop:
+            return
+
+        # the overlay layers of the chunks are named here, so that none of
+        # them triggers a warning about names already in use
+        name = self.aladin._overlay_manager.make_unique_name(self.name)
+        overlay = self.aladin.add_graphic_overlay_from_stcs(
+            [str(stcs) for stcs in self.stcs[start:stop]],
+            **dict(self.overlay_options, name=name)
+        )
+        self.overlays.append(overlay.name)
+        self.progress.value = stop
+
+    def _send_next(self):
+        """Send the next chunk, and schedule the one after it."""
+        with self._lock:
+            if self.done:
+                return
+            try:
+                self._send_chunk(self._next_start)
+            except Exception:
+                # the IO loop would otherwise only log the error
+                self.progress.bar_style = 'danger'
+                log.exception(
+                    "Failed to send footprints after %d of %d", self.n_sent, len(self.stcs)
+                )
+                self._finished.set()
+                return
+
+            self._next_start += self.chunk_size
+            if self._next_start < len(self.stcs):
+                self._timer = _call_later(self.delay, self._send_next)
+                return
+
+            self.progress.bar_style = 'success'
+            log.info(
+                "Sent %d footprints in %d overlays in %.2f s",
+                len(self.stcs), len(self.overlays), time.perf_counter() - self._start_time
+            )
+            self._finished.set()
+
+    def wait(self, timeout=None):
+        """
+        Send the remaining footprints right away, until all of them are sent
+        or the upload is cancelled, for at most ``timeout`` seconds.
+
+        The chunks are otherwise sent by the IO loop of the kernel, which
+        only runs between the executions of the cells, so they cannot be
+        waited for from a cell.
+
+        Returns
+        -------
+        bool
+            Whether the upload is done.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.done and (deadline is None or time.perf_counter() < deadline):
+            if self._timer is not None:
+                self._timer.cancel()
+            self._send_next()
+        return self.done
+
+    def cancel(self, remove=False):
+        """
+        Stop sending footprints.
+
+        Parameters
+        ----------
+        remove : bool, optional
+            If `True`, also remove the overlay layers already sent.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            if not self.done:
+                self.progress.bar_style = 'warning'
+                log.info(
+                    "Cancelled the upload of footprints after %d of %d",
+                    self.n_sent, len(self.stcs)
+                )
+                self._finished.set()
+
+        if remove:
+            overlays = [name for name in self.overlays if name in self.aladin._overlay_manager]
+            if overlays:
+                self.aladin.remove_overlay(overlays)
+            self.overlays = []
+
+    def _repr_mimebundle_(self, **kwargs):
+        # shown as the progress bar in notebooks
+        return self.progress._repr_mimebundle_(**kwargs)
@@ -1,3 +1,5 @@
+import io
+import os
 import pytest
 import warnings
 
@@ -6,6 +8,8 @@ import astropy.units as u
 from astropy.modeling import models
 from gwcs import coordinate_frames as cf, wcs as gwcs_wcs
 from astropy.coordinates import ICRS
+from astropy.io import fits
+from astropy.wcs import WCS
 
 
 def create_example_gwcs(shape):
@@ -98,3 +102,54 @@ def test_image_options(MastAladin_app, roman_imagemodel):
     with warnings.catch_warnings(record=True) as w:
         MastAladin_app.add_asdf(roman_imagemodel, name="test", colormap="viridis")
         assert len(w) == 0
+
+
+def open_files():
+    return [os.path.realpath(f'/proc/self/fd/{fd}') for fd in os.listdir('/proc/self/fd')]
+
+
+@pytest.mark.parametrize('windowed', [False, True])
+def test_add_asdf_path(MastAladin_app, tmp_path, windowed, sent):
+    """Test add_asdf sends the image of a file and closes the file."""
+    path = tmp_path / 'image.asdf'
+    model = create_wfi_image_model((40, 30))
+    model.data = np.arange(40 * 30, dtype=np.float32).reshape(40, 30)
+    model.save(path)
+
+    if windowed:
+        # a viewport showing the whole image on a larger screen
+        viewport_wcs = WCS(fits.Header(model.meta.wcs.to_fits()[0]))
+        viewport_wcs.wcs.crpix = viewport_wcs.wcs.crpix + [15, 20]
+        MastAladin_app._wcs = dict(viewport_wcs.to_header(), NAXIS=2, NAXIS1=60, NAXIS2=80)
+    image = MastAladin_app.add_asdf(path, windowed=windowed, name="test")
+
+    (message, (payload,)), = sent
+    assert message == {"event_name": "add_fits", "options": {"name": "test"}}
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        sent_data = hdu_list[1].data
+        if windowed:
+            # drop the NaN padding around the image
+            nan = np.isnan(sent_data)
+            sent_data = sent_data[~nan.all(axis=1)][:, ~nan.all(axis=0)]
+        np.testing.assert_array_equal(sent_data, model.data)
+
+    if windowed:
+        if os.path.isdir('/proc/self/fd'):
+            assert os.path.realpath(path) in open_files()
+        image.close()
+    if os.path.isdir('/proc/self/fd'):
+        assert os.path.realpath(path) not in open_files()
+
+
+def test_add_asdf_wcs_cache(MastAladin_app, tmp_path, wcs_cache_dir):
+    """Test add_asdf fits the WCS of a file once."""
+    from mast_aladin.utils.wcs_cache import fits_header_cache
+
+    path = tmp_path / 'image.asdf'
+    create_wfi_image_model((40, 30)).save(path)
+    fits_header_cache.clear()
+
+    for _ in range(2):
+        MastAladin_app.add_asdf(path)
+    assert (fits_header_cache.hits, fits_header_cache.misses) == (1, 1)
+    assert len(list(wcs_cache_dir.iterdir())) == 1
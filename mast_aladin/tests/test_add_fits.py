@@ -1,3 +1,5 @@
+import io
+import os
 import pytest
 import re
 import warnings
@@ -5,6 +7,7 @@ import warnings
 import numpy as np
 from astropy.io import fits
 from astropy.wcs import WCS
+from ipyaladin import Aladin
 
 
 def create_wcs():
@@ -108,3 +111,234 @@ def test_image_options(MastAladin_app, fits_no_sip):
     with warnings.catch_warnings(record=True) as w:
         MastAladin_app.add_fits(fits_no_sip, name="test", colormap="viridis")
         assert len(w) == 0
+
+
+@pytest.mark.parametrize('memmap', [True, False])
+def test_add_fits_path(MastAladin_app, tmp_path, memmap, sent):
+    """Test add_fits sends the image of a file and closes the file."""
+    path = tmp_path / 'image.fits'
+    data = np.arange(100, dtype=np.uint16).reshape(10, 10)
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(data=data, header=create_wcs().to_header())
+    ]).writeto(path)
+
+    MastAladin_app.add_fits(path, memmap=memmap, name="test")
+
+    (message, (payload,)), = sent
+    assert message == {"event_name": "add_fits", "options": {"name": "test"}}
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        np.testing.assert_array_equal(hdu_list[1].data, data)
+        assert hdu_list[1].header['CRPIX1'] == 5
+
+    if os.path.isdir('/proc/self/fd'):
+        open_files = [os.path.realpath(f'/proc/self/fd/{fd}') for fd in os.listdir('/proc/self/fd')]
+        assert os.path.realpath(path) not in open_files
+
+
+def test_add_fits_progressive(MastAladin_app, sent):
+    """Test a progressive load sends increasing levels in the same layer."""
+    data = np.random.default_rng(0).random((100, 60))
+    hdu_list = fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(data=data, header=create_wcs().to_header())
+    ])
+
+    MastAladin_app.add_fits(hdu_list, progressive=True, preview_size=30)
+
+    assert len(sent) == 3
+    assert len({message['options']['name'] for message, _ in sent}) == 1
+
+    levels = []
+    for _, (payload,) in sent:
+        with fits.open(io.BytesIO(payload)) as level:
+            levels.append((level[1].data.copy(), WCS(level[1].header)))
+
+    assert [level.shape for level, _ in levels] == [(25, 15), (50, 30), (100, 60)]
+    np.testing.assert_array_equal(levels[-1][0], data)
+    preview, preview_wcs = levels[0]
+    assert preview[0, 0] == np.float32(data[:4, :4].mean())
+    np.testing.assert_allclose(
+        preview_wcs.pixel_to_world_values(0, 0),
+        create_wcs().pixel_to_world_values(1.5, 1.5),
+    )
+
+
+def viewport_header(center, scale, shape=(40, 50)):
+    """Header of a viewport of ``shape`` screen pixels centered on the image
+    pixel ``center``, with ``scale`` image pixels per screen pixel."""
+    w = create_wcs()
+    w.wcs.crval = w.pixel_to_world_values(*center)
+    w.wcs.crpix = [(shape[1] + 1) / 2, (shape[0] + 1) / 2]
+    w.wcs.cdelt = w.wcs.cdelt * scale
+    header = dict(w.to_header())
+    header.update(NAXIS=2, NAXIS1=shape[1], NAXIS2=shape[0])
+    return header
+
+
+def test_add_fits_windowed(MastAladin_app, tmp_path, sent):
+    """Test a windowed image sends cutouts of the viewport when it changes."""
+    path = tmp_path / 'mosaic.fits'
+    data = np.random.default_rng(0).random((400, 600)).astype(np.float32)
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(data=data, header=create_wcs().to_header())
+    ]).writeto(path)
+
+    MastAladin_app._wcs = viewport_header((299.5, 199.5), 4)
+    windowed = MastAladin_app.add_fits(path, windowed=True, name="mosaic")
+
+    (message, (payload,)), = sent
+    assert message == {"event_name": "add_fits", "options": {"name": "mosaic"}}
+    # 200 x 160 image pixels on 50 x 40 screen pixels, with 25% margins
+    assert windowed.window == (148, 80, 76, 60, 4)
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        assert hdu_list[1].data.shape == (60, 76)
+        np.testing.assert_allclose(
+            hdu_list[1].data, data[80:320, 148:452].reshape(60, 4, 76, 4).mean(axis=(1, 3)),
+            rtol=1e-6
+        )
+        np.testing.assert_allclose(
+            WCS(hdu_list[1].header).pixel_to_world_values(37.5, 29.5),
+            create_wcs().pixel_to_world_values(299.5, 199.5),
+        )
+
+    # small pans are covered by the margins of the cutout
+    MastAladin_app._wcs = viewport_header((320, 210), 4)
+    assert not windowed.refresh()
+    MastAladin_app._wcs = viewport_header((450, 210), 4)
+    assert windowed.refresh()
+    assert windowed.window[-1] == 4
+    MastAladin_app._wcs = viewport_header((450, 210), 1)
+    assert windowed.refresh()
+    assert windowed.window[-1] == 1
+    assert len(sent) == 3
+    assert {message['options']['name'] for message, _ in sent} == {'mosaic'}
+
+    # view changes are debounced into one cutout
+    windowed.delay = 0.05
+    MastAladin_app._wcs = viewport_header((100, 100), 2)
+    for fov in (1, 2, 3):
+        MastAladin_app._fov = fov
+    windowed._timer.join()
+    assert len(sent) == 4
+
+    # views of a widget scrolled out of the notebook are skipped until it is
+    # scrolled back
+    MastAladin_app._is_reduced = True
+    MastAladin_app._wcs = viewport_header((450, 210), 2)
+    assert not windowed.refresh()
+    windowed._timer.cancel()
+    MastAladin_app._is_reduced = False
+    windowed._timer.join()
+    assert len(sent) == 5
+
+    windowed.close()
+    MastAladin_app._fov = 4
+    assert not windowed.refresh()
+    if os.path.isdir('/proc/self/fd'):
+        open_files = [os.path.realpath(f'/proc/self/fd/{fd}') for fd in os.listdir('/proc/self/fd')]
+        assert os.path.realpath(path) not in open_files
+
+
+def test_windowed_image_kernel_loop(monkeypatch):
+    """Test the refreshes are scheduled on the IO loop of the kernel in a kernel."""
+    import IPython
+    from mast_aladin import windowed_image
+
+    class IOLoop:
+        def __init__(self):
+            self.timeouts = []
+
+        def call_later(self, delay, callback):
+            self.timeouts.append((delay, callback))
+            return len(self.timeouts) - 1
+
+        def remove_timeout(self, timeout):
+            self.timeouts[timeout] = None
+
+    io_loop = IOLoop()
+    kernel = type('Shell', (), {'kernel': type('Kernel', (), {'io_loop': io_loop})})
+    monkeypatch.setattr(IPython, 'get_ipython', lambda: kernel)
+    windowed_image._call_later(0.3, print).cancel()
+    windowed_image._call_later(0.3, len)
+    assert io_loop.timeouts == [None, (0.3, len)]
+
+
+def test_add_fits_undistort(MastAladin_app, fits_with_sip, sent):
+    """Test add_fits resamples distorted images onto a linear grid."""
+    sip = WCS(fits_with_sip[1].header)
+    sip.sip.a[2, 0] = 1e-2
+    fits_with_sip[1].header.update(sip.to_header(relax=True))
+
+    MastAladin_app.add_fits(fits_with_sip, undistort=True)
+
+    (_, (payload,)), = sent
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        header = hdu_list[1].header
+        assert header['CTYPE1'] == 'RA---TAN'
+        assert 'A_ORDER' not in header
+        # the distortion pushes the image past its right edge
+        assert hdu_list[1].data.shape[1] > 10
+        assert np.isnan(hdu_list[1].data).any()
+
+
+def test_add_fits_encoding(MastAladin_app, sent):
+    """Test add_fits sends images encoded at a reduced precision."""
+    data = np.random.default_rng(0).random((100, 60))
+    hdu_list = fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(data=data, header=create_wcs().to_header())
+    ])
+
+    MastAladin_app.add_fits(hdu_list, memmap=False, encoding='int16', clip_percentiles=(0, 100))
+
+    (_, (payload,)), = sent
+    with fits.open(io.BytesIO(payload)) as sent_hdu_list:
+        assert sent_hdu_list[1].header['BITPIX'] == 16
+        np.testing.assert_allclose(sent_hdu_list[1].data, data, atol=1e-4)
+
+
+def test_add_fits_sent_once(MastAladin_app, fits_no_sip, sent):
+    """Test images already sent to a layer are not sent again."""
+
+    MastAladin_app.add_fits(fits_no_sip)
+    layer = sent[-1][0]['options']['name']
+    MastAladin_app.add_fits(fits_no_sip)
+    assert len(sent) == 1
+    # the view moves to the image, as when it is loaded
+    assert MastAladin_app.target.separation(
+        WCS(fits_no_sip[1].header).pixel_to_world(4.5, 4.5)
+    ).arcsec < 1e-6
+
+    # other options, layers or data are sent
+    MastAladin_app.add_fits(fits_no_sip, colormap='viridis')
+    MastAladin_app.add_fits(fits_no_sip, name='copy')
+    fits_no_sip[1].data[0, 0] = 2
+    MastAladin_app.add_fits(fits_no_sip, name=layer)
+    assert len(sent) == 4
+
+    # the image replaced in `layer` is still in the layer 'copy'
+    fits_no_sip[1].data[0, 0] = 1
+    MastAladin_app.add_fits(fits_no_sip)
+    MastAladin_app.add_fits(fits_no_sip, name='copy')
+    assert len(sent) == 4
+
+    MastAladin_app.handle_overlay_removed('copy')
+    MastAladin_app.add_fits(fits_no_sip)
+    assert len(sent) == 5
+
+    # images are sent again on request
+    MastAladin_app.add_fits(fits_no_sip, reload=True)
+    assert len(sent) == 6
+    assert sent[-1][0]['options']['name'] == sent[-2][0]['options']['name']
+
+
+def test_send_fits_payload_matches_ipyaladin(MastAladin_app, fits_no_sip, sent):
+    """Test the add_fits message is the one ipyaladin sends for the same payload."""
+    image_options = {'name': 'image', 'opacity': 0.5}
+    Aladin.add_fits(MastAladin_app, fits_no_sip, **image_options)
+    MastAladin_app._send_fits_payload(sent[0][1][0], dict(image_options))
+
+    assert len(sent) == 2
+    assert sent[1] == sent[0]
@@ -0,0 +1,99 @@
+import io
+import time
+
+import pytest
+
+import numpy as np
+from astropy.io import fits
+
+from mast_aladin.tests.test_add_asdf import create_wfi_image_model
+from mast_aladin.tests.test_add_fits import create_wcs
+
+
+def write_fits(path, value):
+    data = np.full((10, 10), value, dtype=np.float32)
+    fits.HDUList([
+        fits.PrimaryHDU(),
+        fits.ImageHDU(data=data, header=create_wcs().to_header())
+    ]).writeto(path)
+    return path
+
+
+def test_add_images(MastAladin_app, sent, tmp_path):
+    """Test add_images sends FITS and ASDF images in order, with their timings."""
+    paths = [write_fits(tmp_path / f'image_{i}.fits', i) for i in range(5)]
+    asdf_path = tmp_path / 'image.asdf'
+    model = create_wfi_image_model((20, 10))
+    model.data = np.full((20, 10), 10, dtype=np.float32)
+    model.save(asdf_path)
+    images = paths + [asdf_path]
+    names = [f'layer_{i}' for i in range(len(images))]
+
+    timings = MastAladin_app.add_images(images, workers=3, names=names, colormap='viridis')
+
+    assert [message['options'] for message, _ in sent] == [
+        {'name': name, 'colormap': 'viridis'} for name in names
+    ]
+    for i, (_, (payload,)) in enumerate(sent):
+        with fits.open(io.BytesIO(payload)) as hdu_list:
+            assert np.all(hdu_list[1].data == (10 if i == 5 else i))
+
+    assert list(timings['image']) == [str(image) for image in images]
+    assert list(timings['layer']) == names
+    assert np.all(timings['read'] >= 0)
+    assert np.all(timings['bytes'] == [len(payload) for _, (payload,) in sent])
+
+
+def test_add_images_sent_once(MastAladin_app, sent, tmp_path):
+    """Test add_images does not prepare or send an image already in the widget."""
+    path = write_fits(tmp_path / 'image.fits', 1)
+    MastAladin_app.add_fits(path)
+    layer = sent[0][0]['options']['name']
+
+    timings = MastAladin_app.add_images([path, write_fits(tmp_path / 'other.fits', 2)])
+
+    assert len(sent) == 2
+    assert list(timings['layer']) == [layer, sent[1][0]['options']['name']]
+    assert timings['bytes'][0] == 0
+
+    # unless it is replaced by the images sent before it
+    timings = MastAladin_app.add_images([tmp_path / 'other.fits', path], names=[layer, None])
+    assert len(sent) == 4
+    assert timings['layer'][0] == layer != timings['layer'][1]
+    assert timings['bytes'][1] == len(sent[3][1][0])
+
+
+def test_add_images_in_flight(MastAladin_app, sent, tmp_path, monkeypatch):
+    """Test add_images prepares at most `workers` images ahead of the one sent."""
+    paths = [write_fits(tmp_path / f'image_{i}.fits', i) for i in range(12)]
+    image_payloads = MastAladin_app._image_payloads
+    ahead = []
+
+    def slow_send(payload, image_options):
+        time.sleep(0.01)
+        sent.append(({'options': image_options}, [payload]))
+
+    def counted_payloads(*args, **kwargs):
+        ahead.append(len(ahead) - len(sent))
+        return image_payloads(*args, **kwargs)
+
+    monkeypatch.setattr(MastAladin_app, '_send_fits_payload', slow_send)
+    monkeypatch.setattr(MastAladin_app, '_image_payloads', counted_payloads)
+    MastAladin_app.add_images(paths, workers=3)
+
+    assert len(sent) == 12
+    # the image being sent, and the images being prepared
+    assert max(ahead) <= 3 + 1
+
+
+def test_add_images_errors(MastAladin_app, sent, tmp_path):
+    """Test add_images checks the layer names and raises the errors of images."""
+    path = write_fits(tmp_path / 'image.fits', 1)
+    with pytest.raises(ValueError, match='2 layer names for 1 images'):
+        MastAladin_app.add_images([path], names=['a', 'b'])
+
+    empty = fits.HDUList([fits.PrimaryHDU()])
+    with pytest.raises(ValueError, match='No data in extension'):
+        MastAladin_app.add_images([path, empty])
+    # the images before the invalid one are sent
+    assert len(sent) == 1
@@ -0,0 +1,159 @@
+import logging
+import threading
+
+import pytest
+from astropy.table import vstack
+
+from mast_aladin import footprint_upload
+from mast_aladin.footprint_upload import FootprintUpload
+
+
+def sent_stcs(sent):
+    return [
+        region['infos']['stcs']
+        for message, _ in sent if message['event_name'] == 'add_overlay'
+        for region in message['regions_infos']
+    ]
+
+
+def test_load_table(MastAladin_app, sent, mast_observation_table):
+    """Test load_table sends the footprints of small tables at once."""
+    MastAladin_app.load_table(mast_observation_table)
+
+    upload = MastAladin_app.footprint_upload
+    assert upload.wait(5)
+    assert len(sent) == 1
+    assert sent_stcs(sent) == list(mast_observation_table['s_region'])
+    assert upload.overlays == ['footprints']
+    assert upload.n_sent == upload.progress.max == len(mast_observation_table)
+
+
+def test_load_table_chunks(MastAladin_app, sent, mast_observation_table):
+    """Test load_table sends the footprints of large tables in chunks."""
+    table = vstack([mast_observation_table] * 3)
+    MastAladin_app.load_table(
+        table, chunk_size=4, show_progress=False, collapse_duplicates=False
+    )
+
+    upload = MastAladin_app.footprint_upload
+    assert upload.wait(5)
+    assert sent_stcs(sent) == list(table['s_region'])
+    assert [len(message['regions_infos']) for message, _ in sent] == [4, 4, 4, 3]
+    assert upload.overlays == ['footprints', 'footprints_1', 'footprints_2', 'footprints_3']
+    assert upload.progress.bar_style == 'success'
+
+    # the overlays are registered with the widget
+    assert set(upload.overlays) <= set(MastAladin_app._overlay_manager.keys())
+
+
+def test_load_table_duplicates(MastAladin_app, sent, mast_observation_table):
+    """Test load_table draws the footprints shared by several rows once."""
+    table = vstack([mast_observation_table] * 3)
+    MastAladin_app.load_table(table, chunk_size=4, show_progress=False)
+
+    upload = MastAladin_app.footprint_upload
+    assert upload.wait(5)
+    assert sent_stcs(sent) == list(mast_observation_table['s_region'])
+    assert upload.n_rows == 15
+    assert list(upload.row_footprints) == [0, 1, 2, 3, 4] * 3
+    assert list(upload.footprint_rows(3)) == [3, 8, 13]
+    assert upload.row_overlay(13) == 'footprints'
+    assert upload.row_overlay(14) == 'footprints_1'
+
+
+def test_footprint_upload_event_loop(MastAladin_app, sent, mast_observation_table, monkeypatch):
+    """Test the chunks after the first one are sent by callbacks of the event loop."""
+    scheduled = []
+    monkeypatch.setattr(
+        footprint_upload, '_call_later',
+        lambda delay, callback: scheduled.append((delay, callback))
+    )
+    upload = FootprintUpload(
+        MastAladin_app, mast_observation_table['s_region'], chunk_size=2, delay=0.1
+    )
+    assert upload.n_sent == 2 and not upload.done
+
+    while scheduled:
+        delay, callback = scheduled.pop()
+        assert delay == 0.1
+        callback()
+    assert upload.done
+    assert upload.overlays == ['footprints', 'footprints_1', 'footprints_2']
+    assert sent_stcs(sent) == list(mast_observation_table['s_region'])
+
+
+def test_footprint_upload_cancel(MastAladin_app, sent, mast_observation_table):
+    """Test cancelling an upload stops it, and can remove the overlays sent."""
+    table = vstack([mast_observation_table] * 4)
+    second_chunk_sent = threading.Event()
+
+    # cancelled while waiting to send the third chunk
+    send = MastAladin_app.send
+
+    def signalling_send(message, buffers=None):
+        send(message, buffers)
+        if len(sent) == 2:
+            second_chunk_sent.set()
+
+    MastAladin_app.send = signalling_send
+    upload = FootprintUpload(MastAladin_app, table['s_region'], chunk_size=5, delay=0.5)
+    assert second_chunk_sent.wait(5)
+    upload.cancel(remove=True)
+
+    assert upload.done
+    assert upload.n_sent == 10
+    assert upload.progress.bar_style == 'warning'
+    assert upload.overlays == []
+    assert sent[-1][0] == {
+        'event_name': 'remove_overlay', 'overlay_names': ['footprints', 'footprints_1']
+    }
+
+    with pytest.raises(ValueError, match='chunk size must be positive'):
+        FootprintUpload(MastAladin_app, table['s_region'], chunk_size=0)
+
+
+def test_load_table_replaces_upload(MastAladin_app, sent, mast_observation_table):
+    """Test loading another table cancels the upload of the previous one."""
+    table = vstack([mast_observation_table] * 4)
+    MastAladin_app.load_table(
+        table, chunk_size=5, show_progress=False, collapse_duplicates=False
+    )
+    upload = MastAladin_app.footprint_upload
+    upload.delay = 0.5
+
+    MastAladin_app.load_table(mast_observation_table)
+    assert upload.done and upload.overlays == []
+    assert upload.progress.bar_style == 'warning'
+    assert MastAladin_app.footprint_upload is not upload
+    assert MastAladin_app.footprint_upload.wait(5)
+    assert sent_stcs(sent[-1:]) == list(mast_observation_table['s_region'])
+    assert set(MastAladin_app._overlay_manager.keys()) == {'footprints'}
+
+    # and the upload is dropped when the footprints of the next table are culled
+    MastAladin_app.viewport_culling_rows = 1
+    MastAladin_app._wcs = {}
+    MastAladin_app.load_table(mast_observation_table)
+    assert MastAladin_app.footprint_upload is None
+    assert MastAladin_app.viewport_footprints is not None
+
+
+def test_footprint_upload_error(MastAladin_app, sent, mast_observation_table, caplog):
+    """Test errors in the background stop the upload and are logged."""
+    send = MastAladin_app.send
+
+    def failing_send(message, buffers=None):
+        if sent:
+            raise RuntimeError('comm closed')
+        send(message, buffers)
+
+    MastAladin_app.send = failing_send
+    with caplog.at_level(logging.ERROR, logger='mast_aladin.footprint_upload'):
+        upload = FootprintUpload(
+            MastAladin_app, mast_observation_table['s_region'], chunk_size=2, delay=0
+        )
+        assert upload.wait(5)
+
+    assert upload.n_sent == 2
+    assert upload.progress.bar_style == 'danger'
+    assert 'Failed to send footprints after 2 of 5' in caplog.text
+    assert 'comm closed' in caplog.text
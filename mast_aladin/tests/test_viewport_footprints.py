@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from astropy.table import Table
+from astropy.wcs import WCS
+
+from mast_aladin.viewport_footprints import ViewportFootprints
+
+
+def viewport_header(ra, dec, fov, shape=(40, 50)):
+    """Header of a viewport of ``shape`` screen pixels, ``fov`` degrees wide."""
+    w = WCS(naxis=2)
+    w.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    w.wcs.crval = [ra, dec]
+    w.wcs.crpix = [(shape[1] + 1) / 2, (shape[0] + 1) / 2]
+    w.wcs.cdelt = [-fov / shape[1], fov / shape[1]]
+    header = dict(w.to_header())
+    header.update(NAXIS=2, NAXIS1=shape[1], NAXIS2=shape[0])
+    return header
+
+
+@pytest.fixture
+def grid_table():
+    # 0.05 degree squares every 0.1 degree, on 100 x 100 points around (10, 0)
+    ra, dec = (grid.ravel() for grid in np.meshgrid(
+        5 + 0.1 * np.arange(100), -5 + 0.1 * np.arange(100)
+    ))
+    s_region = [
+        'POLYGON ICRS {} {} {} {} {} {} {} {}'.format(
+            r - 0.025, d - 0.025, r + 0.025, d - 0.025, r + 0.025, d + 0.025, r - 0.025, d + 0.025
+        )
+        for r, d in zip(ra, dec)
+    ]
+    return Table({'obsid': np.arange(len(ra)), 'ra': ra, 'dec': dec, 's_region': s_region})
+
+
+def sent_centers(message):
+    """RA/Dec of the centers of the squares in an add_overlay message."""
+    vertices = np.array([
+        region['infos']['stcs'].split()[2:] for region in message['regions_infos']
+    ], dtype=float).reshape(-1, 4, 2)
+    return vertices.mean(axis=1)
+
+
+def test_viewport_footprints(MastAladin_app, sent, grid_table):
+    """Test only the footprints around the viewport are sent, and updated."""
+    MastAladin_app._wcs = viewport_header(10, 0, 1)
+    MastAladin_app.load_table(
+        grid_table, unique_column='obsid', update_viewport=False, viewport_culling=True
+    )
+
+    culled = MastAladin_app.viewport_footprints
+    assert isinstance(culled, ViewportFootprints)
+    assert MastAladin_app.footprint_upload is None
+    ((message, _),) = sent
+    assert message['event_name'] == 'add_overlay'
+    assert message['graphic_options']['name'] == culled.name == 'footprints'
+
+    # the squares within the cap bounding the viewport with a 25% margin
+    centers = sent_centers(message)
+    assert len(centers) == len(culled.visible)
+    radius = np.hypot(0.5, 0.4) * 1.25
+    assert np.all(np.hypot(centers[:, 0] - 10, centers[:, 1]) < radius + 0.04)
+    expected = np.hypot(grid_table['ra'] - 10, grid_table['dec']) < radius - 0.04
+    assert np.all(np.isin(np.flatnonzero(expected), culled.visible))
+    assert culled.row_overlay(int(culled.visible[0])) == 'footprints'
+    assert culled.row_overlay(0) is None
+
+    # small pans are covered by the margin
+    MastAladin_app._wcs = viewport_header(10.05, 0, 1)
+    assert not culled.refresh()
+    # the footprints are replaced when the view moves or zooms in
+    MastAladin_app._wcs = viewport_header(12, 1, 1)
+    assert culled.refresh()
+    MastAladin_app._wcs = viewport_header(12, 1, 0.2)
+    assert culled.refresh()
+    assert len(culled.visible) < 20
+    assert [message['event_name'] for message, _ in sent[1:]] == [
+        'remove_overlay', 'add_overlay', 'remove_overlay', 'add_overlay'
+    ]
+
+    # view changes are debounced into one update
+    culled.delay = 0.05
+    MastAladin_app._wcs = viewport_header(8, -2, 2)
+    for fov in (1, 2, 3):
+        MastAladin_app._fov = fov
+    culled._timer.join()
+    assert len(sent) == 7
+    np.testing.assert_allclose(sent_centers(sent[-1][0]).mean(axis=0), [8, -2], atol=0.1)
+
+    # views of a widget scrolled out of the notebook are skipped until it is
+    # scrolled back
+    MastAladin_app._is_reduced = True
+    MastAladin_app._wcs = viewport_header(12, 1, 1)
+    assert not culled.refresh()
+    culled._timer.cancel()
+    MastAladin_app._is_reduced = False
+    culled._timer.join()
+    assert len(sent) == 9
+    np.testing.assert_allclose(sent_centers(sent[-1][0]).mean(axis=0), [12, 1], atol=0.1)
+
+    # loading another table replaces the footprints
+    MastAladin_app.load_table(grid_table[:10], unique_column='obsid', update_viewport=False)
+    assert sent[9][0] == {'event_name': 'remove_overlay', 'overlay_names': ['footprints']}
+    assert MastAladin_app.viewport_footprints is None
+    assert not culled.refresh()
+
+
+def test_viewport_footprints_duplicates(MastAladin_app, sent, grid_table):
+    """Test the footprints shared by several rows are indexed once."""
+    MastAladin_app._wcs = viewport_header(10, 0, 1)
+    stcs = list(grid_table['s_region'][5030:5080]) * 2
+    culled = ViewportFootprints(MastAladin_app, stcs, collapse_duplicates=True)
+
+    assert culled.n_rows == 100
+    assert len(culled.index) == 50
+    assert list(culled.footprint_rows(3)) == [3, 53]
+
+    culled.close(remove=True)
+    assert sent[-1][0]['event_name'] == 'remove_overlay'
+
+    with pytest.raises(ValueError, match='Unsupported STC-S token'):
+        ViewportFootprints(MastAladin_app, ['BOX ICRS 1 2 3 4'])
+
+
+def test_viewport_footprints_lod(MastAladin_app, sent, grid_table):
+    """Test wide views show the coverage of the footprints, with a vertex budget."""
+    pytest.importorskip('astropy_healpix')
+    MastAladin_app._wcs = viewport_header(10, 0, 10)
+    MastAladin_app.load_table(
+        grid_table, unique_column='obsid', update_viewport=False, lod=True, max_vertices=400
+    )
+
+    culled = MastAladin_app.viewport_footprints
+    assert culled.coverage
+    ((message, _),) = sent
+    assert message['event_name'] == 'add_MOC_from_dict'
+    assert message['options']['name'] == 'footprints'
+    ((order, cells),) = message['moc_dict'].items()
+    assert 0 < len(cells) <= 100
+    assert culled.row_overlay(int(culled.visible[0])) is None
+
+    # the footprints are drawn when they fit in the budget
+    MastAladin_app._wcs = viewport_header(10, 0, 0.5)
+    assert culled.refresh()
+    assert not culled.coverage
+    assert sent[-1][0]['event_name'] == 'add_overlay'
+    assert 4 * len(sent[-1][0]['regions_infos']) <= 400
+
+    # or always drawn as their coverage in views wider than lod_fov
+    culled.lod_fov = 0.5
+    assert culled.refresh(force=True)
+    assert sent[-1][0]['event_name'] == 'add_MOC_from_dict'
+    # cells of at least 1/128 of the view
+    assert int(next(iter(sent[-1][0]['moc_dict']))) <= np.log2(58.6 * 128 / (np.hypot(0.5, 0.4)))
+
+    # zooming in past lod_fov shows the footprints, even within the cap sent
+    culled.lod_fov = 8
+    culled.max_vertices = 10 ** 6
+    MastAladin_app._wcs = viewport_header(10, 0, 10)
+    assert culled.refresh(force=True)
+    assert culled.coverage
+    MastAladin_app._wcs = viewport_header(10, 0, 5)
+    assert culled.refresh()
+    assert not culled.coverage
+    assert sent[-1][0]['event_name'] == 'add_overlay'
+    MastAladin_app._wcs = viewport_header(10, 0, 4)
+    assert not culled.refresh()
+
+    with pytest.raises(ValueError, match='only be summarized'):
+        MastAladin_app.load_table(
+            grid_table, unique_column='obsid', lod=True, viewport_culling=False
+        )
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from astropy.coordinates import Angle
+import astropy.units as u
+
+from mast_aladin.utils.aperture_store import (
+    ApertureStore, build_aperture_store, load_aperture_store
+)
+from mast_aladin.utils.footprint_generator import DitherPattern, Exposure
+
+
+@pytest.fixture(scope='module')
+def roman_store(tmp_path_factory):
+    path = tmp_path_factory.mktemp('store') / 'apertures.npy'
+    build_aperture_store(path, siaf_names=('roman',))
+    return load_aperture_store(path)
+
+
+def test_store_contents(roman_store):
+    assert isinstance(roman_store, ApertureStore)
+    assert roman_store.siaf_names == ['ROMAN']
+
+    siaf = roman_store.siaf('Roman')
+    assert 'WFI01_FULL' in siaf
+    assert siaf['WFI01_FULL'].idl_vertices.shape == (4, 2)
+
+    with pytest.raises(KeyError, match='NIRCAM'):
+        roman_store.siaf('NIRCAM')
+
+
+def test_store_is_shared(roman_store):
+    assert load_aperture_store(roman_store.path) is roman_store
+
+
+def test_missing_store(tmp_path):
+    with pytest.raises(FileNotFoundError, match='python -m mast_aladin.utils.aperture_store'):
+        load_aperture_store(tmp_path / 'missing.npy')
+
+
+@pytest.mark.parametrize('instrument, aperture', [
+    ('WFI', 'ALL'),
+    ('WFI', 'WFI07_FULL'),
+    ('CGI', 'ALL'),
+    ('ALL', 'ALL'),
+])
+def test_exposure_from_store_matches_pysiaf(roman_store, instrument, aperture):
+    args = (Angle(10 * u.deg), Angle(20 * u.deg), 15, -30, 'roman', instrument, aperture)
+
+    expected = DitherPattern(Exposure(*args), 2, 2, 100, 0, 0, 100).get_exp_list(pa=33)
+    result = DitherPattern(
+        Exposure(*args, aperture_store=roman_store), 2, 2, 100, 0, 0, 100
+    ).get_exp_list(pa=33)
+
+    assert len(result) == len(expected)
+    for row, expected_row in zip(result, expected):
+        assert row['s_region'] == expected_row['s_region']
+        np.testing.assert_allclose(
+            [row['aper_ra'], row['aper_dec']],
+            [expected_row['aper_ra'], expected_row['aper_dec']],
+        )
+
+
+def test_exposure_invalid_store():
+    with pytest.raises(TypeError, match='aperture_store'):
+        Exposure(Angle(10 * u.deg), Angle(20 * u.deg), aperture_store=42)
@@ -0,0 +1,198 @@
+import io
+import logging
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from mast_aladin.utils.fits_ingest import (
+    FITS_BLOCK_SIZE, binned_wcs, block_mean, content_hash, cutout, encoding_scaling, image_payload,
+    peak_rss, progressive_factors, supports_payload, viewport_window, window_wcs,
+)
+
+
+@pytest.fixture
+def wcs_header():
+    wcs = WCS(naxis=2)
+    wcs.wcs.crpix = [5, 5]
+    wcs.wcs.cdelt = [-0.000277, 0.000277]
+    wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    return wcs.to_header()
+
+
+@pytest.mark.parametrize('dtype', ['<f4', '>f8', '<i2', '>i4', 'u1'])
+def test_image_payload(wcs_header, dtype):
+    data = np.arange(35).reshape(5, 7).astype(dtype)
+    payload = image_payload(data, wcs_header)
+
+    assert len(payload) % FITS_BLOCK_SIZE == 0
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        assert len(hdu_list) == 2
+        assert hdu_list[0].header['CTYPE1'] == 'RA---TAN'
+        assert hdu_list[1].header['CRPIX1'] == 5
+        np.testing.assert_array_equal(hdu_list[1].data, data)
+
+
+def test_image_payload_scaling(wcs_header):
+    data = np.array([[0, 1], [2, 3]], dtype='>i2')
+    payload = image_payload(data, wcs_header, {'BZERO': 32768, 'BSCALE': 1})
+
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        np.testing.assert_array_equal(hdu_list[1].data, data.astype(np.uint16) + 32768)
+
+
+@pytest.mark.parametrize('encoding, bitpix, atol', [
+    ('float32', -32, 1e-6), ('int16', 16, 1e-3), ('uint8', 8, 0.2),
+])
+def test_image_payload_encoding(wcs_header, encoding, bitpix, atol, caplog):
+    data = np.linspace(0, 100, 2000).reshape(40, 50)
+    data[0, :5] = [np.nan, -1e6, 1e6, np.inf, -np.inf]
+
+    with caplog.at_level(logging.INFO, logger='mast_aladin.utils.fits_ingest'):
+        payload = image_payload(data, wcs_header, encoding=encoding, percentiles=(1, 99))
+    assert f'as {encoding}' in caplog.text
+
+    with fits.open(io.BytesIO(payload)) as hdu_list:
+        assert hdu_list[1].header['BITPIX'] == bitpix
+        decoded = hdu_list[1].data
+    assert len(payload) < data.nbytes
+    assert np.isnan(decoded[0, 0])
+
+    if encoding == 'float32':
+        np.testing.assert_array_equal(decoded[1:], data[1:].astype(np.float32))
+    else:
+        low, high = np.percentile(data[np.isfinite(data)], (1, 99))
+        np.testing.assert_allclose(decoded[1:], np.clip(data[1:], low, high), atol=atol)
+        assert decoded[0, 1] == pytest.approx(low, abs=atol)
+        assert decoded[0, 2] == pytest.approx(high, abs=atol)
+
+
+def test_encoding_scaling():
+    # scaled raw data, with BLANK pixels ignored
+    raw = np.array([[0, 10, -1]], dtype=np.int16)
+    scaling = encoding_scaling(raw, 'uint8', {'BSCALE': 2, 'BZERO': 5, 'BLANK': -1}, (0, 100))
+    assert scaling == {'BSCALE': 20 / 254, 'BZERO': 5., 'BLANK': 255}
+
+    assert encoding_scaling(np.full(4, np.nan), 'int16')['BSCALE'] == 1
+    assert encoding_scaling(np.array([np.inf, np.nan, -np.inf]), 'int16')['BSCALE'] == 1
+
+
+def test_encoding_scaling_infinite(wcs_header):
+    """Test infinite pixels do not collapse the codes of the encodings."""
+    data = np.linspace(0, 1, 10_000, dtype=np.float32).reshape(100, 100)
+    data[::50] = np.inf
+    data[1::50] = -np.inf
+    data[2, :10] = np.nan
+    scaling = encoding_scaling(data, 'uint8', percentiles=(0, 100))
+    low, high = data[2, 10], data[-1, -1]
+    assert scaling['BZERO'] == low
+    assert scaling['BSCALE'] == pytest.approx((high - low) / 254, rel=1e-6)
+
+    with fits.open(io.BytesIO(image_payload(data, wcs_header, encoding='uint8'))) as hdu_list:
+        encoded = hdu_list[1].data
+        assert len(np.unique(encoded[np.isfinite(encoded)])) > 200
+        np.testing.assert_allclose(encoded[3:50], data[3:50], atol=0.01)
+        assert np.all(encoded[0] > 0.99) and np.all(encoded[1] < 0.03)
+        assert np.isnan(encoded[2, :10]).all()
+
+
+def test_content_hash(wcs_header):
+    # larger than the strips the data are hashed in
+    data = np.zeros((2048, 1024), dtype=np.float32)
+    digest = content_hash(data, wcs_header)
+    assert content_hash(data.copy(), wcs_header) == digest
+
+    # every row is hashed
+    data[1, 7] = 1
+    assert content_hash(data, wcs_header) != digest
+    data[1, 7] = 0
+    assert content_hash(data.astype('>f4'), wcs_header) != digest
+    wcs_header['CRPIX1'] = 6
+    assert content_hash(data, wcs_header) != digest
+
+
+def test_unsupported_data(wcs_header):
+    data = np.ones((2, 2), dtype=bool)
+    assert not supports_payload(data)
+    with pytest.raises(ValueError, match='encoding'):
+        image_payload(np.zeros(4), wcs_header, encoding='int8')
+    with pytest.raises(TypeError):
+        image_payload(data, wcs_header)
+
+
+def test_peak_rss():
+    rss = peak_rss()
+    assert rss is None or rss > 0
+
+
+@pytest.mark.parametrize('shape, factors', [
+    ((100, 200), [1]),
+    ((512, 513), [2, 1]),
+    ((4088, 4088), [8, 4, 2, 1]),
+])
+def test_progressive_factors(shape, factors):
+    assert progressive_factors(shape, 512) == factors
+
+
+def test_block_mean():
+    data = np.arange(7 * 9, dtype=float).reshape(7, 9)
+    data[0, 0] = np.nan
+
+    binned = block_mean(data, 2, strip_size=2)
+    assert binned.shape == (3, 4)
+    assert binned.dtype == np.float32
+    assert binned[0, 0] == np.float32(20 / 3)
+    assert binned[2, 3] == np.float32(data[4:6, 6:8].mean())
+
+    raw = np.array([[0, 2], [4, -1]], dtype=np.int16)
+    binned = block_mean(raw, 2, {'BSCALE': 2, 'BZERO': 10, 'BLANK': -1})
+    assert binned[0, 0] == 2 * 2 + 10
+
+
+@pytest.mark.parametrize('use_cd', [False, True])
+def test_binned_wcs(wcs_header, use_cd):
+    wcs = WCS(wcs_header)
+    if use_cd:
+        wcs.wcs.cd = [[-1e-4, 2e-5], [3e-5, 1e-4]]
+
+    binned = binned_wcs(wcs, 4)
+    # binned pixel (x, y) covers original pixels 4 x to 4 x + 3
+    for x, y in [(0, 0), (10, 7)]:
+        np.testing.assert_allclose(
+            binned.pixel_to_world_values(x, y),
+            wcs.pixel_to_world_values(4 * x + 1.5, 4 * y + 1.5),
+            rtol=0, atol=1e-12,
+        )
+
+
+def test_viewport_window():
+    # a 100 x 50 pixel viewport shown on 50 x 25 screen pixels
+    corners = np.array([[100, 300], [200, 300], [200, 350], [100, 350]]) - 0.5
+    assert viewport_window((1000, 1000), corners, (25, 50)) == (74, 287, 76, 38, 2)
+    assert viewport_window((1000, 1000), corners, (50, 100), margin=0) == (100, 300, 100, 50, 1)
+
+    # the whole image, when the viewport cannot be located in it
+    x0, y0, nx, ny, factor = viewport_window((1000, 500), np.full((4, 2), np.nan), (100, 100))
+    assert factor == 8
+    assert x0 <= 0 and x0 + nx * factor >= 500
+    assert y0 <= 0 and y0 + ny * factor >= 1000
+
+
+def test_cutout(wcs_header):
+    data = np.arange(100, dtype=float).reshape(10, 10)
+    window = (-2, 4, 4, 3, 2)
+
+    image = cutout(data, window)
+    assert image.shape == (3, 4)
+    assert np.all(np.isnan(image[:, 0]))
+    np.testing.assert_array_equal(image[:, 1:], block_mean(data[4:10, 0:6], 2))
+    assert np.all(np.isnan(cutout(data, (20, 0, 2, 2, 1))))
+
+    wcs = WCS(wcs_header)
+    # cutout pixel (x, y) covers original pixels x0 + 2 x to x0 + 2 x + 1
+    np.testing.assert_allclose(
+        window_wcs(wcs, window).pixel_to_world_values(3, 1),
+        wcs.pixel_to_world_values(-2 + 6.5, 4 + 2.5),
+        rtol=0, atol=1e-12,
+    )
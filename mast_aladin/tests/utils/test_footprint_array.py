@@ -0,0 +1,148 @@
+import pickle
+
+import numpy as np
+import pytest
+from astropy.coordinates import Angle
+from astropy.table import Table, vstack
+import astropy.units as u
+from regions import CircleSkyRegion, PolygonSkyRegion
+
+from mast_aladin.utils import footprint_array
+from mast_aladin.utils.footprint_array import CIRCLE, POLYGON, FootprintArray
+from mast_aladin.utils.footprint_generator import (
+    DitherPattern, Exposure, Observation, exp_list_to_table
+)
+
+
+@pytest.fixture
+def footprints():
+    # a polygon and a circle, a row without shapes, and a polygon
+    return FootprintArray(
+        [POLYGON, CIRCLE, POLYGON],
+        [0, 4, 5, 9],
+        np.arange(18.).reshape(9, 2),
+        [np.nan, 0.5, np.nan],
+        [0, 2, 2, 3],
+    )
+
+
+def test_footprint_array_rows(footprints):
+    assert len(footprints) == 3
+    assert list(footprints.n_shapes) == [2, 0, 1]
+    assert footprints[0] == (
+        'POLYGON ICRS 0.00000000 1.00000000 2.00000000 3.00000000 4.00000000 '
+        '5.00000000 6.00000000 7.00000000 CIRCLE ICRS 8.0 9.0 0.5 '
+    )
+    assert footprints[1] == ''
+    assert footprints[-1] == footprints[2]
+    assert list(footprints.to_stcs()) == list(footprints)
+
+    reversed_rows = footprints[::-1]
+    assert isinstance(reversed_rows, FootprintArray)
+    assert list(reversed_rows) == list(footprints)[::-1]
+    assert list(footprints[[True, False, True]]) == [footprints[0], footprints[2]]
+
+    with pytest.raises(IndexError):
+        footprints[3]
+
+
+def test_footprint_array_concatenate(footprints):
+    combined = FootprintArray.concatenate([footprints, footprints[1:], FootprintArray.empty(1)])
+
+    assert len(combined) == 6
+    assert list(combined) == list(footprints) + list(footprints)[1:] + ['']
+    assert len(FootprintArray.concatenate([])) == 0
+
+
+def test_footprint_array_serialization(footprints):
+    assert list(FootprintArray.from_bytes(footprints.to_bytes())) == list(footprints)
+    assert list(pickle.loads(pickle.dumps(footprints))) == list(footprints)
+
+    with pytest.raises(ValueError):
+        FootprintArray.from_bytes(b'\0' * 64)
+
+    regions = footprints.to_regions()
+    assert [type(region) for region in regions] == [
+        PolygonSkyRegion, CircleSkyRegion, PolygonSkyRegion
+    ]
+    assert regions[1].radius == 0.5 * u.deg
+
+
+def test_footprint_array_table_column(footprints):
+    table = Table({'obs_num': [1, 2, 3], 's_region': footprints})
+
+    assert isinstance(table['s_region'], FootprintArray)
+    assert list(table[1:]['s_region']) == list(footprints)[1:]
+    assert table[0]['s_region'] == footprints[0]
+
+    table['s_region'].info.name = 'footprint'
+    assert table.colnames == ['obs_num', 'footprint']
+
+
+def test_footprint_array_table_operations(footprints, tmp_path):
+    table = Table({'obs_num': [3, 1, 2], 's_region': footprints})
+    table['s_region'].info.description = 'Footprints'
+
+    table.sort('obs_num')
+    assert list(table['s_region']) == [footprints[1], footprints[2], footprints[0]]
+    assert table['s_region'].info.description == 'Footprints'
+
+    stacked = vstack([table, table[:1]])
+    assert isinstance(stacked['s_region'], FootprintArray)
+    assert list(stacked['s_region']) == list(table['s_region']) + [footprints[1]]
+
+    table['s_region'][0] = footprints[0]
+    assert table['s_region'][0] == footprints[0]
+
+    path = tmp_path / 'footprints.ecsv'
+    table.write(path)
+    read = Table.read(path)
+    assert isinstance(read['s_region'], FootprintArray)
+    assert list(read['s_region']) == list(table['s_region'])
+    assert read['s_region'].info.description == 'Footprints'
+    assert list(table.to_pandas()['s_region']) == list(table['s_region'])
+
+
+def test_exp_table_footprint_array():
+    observation = Observation(pa=20)
+    observation.add_pattern(DitherPattern(Exposure(Angle(10 * u.deg), Angle(-60 * u.deg)),
+                                          2, 1, 60, 0, 0, 60))
+    observation.add_exposure(Exposure(Angle(10 * u.deg), Angle(-60 * u.deg),
+                                      telescope='hst', instrument='ALL'))
+    expected = observation.get_exp_table()
+    table = observation.get_exp_table(footprint_array=True)
+
+    assert isinstance(table['s_region'], FootprintArray)
+    assert table.colnames == expected.colnames
+    assert list(table['s_region'].to_stcs()) == list(expected['s_region'])
+
+    exp_list = [
+        dict(exp, s_region=table['s_region'][i:i + 1])
+        for i, exp in enumerate(observation.get_exp_list())
+    ]
+    from_list = exp_list_to_table(exp_list)
+    assert isinstance(from_list['s_region'], FootprintArray)
+    assert list(from_list['s_region']) == list(expected['s_region'])
+
+
+def test_footprint_array_unique(footprints, monkeypatch):
+    shifted = FootprintArray(
+        footprints.kinds, footprints.vertex_offsets, footprints.vertices + 1e-8,
+        footprints.radii, footprints.row_offsets,
+    )
+    combined = FootprintArray.concatenate([footprints[1:], shifted, footprints[::-1]])
+
+    index, inverse = combined.unique()
+    assert list(index) == [0, 1, 2]
+    assert list(inverse) == [0, 1, 2, 0, 1, 1, 0, 2]
+    assert list(combined.take(index).take(inverse)) == list(combined.take(index[inverse]))
+
+    # footprints which differ by more than the tolerance are not collapsed
+    index, inverse = combined.unique(tolerance=1e-10)
+    assert list(index) == [0, 1, 2, 4, 7]
+
+    # rows with the same hash are compared
+    monkeypatch.setattr(footprint_array, '_mix', lambda values: values * np.uint64(0))
+    assert [list(result) for result in combined.unique(tolerance=1e-10)] == [
+        [0, 1, 2, 4, 7], [0, 1, 2, 0, 3, 1, 0, 4]
+    ]
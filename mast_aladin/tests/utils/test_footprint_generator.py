@@ -0,0 +1,253 @@
+import pickle
+
+import numpy as np
+import pytest
+from astropy.coordinates import Angle
+from astropy.table import vstack
+import astropy.units as u
+
+from mast_aladin.utils.footprint_generator import (
+    ApertureGeometry, CustomPattern, DitherPattern, Exposure, Pointing, PointingSet,
+    EXP_TABLE_COLUMNS, MAX_VERTICES, ExpResultGenerator, Observation, Program, attitude_matrices,
+    exp_list_to_table, s_region, sky_vertices, tel_to_sky,
+)
+from mast_aladin.utils.selectSIAF import getVertices
+
+
+@pytest.fixture
+def wfi_exposure():
+    return Exposure(Angle(10 * u.deg), Angle(20 * u.deg), 5, -5)
+
+
+def test_sky_vertices_matches_pysiaf(wfi_exposure):
+    att_matrix = wfi_exposure.pointing.attitude_matrix(42)
+    vertices = sky_vertices(wfi_exposure.aperture_list, att_matrix)
+
+    assert vertices.shape == (18, 4, 2)
+    for ap, ap_vertices in zip(wfi_exposure.aperture_list, vertices):
+        ap.set_attitude_matrix(att_matrix)
+        expected = np.column_stack(ap.idl_to_sky(*getVertices(ap)))
+        np.testing.assert_allclose(ap_vertices, expected, rtol=0, atol=1e-12)
+
+
+def test_s_region_from_geometry(wfi_exposure):
+    att_matrix = wfi_exposure.pointing.attitude_matrix(0)
+    geometry = ApertureGeometry(wfi_exposure.aperture_list)
+
+    combined = s_region(geometry, att_matrix)
+
+    assert combined == s_region(wfi_exposure.aperture_list, att_matrix)
+    assert combined.count('POLYGON ICRS') == 18
+
+
+def test_circle_and_pick_apertures():
+    exposure = Exposure(
+        Angle(10 * u.deg), Angle(20 * u.deg), telescope='hst', instrument='ALL', aperture='ALL'
+    )
+    geometry = exposure.aperture_geometry
+    vertices = geometry.sky_vertices(exposure.pointing.attitude_matrix(0))
+    shapes = np.array([ap.AperShape for ap in exposure.aperture_list])
+
+    # HST FGS pickles have no vertices, circles only have their center
+    assert np.isnan(vertices[shapes == 'PICK']).all()
+    assert np.isfinite(vertices[shapes == 'CIRC', 0]).all()
+    assert np.isnan(vertices[shapes == 'CIRC', 1:]).all()
+    assert np.isfinite(vertices[shapes == 'QUAD']).all()
+
+
+def test_tel_to_sky_scalar_and_array(wfi_exposure):
+    ap = wfi_exposure.aperture_list[0]
+    att_matrix = wfi_exposure.pointing.attitude_matrix(10)
+    ap.set_attitude_matrix(att_matrix)
+
+    ra, dec = tel_to_sky(att_matrix, [ap.V2Ref, 0.0], [ap.V3Ref, 0.0])
+
+    np.testing.assert_allclose([ra[0], dec[0]], ap.tel_to_sky(ap.V2Ref, ap.V3Ref), atol=1e-12)
+    np.testing.assert_allclose([ra[1], dec[1]], tel_to_sky(att_matrix, 0.0, 0.0), atol=1e-12)
+
+
+def test_dither_pattern_pointings(wfi_exposure):
+    pattern = DitherPattern(wfi_exposure, 3, 2, 10, 1, -2, 30)
+    pointings = pattern.pointings
+
+    assert isinstance(pointings, PointingSet)
+    assert len(pointings) == 6
+
+    # columns are the outer loop of the grid
+    expected_offsets = [
+        (col * -2 + row * 10, col * 30 + row * 1)
+        for col in range(2) for row in range(3)
+    ]
+    assert list(zip(pointings.x_off, pointings.y_off)) == expected_offsets
+
+    ref_aperture = wfi_exposure.ref_aperture_siaf
+    for pointing, (x_off, y_off) in zip(pointings, expected_offsets):
+        v2, v3 = ref_aperture.idl_to_tel(
+            -x_off, -y_off, V2Ref_arcsec=wfi_exposure.V2Ref, V3Ref_arcsec=wfi_exposure.V3Ref
+        )
+        assert isinstance(pointing, Pointing)
+        assert (pointing.v2, pointing.v3) == (v2, v3)
+        assert (pointing.x_off, pointing.y_off) == (x_off, y_off)
+
+
+def test_custom_pattern_pointings(wfi_exposure):
+    pattern = CustomPattern(wfi_exposure, [(0, 0), (5.5, -3)])
+
+    assert len(pattern.pointings) == 2
+    assert pattern.pointings[1].x_off == 5.5
+    assert len(pattern.get_exp_list()) == 2 * 18
+
+
+def test_empty_pattern(wfi_exposure):
+    assert DitherPattern(wfi_exposure, 0, 0).get_exp_list() == []
+    assert CustomPattern(wfi_exposure, []).get_exp_list() == []
+
+
+@pytest.fixture
+def program():
+    program = Program(7)
+    obs = program.add_observation(Observation(pa=45))
+    obs.add_exposure(Exposure(Angle(10 * u.deg), Angle(-60 * u.deg)))
+    obs.add_pattern(DitherPattern(
+        Exposure(Angle(350 * u.deg), Angle(80 * u.deg),
+                 telescope='jwst', instrument='NIRCAM', aperture='ALL'),
+        2, 2, 60, 0, 0, 60
+    ))
+    obs = program.add_observation(Observation(pa=0))
+    obs.add_pattern(CustomPattern(
+        Exposure(Angle(0.01 * u.deg), Angle(0 * u.deg), telescope='roman', instrument='CGI'),
+        [(1, 2), (3, 4)]
+    ))
+    return program
+
+
+def test_get_exp_table_matches_exp_list(program):
+    observation = program.contents[0]
+    for generator in (program, observation, observation.contents[1], observation.contents[0]):
+        expected = exp_list_to_table(generator.get_exp_list())
+        table = generator.get_exp_table()
+
+        assert table.dtype == expected.dtype
+        for name in table.colnames:
+            assert (table[name] == expected[name]).all(), name
+
+
+@pytest.mark.parametrize('pa, offsets, expected', [
+    (0, [(1, 2), (3, 4)], ('i8', 'i8', 'i8')),
+    (30., [(1, 2), (3, 4)], ('f8', 'i8', 'i8')),
+    (0, [(1.5, 2), (3, 4)], ('i8', 'f8', 'i8')),
+])
+def test_exp_table_inferred_dtypes(pa, offsets, expected):
+    pattern = CustomPattern(
+        Exposure(Angle(0.01 * u.deg), Angle(0 * u.deg), telescope='roman', instrument='CGI'),
+        offsets
+    )
+    for table in (exp_list_to_table(pattern.get_exp_list(pa=pa)), pattern.get_exp_table(pa=pa)):
+        dtypes = tuple(table[name].dtype.str[1:] for name in ('position_angle', 'x_off', 'y_off'))
+        assert dtypes == expected
+
+
+def test_exp_result_generator_defaults(program):
+    class ExpListGenerator(ExpResultGenerator):
+        def get_exp_list(self, pa=0, program_num=0, obs_num=0, exp_num=0, pattern_point=0,
+                         pointing=None):
+            return program.get_exp_list()
+
+    generator = ExpListGenerator()
+    expected = program.get_exp_table()
+
+    assert generator._exp_count() == len(expected)
+    for table in (generator.get_exp_table(), vstack(list(generator.iter_exposures(5)))):
+        assert table.dtype == expected.dtype
+        for name in table.colnames:
+            assert (table[name] == expected[name]).all(), name
+    footprints = generator.get_exp_table(footprint_array=True)['s_region']
+    assert (footprints.to_stcs() == expected['s_region']).all()
+    with pytest.raises(NotImplementedError):
+        generator.sweep_pa([0])
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 7, 1000])
+def test_iter_exposures_chunks(program, chunk_size):
+    expected = program.get_exp_table()
+    chunks = list(program.iter_exposures(chunk_size=chunk_size))
+
+    assert [len(chunk) for chunk in chunks[:-1]] == [chunk_size] * (len(chunks) - 1)
+    assert 0 < len(chunks[-1]) <= chunk_size
+    table = vstack(chunks)
+    for name in expected.colnames:
+        assert (table[name] == expected[name]).all(), name
+
+    with pytest.raises(ValueError):
+        next(program.iter_exposures(chunk_size=0))
+
+
+def test_program_workers_match_serial(program):
+    assert program.get_exp_list(workers=2) == program.get_exp_list()
+
+    expected = program.get_exp_table()
+    table = program.get_exp_table(workers=2)
+    assert table.dtype == expected.dtype
+    for name in expected.colnames:
+        assert (table[name] == expected[name]).all(), name
+
+    footprints = program.get_exp_table(workers=2, footprint_array=True)['s_region']
+    assert (footprints.to_stcs() == expected['s_region']).all()
+
+    with pytest.raises(ValueError):
+        program.get_exp_list(workers=0)
+
+
+def test_exposure_pickle(program):
+    # exposures are pickled without their SIAF apertures
+    observation = program.contents[0]
+    data = pickle.dumps(observation)
+    assert len(data) < 10000
+
+    restored = pickle.loads(data)
+    assert restored.get_exp_list() == observation.get_exp_list()
+    exposure = restored.contents[0]
+    assert exposure.aperture_list == observation.contents[0].aperture_list
+    assert (exposure.V2Ref, exposure.V3Ref) == (
+        observation.contents[0].V2Ref, observation.contents[0].V3Ref
+    )
+
+
+def test_attitude_matrices_match_pysiaf(wfi_exposure):
+    pointing = wfi_exposure.pointing
+    pas = np.linspace(0, 360, 7)
+    matrices = attitude_matrices(pointing.v2, pointing.v3, pointing.ra, pointing.dec, pas)
+
+    assert matrices.shape == (7, 3, 3)
+    for pa, matrix in zip(pas, matrices):
+        np.testing.assert_array_equal(matrix, pointing.attitude_matrix(pa))
+
+
+def test_sweep_pa(program):
+    observation = program.contents[0]
+    pas = [0, 45, 200.5]
+    vertices, s_regions = observation.sweep_pa(pas, s_region=True)
+
+    # the WFI detectors are one row each, NIRCAM ALL is one row per pointing
+    n_nircam = len(observation.contents[1].exposure.aperture_list)
+    assert vertices.shape == (3, 18 + 4, n_nircam * MAX_VERTICES, 2)
+    np.testing.assert_array_equal(vertices, observation.sweep_pa(pas))
+
+    wfi = observation.contents[0]
+    for i, pa in enumerate(pas):
+        table = observation.get_exp_table(pa=pa)
+        assert list(s_regions[i]) == list(table['s_region'])
+        np.testing.assert_allclose(
+            vertices[i, :18, :MAX_VERTICES],
+            wfi.aperture_geometry.sky_vertices(wfi.pointing.attitude_matrix(pa)),
+            rtol=0, atol=1e-12,
+        )
+    assert np.isnan(vertices[:, :18, MAX_VERTICES:]).all()
+
+
+def test_exp_list_to_table_schema():
+    table = exp_list_to_table([])
+
+    assert table.colnames == list(EXP_TABLE_COLUMNS)
+    assert len(table) == 0
+    assert table['position_angle'].dtype == np.float64
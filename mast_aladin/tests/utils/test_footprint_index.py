@@ -0,0 +1,134 @@
+import astropy.units as u
+import numpy as np
+import pytest
+
+from mast_aladin.utils.footprint_array import CIRCLE, POLYGON, FootprintArray
+from mast_aladin.utils import footprint_index
+from mast_aladin.utils.footprint_index import (
+    FootprintIndex, _unit_vectors, bounding_caps, coverage_moc,
+)
+
+
+def square_footprints(ra, dec, size):
+    """Footprints of squares of ``size`` degrees centered on ``ra, dec``."""
+    offsets = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * size / 2
+    dec_vertices = dec[:, None] + offsets[:, 1]
+    ra_vertices = ra[:, None] + offsets[:, 0] / np.cos(np.radians(dec_vertices))
+    return FootprintArray(
+        np.full(len(ra), POLYGON),
+        np.arange(len(ra) + 1) * 4,
+        np.stack([ra_vertices % 360, dec_vertices], axis=-1).reshape(-1, 2),
+        np.full(len(ra), np.nan),
+    )
+
+
+def test_bounding_caps():
+    footprints = FootprintArray.concatenate([
+        square_footprints(np.array([359.9]), np.array([0.]), 0.2),
+        FootprintArray.empty(1),
+        # a circle and a polygon in one row
+        FootprintArray([CIRCLE, POLYGON], [0, 1, 4], [[10, 0], [10, 1], [11, 0], [10, -1]],
+                       [0.5, np.nan], [0, 2]),
+    ])
+    centers, radii = bounding_caps(footprints)
+
+    # around the RA origin
+    np.testing.assert_allclose(centers[0], _unit_vectors([359.9], [0])[0], atol=1e-12)
+    assert radii[0] == pytest.approx(0.1 * np.sqrt(2), rel=1e-4)
+    assert np.all(np.isnan(centers[1])) and np.isnan(radii[1])
+    np.testing.assert_allclose(centers[2], _unit_vectors([10.25], [0])[0], atol=1e-4)
+    # the vertices at 1 degree from the circle center are further than the circle
+    assert radii[2] == pytest.approx(np.hypot(0.25, 1), abs=1e-4)
+
+
+def test_footprint_index_query():
+    rng = np.random.default_rng(1)
+    n = 5000
+    ra = rng.uniform(0, 360, n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    sizes = rng.uniform(0.01, 1, n)
+    footprints = FootprintArray.concatenate(
+        square_footprints(ra[i:i + 1], dec[i:i + 1], sizes[i]) for i in range(n)
+    )
+    index = FootprintIndex(footprints)
+    assert len(index) == n
+
+    for center_ra, center_dec, radius in [(10, 20, 2), (200, -89, 5), (0, 0, 179), (90, 0, 0)]:
+        center = _unit_vectors([center_ra], [center_dec])[0]
+        found = index.query(center, radius)
+        angles = np.degrees(np.arccos(np.clip(index.centers @ center, -1, 1)))
+        expected = np.flatnonzero(angles <= radius + index.radii)
+        np.testing.assert_array_equal(found, expected)
+
+    # footprints without shapes are never found
+    assert len(FootprintIndex(FootprintArray.empty(3)).query([0, 0, 1], 180)) == 0
+
+
+def test_footprint_index_large_footprints(monkeypatch):
+    """Test a few large footprints do not widen the search for the small ones."""
+    ra, dec = (grid.ravel() for grid in np.meshgrid(np.arange(0, 360, 0.5), np.arange(-80, 80)))
+    footprints = FootprintArray.concatenate([
+        square_footprints(ra, dec, 0.1),
+        square_footprints(np.array([100., 250.]), np.array([0., 30.]), 24),
+    ])
+    index = FootprintIndex(footprints)
+
+    angles = footprint_index._angles
+    n_candidates = []
+
+    def counted_angles(vectors, others):
+        n_candidates.append(len(vectors))
+        return angles(vectors, others)
+
+    monkeypatch.setattr(footprint_index, '_angles', counted_angles)
+    center = _unit_vectors([100.2], [0.1])[0]
+    found = index.query(center, 0.2)
+
+    expected = np.flatnonzero(angles(index.centers, center) <= 0.2 + index.radii)
+    np.testing.assert_array_equal(found, expected)
+    assert len(footprints) - 2 in found
+    # the small footprints around the cap, and the large ones
+    assert n_candidates[0] < 20
+
+
+def test_coverage_moc():
+    """Test the coverage of footprints includes the cells inside them."""
+    healpix = pytest.importorskip('astropy_healpix')
+    footprints = FootprintArray.concatenate([
+        square_footprints(np.array([10.]), np.array([20.]), 2.),
+        # an L shape, without its upper right quarter
+        FootprintArray([POLYGON], [0, 6], [
+            [100, 0], [102, 0], [102, 1], [101, 1], [101, 2], [100, 2]
+        ], [np.nan]),
+        FootprintArray([CIRCLE], [0, 1], [[200, -30]], [1.]),
+    ])
+    ((order, cells),) = coverage_moc(footprints, 100_000, min_size=2 * 1.5 / 128).items()
+    assert order == '11'
+    # about 7 square degrees in cells about 0.029 degrees wide
+    assert len(cells) == pytest.approx((4 + 3 + np.pi) / (58.6 / 2**11)**2, rel=0.1)
+
+    def covered(ra, dec):
+        return np.isin(healpix.lonlat_to_healpix(
+            np.array(ra) * u.deg, np.array(dec) * u.deg, 2**11, order='nested'
+        ), cells)
+
+    assert np.all(covered(
+        [10, 10.5, 9.2, 100.5, 101.5, 100.5, 200, 200.5],
+        [20, 20.5, 19.2, 0.5, 0.5, 1.5, -30, -30.5],
+    ))
+    assert not np.any(covered([101.5, 12, 200, 202], [1.5, 20, -31.2, -30]))
+
+    # shapes larger than 60 degrees are covered by their caps
+    ((order, cells),) = coverage_moc(
+        FootprintArray([CIRCLE], [0, 1], [[0, 90]], [70.]), 100_000, min_size=1
+    ).items()
+    assert order == '5'
+    assert len(cells) == pytest.approx(
+        12 * 4**5 * (1 - np.cos(np.radians(70))) / 2, rel=0.1
+    )
+
+    assert coverage_moc(FootprintArray.empty(2), 10, min_size=1) == {'5': []}
+
+    # the cells are merged into at most `max_cells`
+    ((order, cells),) = coverage_moc(footprints, 10, min_size=2 * 1.5 / 128).items()
+    assert 0 < len(cells) <= 10
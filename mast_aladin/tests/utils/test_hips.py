@@ -0,0 +1,180 @@
+import os
+import urllib.request
+import warnings
+
+import numpy as np
+import pytest
+import astropy.units as u
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from mast_aladin.utils.hips import (
+    HipsBuilder, HipsServer, tile_lonlat, tile_offsets, tile_path,
+)
+
+healpix = pytest.importorskip('astropy_healpix')
+
+
+def write_image(path, ra, shape=(120, 100)):
+    """Write an image of ``x + 1000 * y`` with 1 arcsec pixels centered on ``ra, 10``."""
+    wcs = WCS(naxis=2)
+    wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    wcs.wcs.crval = [ra, 10]
+    wcs.wcs.crpix = [shape[1] / 2, shape[0] / 2]
+    wcs.wcs.cdelt = [-1 / 3600, 1 / 3600]
+    y, x = np.indices(shape)
+    fits.PrimaryHDU((x + 1000. * y).astype(np.float32), header=wcs.to_header()).writeto(
+        path, overwrite=True
+    )
+    return wcs
+
+
+def tile_mtimes(directory):
+    return {path: path.stat().st_mtime_ns for path in directory.glob('Norder*/Dir*/*.fits')}
+
+
+def test_tile_offsets():
+    dx, dy = tile_offsets(2)
+    np.testing.assert_array_equal(dx, [[0.25, 0.25], [0.75, 0.75]][::-1])
+    np.testing.assert_array_equal(dy, [[0.25, 0.75], [0.25, 0.75]])
+    assert str(tile_path('hips', 3, 12345)) == os.path.join(
+        'hips', 'Norder3', 'Dir10000', 'Npix12345.fits'
+    )
+
+
+@pytest.mark.parametrize('order, index', [(0, 4), (3, 300), (5, 11000)])
+def test_tile_children_quadrants(order, index):
+    """Test the four tiles of the next order fill the quadrants binned into a tile."""
+    lon, lat = tile_lonlat(order, index, 4)
+    children = healpix.lonlat_to_healpix(
+        lon * u.deg, lat * u.deg, 2**(order + 1), order='nested'
+    )
+    # rows along decreasing dx, the first bit of the child index
+    np.testing.assert_array_equal(children[2:, :2], 4 * index + 0)
+    np.testing.assert_array_equal(children[:2, :2], 4 * index + 1)
+    np.testing.assert_array_equal(children[2:, 2:], 4 * index + 2)
+    np.testing.assert_array_equal(children[:2, 2:], 4 * index + 3)
+
+
+def test_hips_builder(tmp_path):
+    directory = tmp_path / 'hips'
+    path = tmp_path / 'image.fits'
+    wcs = write_image(path, 150)
+
+    builder = HipsBuilder(directory, tile_width=64, workers=1)
+    assert builder.build([path]) > 0
+
+    properties = dict(
+        line.split('=', 1) for line in (directory / 'properties').read_text().splitlines()
+    )
+    properties = {key.strip(): value.strip() for key, value in properties.items()}
+    order = int(properties['hips_order'])
+    # 64 pixels of 1.6 arcsec at order 11, 0.8 arcsec at order 12
+    assert order == 12
+    assert properties['hips_tile_format'] == 'fits'
+    assert float(properties['hips_initial_ra']) == pytest.approx(150, abs=0.01)
+    assert float(properties['hips_initial_dec']) == pytest.approx(10, abs=0.01)
+    low, high = map(float, properties['hips_pixel_cut'].split())
+    assert 0 <= low < high <= 119099
+
+    for tile_order in range(order + 1):
+        assert list(directory.glob(f'Norder{tile_order}/Dir*/*.fits'))
+
+    # tiles sample x + 1000 * y at the pixels they cover
+    for tile in directory.glob(f'Norder{order}/Dir*/*.fits'):
+        index = int(tile.stem[4:])
+        data = fits.getdata(tile)
+        lon, lat = tile_lonlat(order, index, 64)
+        x, y = wcs.world_to_pixel_values(lon, lat)
+        covered = np.isfinite(data)
+        assert covered.any()
+        inside = (x > 0) & (x < 99) & (y > 0) & (y < 119)
+        assert np.all(covered[inside])
+        # within 1e-4 pixels along y, interpolated between nodes
+        np.testing.assert_allclose(data[inside], (x + 1000 * y)[inside], atol=0.1)
+
+    # binned tiles hold the means of blocks of their children
+    parent = tile_path(directory, order - 1, index // 4)
+    quadrant = {0: (1, 0), 1: (0, 0), 2: (1, 1), 3: (0, 1)}[index % 4]
+    rows, columns = (slice(32 * q, 32 * q + 32) for q in quadrant)
+    binned = fits.getdata(parent)[rows, columns]
+    with warnings.catch_warnings():
+        # blocks outside of the image
+        warnings.simplefilter('ignore', RuntimeWarning)
+        expected = np.nanmean(data.reshape(32, 2, 32, 2), axis=(1, 3))
+    np.testing.assert_allclose(binned, expected, rtol=1e-5)
+
+
+def test_hips_builder_rebuild(tmp_path):
+    directory = tmp_path / 'hips'
+    first, second = tmp_path / 'first.fits', tmp_path / 'second.fits'
+    write_image(first, 150)
+    write_image(second, 160)
+
+    builder = HipsBuilder(directory, order=8, tile_width=64, workers=1)
+    builder.build([first, second])
+    tiles = tile_mtimes(directory)
+    assert builder.build([first, second]) == 0
+    assert tile_mtimes(directory) == tiles
+
+    # only the tiles of the changed image are written again
+    write_image(second, 160, shape=(100, 100))
+    assert builder.build([first, second]) > 0
+    rebuilt = [
+        int(path.stem[4:]) for path, mtime in tile_mtimes(directory).items()
+        if path.parts[-3] == 'Norder8' and tiles[path] != mtime
+    ]
+    assert rebuilt
+    lon, lat = healpix.healpix_to_lonlat(rebuilt, 2**8, order='nested')
+    np.testing.assert_allclose(lon.deg, 160, atol=0.5)
+
+    # the tiles of removed images are deleted
+    builder.build([first])
+    assert len(tile_mtimes(directory)) < len(tiles)
+
+    # the same tiles are built by a pool of processes
+    pool_directory = tmp_path / 'pool'
+    HipsBuilder(pool_directory, order=8, tile_width=64, workers=2).build([first])
+    assert sorted(path.relative_to(pool_directory) for path in tile_mtimes(pool_directory)) == (
+        sorted(path.relative_to(directory) for path in tile_mtimes(directory))
+    )
+
+
+def test_hips_server(tmp_path, MastAladin_app):
+    directory = tmp_path / 'hips'
+    path = tmp_path / 'image.fits'
+    write_image(path, 150)
+    HipsBuilder(directory, order=6, tile_width=64, workers=1).build([path])
+
+    server = MastAladin_app.add_hips(directory)
+    assert isinstance(server, HipsServer)
+    try:
+        assert MastAladin_app.overlay_survey == server.url
+        assert MastAladin_app.add_hips(directory, overlay=False) is server
+        assert MastAladin_app.survey == server.url
+
+        with urllib.request.urlopen(f'{server.url}/properties') as response:
+            assert response.headers['Access-Control-Allow-Origin'] == '*'
+            assert b'hips_order' in response.read()
+        tile = next(iter(tile_mtimes(directory))).relative_to(directory).as_posix()
+        with urllib.request.urlopen(f'{server.url}/{tile}') as response:
+            assert response.status == 200
+
+        # only the files of the HiPS are served, not the inputs or listings
+        for path in ('', 'Norder6/', 'mast_aladin_inputs.json', 'properties/../image.fits'):
+            with pytest.raises(urllib.error.HTTPError, match='404'):
+                urllib.request.urlopen(f'{server.url}/{path}')
+    finally:
+        MastAladin_app.remove_hips(directory)
+    server._thread.join(5)
+    assert not server._thread.is_alive()
+
+    with pytest.raises(ValueError, match='not served'):
+        MastAladin_app.remove_hips(directory)
+    with pytest.raises(ValueError, match='does not contain a HiPS'):
+        MastAladin_app.add_hips(tmp_path)
+
+    server = MastAladin_app.add_hips(directory)
+    MastAladin_app.close()
+    server._thread.join(5)
+    assert not server._thread.is_alive()
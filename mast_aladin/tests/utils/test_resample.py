@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from astropy.wcs import WCS, DistortionLookupTable, Sip
+
+from mast_aladin.utils.resample import MappingCache, linear_wcs, resample_to_linear
+
+
+@pytest.fixture
+def sip_wcs():
+    wcs = WCS(naxis=2)
+    wcs.wcs.crpix = [50, 40]
+    wcs.wcs.cdelt = [-1e-4, 1e-4]
+    wcs.wcs.crval = [10, 20]
+    wcs.wcs.ctype = ['RA---TAN-SIP', 'DEC--TAN-SIP']
+    a = np.zeros((3, 3))
+    b = np.zeros((3, 3))
+    a[2, 0] = 2e-4
+    b[1, 1] = -1e-4
+    wcs.sip = Sip(a, b, None, None, wcs.wcs.crpix)
+    return wcs
+
+
+def test_linear_wcs(sip_wcs):
+    linear = linear_wcs(sip_wcs)
+    assert not linear.has_distortion
+    assert list(linear.wcs.ctype) == ['RA---TAN', 'DEC--TAN']
+    assert sip_wcs.has_distortion
+
+
+def test_resample_to_linear(sip_wcs):
+    # bilinear interpolation is exact for a linear image
+    y, x = np.mgrid[:80, :100]
+    data = 3 * x + 2 * y
+    cache = MappingCache()
+
+    resampled, linear = resample_to_linear(data, sip_wcs, block_rows=16, node_step=4, cache=cache)
+    assert not linear.has_distortion
+    assert resampled.shape[0] > 80 or resampled.shape[1] > 100
+
+    out_y, out_x = np.mgrid[:resampled.shape[0], :resampled.shape[1]]
+    in_x, in_y = sip_wcs.all_world2pix(*linear.pixel_to_world_values(out_x, out_y), 0)
+    inside = (in_x >= 0) & (in_x <= 99) & (in_y >= 0) & (in_y <= 79)
+    np.testing.assert_allclose(resampled[inside], (3 * in_x + 2 * in_y)[inside], atol=0.02)
+    outside = (in_x < -0.01) | (in_x > 99.01) | (in_y < -0.01) | (in_y > 79.01)
+    assert outside.any() and np.all(np.isnan(resampled[outside]))
+
+    again, _ = resample_to_linear(data, sip_wcs, node_step=4, cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    np.testing.assert_array_equal(again, resampled)
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_resample_without_distortion(sip_wcs):
+    sip_wcs.sip = None
+    data = np.arange(12).reshape(3, 4)
+
+    resampled, linear = resample_to_linear(data, sip_wcs)
+    np.testing.assert_array_equal(resampled, data)
+    assert resampled.dtype == np.float32
+
+
+def test_resample_lookup_tables(sip_wcs):
+    """Test WCS with the same header but different lookup tables are cached apart."""
+    sip_wcs.sip = None
+    data = np.tile(np.arange(100.), (80, 1))
+    cache = MappingCache()
+
+    results = []
+    for shift in (0.5, 2.):
+        table = np.full((3, 3), shift, dtype=np.float32)
+        sip_wcs.cpdis1 = DistortionLookupTable(table, (2, 2), (50, 40), (50, 40))
+        resampled, linear = resample_to_linear(data, sip_wcs, node_step=4, cache=cache)
+        uncached, _ = resample_to_linear(data, sip_wcs, node_step=4, cache=False)
+        np.testing.assert_array_equal(resampled, uncached)
+        results.append(resampled)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 2)
+    assert not np.array_equal(*results, equal_nan=True)
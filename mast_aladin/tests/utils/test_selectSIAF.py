@@ -0,0 +1,54 @@
+import pytest
+
+from mast_aladin.utils.selectSIAF import SiafCache, defineApertures, siaf_cache
+
+
+def test_siaf_cache_hits_and_misses():
+    cache = SiafCache()
+
+    first = cache.get('roman')
+    second = cache.get('ROMAN')
+
+    assert first is second
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert 'Roman' in cache
+
+
+def test_siaf_cache_lru_eviction():
+    cache = SiafCache(maxsize=2)
+    cache.get('roman')
+    cache.get('niriss')
+
+    # touch roman so that niriss becomes the least recently used entry
+    cache.get('roman')
+    cache.get('fgs')
+
+    assert len(cache) == 2
+    assert 'roman' in cache
+    assert 'niriss' not in cache
+    assert 'fgs' in cache
+
+
+def test_siaf_cache_preload_jwst():
+    cache = SiafCache()
+    cache.preload('jwst')
+
+    assert cache.misses == 5
+    assert cache.info()['names'] == ['FGS', 'MIRI', 'NIRCAM', 'NIRSPEC', 'NIRISS']
+
+
+def test_siaf_cache_invalid_maxsize():
+    with pytest.raises(ValueError, match='maxsize'):
+        SiafCache(maxsize=0)
+
+
+def test_define_apertures_reuses_siaf():
+    defineApertures('roman', 'WFI', 'ALL')
+    misses = siaf_cache.misses
+
+    apertures, _, _, ref_aperture = defineApertures('roman', 'WFI', 'ALL')
+
+    assert siaf_cache.misses == misses
+    assert len(apertures) == 18
+    assert ref_aperture.AperName == 'WFI_CEN'
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from astropy.table import Table
+
+from mast_aladin.utils.footprint_array import CIRCLE, POLYGON, FootprintArray
+from mast_aladin.utils.stcs import format_stcs, parse_stcs
+
+
+def test_parse_stcs():
+    footprints = parse_stcs([
+        'POLYGON ICRS 1 2 3 4 5 6',
+        '',
+        'CIRCLE ICRS 10.5 -20 0.25',
+        'Union ICRS (Polygon 1 2 3 4 5 6 7 8 Circle FK5 1.5e1 2 1)',
+        'POLYGON ICRS  245.959199687 -26.421462986\t245.921398055 -26.409589788 '
+        '245.907787180 -26.442832315 POLYGON J2000 0 0 1 0 1 1',
+    ])
+
+    assert len(footprints) == 5
+    assert list(footprints.n_shapes) == [1, 0, 1, 2, 2]
+    assert list(footprints.kinds) == [POLYGON, CIRCLE, POLYGON, CIRCLE, POLYGON, POLYGON]
+    assert list(np.diff(footprints.vertex_offsets)) == [3, 1, 4, 1, 3, 3]
+    np.testing.assert_array_equal(footprints.radii[[1, 3]], [0.25, 1])
+    np.testing.assert_array_equal(footprints.vertices[3], [10.5, -20])
+    np.testing.assert_array_equal(footprints.vertices[8], [15, 2])
+    # the coordinates are read exactly as by float
+    assert footprints.vertices[9, 0] == 245.959199687
+    assert footprints.vertices[10, 1] == -26.409589788
+
+
+@pytest.mark.parametrize('strings, match', [
+    (['BOX ICRS 1 2 3 4'], "Unsupported STC-S token 'BOX'"),
+    (['POLYGON ICRS 1 2 3 4 5 6', 'NOT (CIRCLE 1 2 3)'], "Unsupported STC-S token 'NOT'"),
+    (['ICRS 1 2 POLYGON 1 2 3 4 5 6'], 'must follow a shape'),
+    (['POLYGON 1 2 3 4 5 6', '1 2 3'], 'must follow a shape'),
+    (['CIRCLE ICRS 1 2'], 'circles must have 3 coordinates'),
+    (['POLYGON ICRS 1 2 3 4 5 6 7'], 'even number'),
+    (['POLYGON ICRS 1 2 3 4 5'], 'even number'),
+    (['POLYGON ICRS 1 2 3 4 5 6.6.6'], 'Invalid STC-S coordinates'),
+    (['CIRCLE ICRS 1 2 3°'], 'ASCII'),
+])
+def test_parse_stcs_errors(strings, match):
+    with pytest.raises(ValueError, match=match):
+        parse_stcs(strings)
+
+
+def test_format_stcs():
+    footprints = FootprintArray(
+        [POLYGON, CIRCLE, POLYGON, CIRCLE],
+        [0, 4, 5, 8, 9],
+        np.arange(18.).reshape(9, 2),
+        [np.nan, 0.5, np.nan, 1e-5],
+        [0, 2, 2, 4],
+    )
+
+    assert list(format_stcs(footprints)) == [
+        'POLYGON ICRS 0.00000000 1.00000000 2.00000000 3.00000000 4.00000000 '
+        '5.00000000 6.00000000 7.00000000 CIRCLE ICRS 8.0 9.0 0.5 ',
+        '',
+        'POLYGON ICRS 10.00000000 11.00000000 12.00000000 13.00000000 14.00000000 '
+        '15.00000000 CIRCLE ICRS 16.0 17.0 1e-05 ',
+    ]
+    assert list(format_stcs(FootprintArray.empty(2))) == ['', '']
+    assert len(format_stcs(FootprintArray.empty())) == 0
+
+    # formatted strings are parsed back to the same footprints
+    parsed = parse_stcs(format_stcs(footprints))
+    for name in ('kinds', 'vertex_offsets', 'vertices', 'radii', 'row_offsets'):
+        np.testing.assert_array_equal(getattr(parsed, name), getattr(footprints, name))
+
+
+def test_parse_stcs_column(mast_observation_table):
+    """Test parsing table columns, and the FootprintArray methods using the module."""
+    s_region = mast_observation_table['s_region']
+    footprints = FootprintArray.from_stcs(s_region)
+
+    assert len(footprints) == len(s_region)
+    assert len(footprints.vertices) == 4 * len(s_region)
+    np.testing.assert_allclose(
+        footprints.vertices.reshape(len(s_region), -1),
+        [np.array(stcs.split()[2:], dtype=float) for stcs in s_region],
+    )
+    np.testing.assert_array_equal(
+        FootprintArray.from_stcs(Table({'s': s_region.astype(bytes)})['s']).vertices,
+        footprints.vertices,
+    )
+    assert list(footprints) == list(footprints.to_stcs())
+    assert footprints[0] == footprints.to_stcs()[0]
@@ -0,0 +1,52 @@
+import os
+
+from astropy.io import fits
+
+from mast_aladin.tests.test_add_asdf import create_example_gwcs
+from mast_aladin.utils.wcs_cache import FitsHeaderCache, gwcs_to_fits_header
+
+
+def test_gwcs_to_fits_header(tmp_path):
+    cache = FitsHeaderCache(tmp_path)
+    gwcs = create_example_gwcs((20, 10))
+
+    header = gwcs_to_fits_header(gwcs, cache=cache)
+    assert header == fits.Header(gwcs.to_fits()[0])
+    assert gwcs_to_fits_header(create_example_gwcs((20, 10)), cache=cache) == header
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+    # the fit options and the GWCS are part of the key
+    gwcs_to_fits_header(gwcs, cache=cache, npoints=16)
+    gwcs_to_fits_header(create_example_gwcs((20, 12)), cache=cache)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 3)
+
+    cache.clear()
+    assert cache.info()['size'] == 0 and cache.hits == 0
+
+
+def test_fits_header_cache_file_key(tmp_path):
+    gwcs = create_example_gwcs((20, 10))
+    path = tmp_path / 'image.asdf'
+    path.write_bytes(b'image')
+
+    key = FitsHeaderCache.key(gwcs, path)
+    assert FitsHeaderCache.key(gwcs, path, degree=3) != key
+    os.utime(path, ns=(0, 0))
+    assert FitsHeaderCache.key(gwcs, path) != key
+
+
+def test_fits_header_cache_eviction(tmp_path):
+    header = fits.Header([('CRVAL1', 1.0)])
+    cache = FitsHeaderCache(tmp_path / 'cache', max_bytes=2 * len(header.tostring()))
+
+    for i, key in enumerate(['a', 'b']):
+        cache.put(key, header)
+        os.utime(cache._path(key), ns=(i, i))
+    # reading 'a' makes 'b' the least recently used header
+    assert cache.get('a') == header
+    cache.put('c', header)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == header and cache.get('c') == header
+    assert cache.info()['bytes'] <= cache.max_bytes
+    assert sorted(path.name for path in (tmp_path / 'cache').iterdir()) == ['a.hdr', 'c.hdr']
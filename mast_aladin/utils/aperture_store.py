@@ -0,0 +1,385 @@
+"""
+Precompiled, read-only store of SIAF aperture geometry.
+
+Parsing the SIAF XML files with `pysiaf` is the dominant cost of creating the
+first `~mast_aladin.utils.footprint_generator.Exposure` in a kernel. This
+module extracts everything the footprint generator needs from every aperture
+that `~mast_aladin.utils.selectSIAF.defineApertures` can select into a single
+structured ``.npy`` array, which is memory-mapped when loaded so that several
+worker processes can share it.
+
+Build the store once for the installed pysiaf with::
+
+    python -m mast_aladin.utils.aperture_store
+
+and create exposures from it with ``Exposure(..., aperture_store=True)``.
+"""
+import argparse
+import functools
+import os
+from pathlib import Path
+
+import astropy.units as u
+import numpy as np
+import pysiaf
+from astropy.config import get_cache_dir_path
+from pysiaf.utils import rotations
+
+from mast_aladin.utils.selectSIAF import SIAF_NAMES, getSiaf, getVertices
+
+__all__ = [
+    'ApertureStore',
+    'StoredAperture',
+    'StoredSiaf',
+    'build_aperture_store',
+    'default_store_path',
+    'load_aperture_store',
+]
+
+# Maximum number of ideal-frame vertices per aperture (QUAD and RECT shapes)
+MAX_VERTICES = 4
+
+STORE_DTYPE = np.dtype([
+    ('siaf', 'U8'),
+    ('name', 'U40'),
+    ('observatory', 'U8'),
+    ('shape', 'U8'),
+    ('aper_type', 'U16'),
+    ('V2Ref', 'f8'),
+    ('V3Ref', 'f8'),
+    ('V3IdlYAngle', 'f8'),
+    ('VIdlParity', 'f8'),
+    ('maj', 'f8'),
+    # number of valid rows in ``idl_vertices``: 4 for polygons, 1 for
+    # circles (the center), 0 for shapes without vertices
+    ('n_vertices', 'i1'),
+    ('idl_vertices', 'f8', (MAX_VERTICES, 2)),
+    # planar idl->tel transform, ``[v2, v3] = idl_to_tel @ [x, y, 1]``
+    ('idl_to_tel', 'f8', (2, 3)),
+    # False when idl->tel is not the planar approximation (HST FGS TVS)
+    ('planar', '?'),
+])
+
+
+def default_store_path():
+    """
+    Return the default location of the aperture store for the installed
+    version of pysiaf.
+    """
+    return get_cache_dir_path('mast_aladin') / f'siaf_apertures_pysiaf-{pysiaf.__version__}.npy'
+
+
+def _float(value):
+    return np.nan if value is None else float(value)
+
+
+def _is_planar(aperture):
+    # HstAperture.idl_to_tel uses the FGS TVS matrix instead of the planar
+    # approximation for the FGS apertures
+    return not (
+        aperture.observatory == 'HST'
+        and 'FGS' in aperture.AperName
+        and aperture.AperType not in ['PSEUDO']
+    )
+
+
+def _idl_to_tel_coefficients(parity, angle_deg, v2_ref, v3_ref):
+    # see pysiaf.aperture._telescope_transform_model
+    angle = np.deg2rad(angle_deg)
+    return np.array([
+        [parity * np.cos(angle), np.sin(angle), v2_ref],
+        [(0. - parity) * np.sin(angle), np.cos(angle), v3_ref],
+    ])
+
+
+def _aperture_record(siaf_name, aperture):
+    record = np.zeros((), dtype=STORE_DTYPE)
+    record['siaf'] = siaf_name
+    record['name'] = aperture.AperName
+    record['observatory'] = aperture.observatory
+    record['shape'] = aperture.AperShape or ''
+    record['aper_type'] = aperture.AperType or ''
+    for key in ('V2Ref', 'V3Ref', 'V3IdlYAngle', 'VIdlParity'):
+        record[key] = _float(getattr(aperture, key, None))
+    record['maj'] = _float(getattr(aperture, 'maj', None))
+    record['planar'] = _is_planar(aperture)
+    record['idl_to_tel'] = _idl_to_tel_coefficients(
+        record['VIdlParity'], record['V3IdlYAngle'], record['V2Ref'], record['V3Ref']
+    )
+
+    record['idl_vertices'] = np.nan
+    if aperture.AperShape in ('QUAD', 'RECT', 'CIRC'):
+        try:
+            xVertices, yVertices = getVertices(aperture)
+        except AttributeError:
+            # some HST apertures are missing their vertex attributes
+            return record
+        vertices = np.column_stack([np.atleast_1d(xVertices), np.atleast_1d(yVertices)])
+        record['n_vertices'] = len(vertices)
+        record['idl_vertices'][:len(vertices)] = vertices
+
+    return record
+
+
+def build_aperture_store(path=None, siaf_names=SIAF_NAMES):
+    """
+    Parse the SIAFs with pysiaf and write the geometry of all of their
+    apertures to a structured ``.npy`` file.
+
+    Parameters
+    ----------
+    path : str or `~pathlib.Path`, optional
+        Output file. Defaults to `default_store_path`.
+    siaf_names : iterable of str, optional
+        Telescope or JWST instrument names of the SIAFs to include.
+        Defaults to every SIAF used by ``defineApertures``.
+
+    Returns
+    -------
+    `~pathlib.Path`
+        The path of the written store.
+    """
+    path = Path(default_store_path() if path is None else path)
+    records = [
+        _aperture_record(name.upper(), aperture)
+        for name in siaf_names
+        for aperture in getSiaf(name).apertures.values()
+    ]
+    store = np.array(records, dtype=STORE_DTYPE)
+
+    # write to a temporary file first so that processes reading the store
+    # never see a partially written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, store)
+    os.replace(tmp_path, path)
+
+    _load_aperture_store.cache_clear()
+    return path
+
+
+class StoredAperture:
+    """
+    Aperture backed by one record of an `ApertureStore`.
+
+    Implements the subset of the `pysiaf.aperture.Aperture` interface that
+    ``selectSIAF`` and ``footprint_generator`` use, so it can be used in place
+    of a pysiaf aperture without parsing any SIAF XML.
+    """
+
+    def __init__(self, record):
+        self._record = record
+        self._attitude_matrix = None
+
+        self.AperName = str(record['name'])
+        self.AperShape = str(record['shape']) or None
+        self.AperType = str(record['aper_type']) or None
+        self.observatory = str(record['observatory'])
+        self.V2Ref = float(record['V2Ref'])
+        self.V3Ref = float(record['V3Ref'])
+        self.V3IdlYAngle = float(record['V3IdlYAngle'])
+        self.VIdlParity = float(record['VIdlParity'])
+        self.maj = float(record['maj'])
+
+        # expose the vertices under both the JWST/Roman and the HST attribute
+        # names so that ``getVertices`` works unchanged
+        vertices = record['idl_vertices']
+        if record['n_vertices'] == MAX_VERTICES:
+            for i in range(MAX_VERTICES):
+                x, y = float(vertices[i, 0]), float(vertices[i, 1])
+                setattr(self, f'XIdlVert{i + 1}', x)
+                setattr(self, f'YIdlVert{i + 1}', y)
+                setattr(self, f'v{i + 1}x', x)
+                setattr(self, f'v{i + 1}y', y)
+
+    def __repr__(self):
+        return f'<StoredAperture {self.AperName}>'
+
+    def __getstate__(self):
+        return {'record': self._record.copy(), 'attitude_matrix': self._attitude_matrix}
+
+    def __setstate__(self, state):
+        self.__init__(state['record'])
+        self._attitude_matrix = state['attitude_matrix']
+
+    @property
+    def idl_vertices(self):
+        """(n_vertices, 2) array of the ideal-frame vertices."""
+        return np.array(self._record['idl_vertices'][:self._record['n_vertices']])
+
+    @property
+    def idl_to_tel_coefficients(self):
+        """(2, 3) affine coefficients of the planar idl->tel transform."""
+        return np.array(self._record['idl_to_tel'])
+
+    @functools.cached_property
+    def _siaf_aperture(self):
+        return getSiaf(str(self._record['siaf']))[self.AperName]
+
+    def set_attitude_matrix(self, attmat):
+        """Set an attitude matrix, for use in subsequent transforms to sky frame."""
+        if attmat.shape != (3, 3):
+            raise ValueError(
+                "Attitude matrix has an invalid shape. Please supply a 3x3 matrix"
+            )
+        self._attitude_matrix = attmat
+
+    def idl_to_tel(self, x_idl, y_idl, V3IdlYAngle_deg=None, V2Ref_arcsec=None,
+                   V3Ref_arcsec=None):
+        """
+        Convert from ideal to telescope (V2/V3) coordinates with the planar
+        approximation, as `pysiaf.aperture.Aperture.idl_to_tel` does by
+        default.
+        """
+        if not self._record['planar']:
+            return self._siaf_aperture.idl_to_tel(
+                x_idl, y_idl, V3IdlYAngle_deg=V3IdlYAngle_deg,
+                V2Ref_arcsec=V2Ref_arcsec, V3Ref_arcsec=V3Ref_arcsec,
+            )
+
+        if V3IdlYAngle_deg is None:
+            if np.isnan(self.V3IdlYAngle):
+                raise RuntimeError(f'Attribute V3IdlYAngle of {self.AperName} is nan')
+            coefficients = self._record['idl_to_tel']
+        else:
+            coefficients = _idl_to_tel_coefficients(
+                self.VIdlParity, V3IdlYAngle_deg, self.V2Ref, self.V3Ref
+            )
+
+        if V2Ref_arcsec is None:
+            V2Ref_arcsec = self.V2Ref
+        if V3Ref_arcsec is None:
+            V3Ref_arcsec = self.V3Ref
+
+        v2 = (coefficients[0, 0] * x_idl + coefficients[0, 1] * y_idl) + V2Ref_arcsec
+        v3 = (coefficients[1, 0] * x_idl + coefficients[1, 1] * y_idl) + V3Ref_arcsec
+        return v2, v3
+
+    def tel_to_sky(self, *args):
+        """Tel to sky frame transformation. Requires an attitude matrix."""
+        if self._attitude_matrix is None:
+            raise RuntimeError(
+                "An attitude matrix must be supplied to transform to sky coords. "
+                "Use .set_attitude_matrix()."
+            )
+        sky_coords_radians = rotations.tel_to_sky(self._attitude_matrix, *args)
+        return tuple(s.to_value(u.deg) for s in sky_coords_radians)
+
+    def idl_to_sky(self, *args):
+        return self.tel_to_sky(*self.idl_to_tel(*args))
+
+
+class StoredSiaf:
+    """
+    Read-only, `pysiaf.Siaf`-like collection of `StoredAperture` objects.
+    """
+
+    def __init__(self, name, records):
+        self.name = name
+        self.apertures = {str(record['name']): StoredAperture(record) for record in records}
+
+    def __getitem__(self, name):
+        return self.apertures[name]
+
+    def __contains__(self, name):
+        return name in self.apertures
+
+    def __len__(self):
+        return len(self.apertures)
+
+    def __repr__(self):
+        return f'<StoredSiaf {self.name} with {len(self)} apertures>'
+
+
+class ApertureStore:
+    """
+    Aperture geometry loaded from a file written by `build_aperture_store`.
+
+    Parameters
+    ----------
+    path : str or `~pathlib.Path`
+        Path to the store.
+    mmap : bool, optional
+        Memory-map the store read-only instead of reading it into memory.
+        Default is `True`.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = Path(path)
+        self.records = np.load(self.path, mmap_mode='r' if mmap else None)
+        if self.records.dtype != STORE_DTYPE:
+            raise ValueError(
+                f"{self.path} is not an aperture store compatible with this version "
+                "of mast-aladin. Rebuild it with `python -m mast_aladin.utils.aperture_store`."
+            )
+        self._siafs = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return f'<ApertureStore {self.path} with {len(self)} apertures>'
+
+    @property
+    def siaf_names(self):
+        return sorted(set(self.records['siaf']))
+
+    def siaf(self, name):
+        """
+        Return the `StoredSiaf` for a telescope or JWST instrument name. This
+        can be passed as the ``siafLoader`` of ``defineApertures``.
+        """
+        key = str(name).upper()
+        if key not in self._siafs:
+            records = self.records[self.records['siaf'] == key]
+            if not len(records):
+                raise KeyError(f"SIAF {name!r} is not in the aperture store {self.path}")
+            self._siafs[key] = StoredSiaf(key, records)
+        return self._siafs[key]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_aperture_store(path):
+    return ApertureStore(path)
+
+
+def load_aperture_store(path=None):
+    """
+    Return the `ApertureStore` at ``path``, shared by all callers in the
+    process.
+
+    Parameters
+    ----------
+    path : str or `~pathlib.Path`, optional
+        Path to the store. Defaults to `default_store_path`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the store has not been built yet.
+    """
+    path = Path(default_store_path() if path is None else path)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No aperture store found at {path}. Build it with "
+            "`python -m mast_aladin.utils.aperture_store`."
+        )
+    return _load_aperture_store(path.resolve())
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Build the mast-aladin SIAF aperture store from the installed pysiaf."
+    )
+    parser.add_argument(
+        '-o', '--output', default=None,
+        help=f"output path (default: {default_store_path()})"
+    )
+    parsed = parser.parse_args(args)
+    path = build_aperture_store(parsed.output)
+    print(f"Wrote {len(np.load(path, mmap_mode='r'))} apertures to {path}")
+
+
+if __name__ == '__main__':
+    main()
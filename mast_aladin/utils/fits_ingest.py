@@ -0,0 +1,508 @@
+"""
+Serialize FITS images into the payload sent to the Aladin Lite widget.
+
+`ipyaladin.Aladin.add_fits` writes a whole `~astropy.io.fits.HDUList` to an
+in-memory file and then copies it into the message buffer. For large images
+this holds several full copies of the data at once. `image_payload` instead
+allocates the payload once and copies the image into it straight from its
+source array, which can be a memory map of the file on disk.
+
+`image_payload` can also encode the image at a reduced precision, as
+float32 or as scaled int16 or uint8 integers, to reduce the size of the
+payload.
+
+For progressive loading, `block_mean` and `binned_wcs` build the lower
+resolution levels of an image, listed by `progressive_factors`, and
+`viewport_window`, `cutout` and `window_wcs` the cutouts of an image sent for
+the current viewport in windowed mode.
+"""
+import hashlib
+import logging
+import sys
+import warnings
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = [
+    'ENCODINGS',
+    'FITS_BLOCK_SIZE',
+    'SCALING_KEYWORDS',
+    'binned_wcs',
+    'block_mean',
+    'content_hash',
+    'cutout',
+    'encoding_scaling',
+    'image_payload',
+    'peak_rss',
+    'progressive_factors',
+    'supports_payload',
+    'viewport_window',
+    'window_wcs',
+]
+
+log = logging.getLogger(__name__)
+
+FITS_BLOCK_SIZE = 2880
+
+# reduced precision encodings of `image_payload`
+ENCODINGS = ('float32', 'int16', 'uint8')
+
+# (first code, last code, BLANK code) of the integer encodings
+_INTEGER_CODES = {
+    'int16': (-32767, 32767, -32768),
+    'uint8': (0, 254, 255),
+}
+
+# number of pixels at most sampled to estimate the clipping percentiles
+_PERCENTILE_SAMPLE_SIZE = 2**20
+
+# number of pixels at most encoded at once
+_ENCODE_STRIP_SIZE = 2**22
+
+# keywords that describe how the stored data map to physical values, kept
+# when raw (unscaled) data are serialized
+SCALING_KEYWORDS = ('BSCALE', 'BZERO', 'BLANK')
+
+_BITPIX = {
+    'uint8': 8,
+    'int16': 16,
+    'int32': 32,
+    'int64': 64,
+    'float32': -32,
+    'float64': -64,
+}
+
+
+def _padded_size(n_bytes):
+    return -(-n_bytes // FITS_BLOCK_SIZE) * FITS_BLOCK_SIZE
+
+
+def supports_payload(data):
+    """
+    Return whether ``data`` has a FITS data type that `image_payload` can
+    serialize without conversion.
+    """
+    return np.dtype(data.dtype).newbyteorder('=').name in _BITPIX
+
+
+def _physical(data, scaling):
+    """Return ``data`` as float32 physical values, with BLANK pixels NaN."""
+    values = np.array(data, dtype=np.float32)
+    if 'BLANK' in scaling:
+        values[data == scaling['BLANK']] = np.nan
+    if 'BSCALE' in scaling:
+        values *= scaling['BSCALE']
+    if 'BZERO' in scaling:
+        values += scaling['BZERO']
+    return values
+
+
+def encoding_scaling(data, encoding, scaling=None, percentiles=(0.5, 99.5)):
+    """
+    Return the BSCALE, BZERO and BLANK keywords of an integer encoding of
+    an image.
+
+    The physical values between the ``percentiles`` of the image, estimated
+    on a regular sample of about a million pixels, span the codes of the
+    encoding, except for the last code of int16 and uint8, which is BLANK.
+    NaN and infinite values are left out of the percentiles.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The image.
+    encoding : {'int16', 'uint8'}
+        The integer encoding.
+    scaling : dict, optional
+        Scaling keywords of raw ``data``.
+    percentiles : tuple of float, optional
+        Percentiles of the physical values mapped to the first and last
+        codes. Values outside are clipped. Defaults to ``(0.5, 99.5)``.
+
+    Returns
+    -------
+    dict
+    """
+    first, last, blank = _INTEGER_CODES[encoding]
+
+    flat = data.reshape(-1)
+    sample = _physical(flat[::max(1, flat.size // _PERCENTILE_SAMPLE_SIZE)], scaling or {})
+    sample = sample[np.isfinite(sample)]
+    if not sample.size:
+        low = high = 0.
+    else:
+        low, high = np.percentile(sample, percentiles)
+
+    bscale = float(high - low) / (last - first) if high > low else 1.
+    return {'BSCALE': bscale, 'BZERO': float(low) - first * bscale, 'BLANK': blank}
+
+
+def _encode(data, scaling, encoding, encoded_scaling):
+    """Encode a strip of ``data`` to the physical values or codes of ``encoding``."""
+    values = _physical(data, scaling)
+    if encoding == 'float32':
+        return values
+
+    first, last, blank = _INTEGER_CODES[encoding]
+    nan = np.isnan(values)
+    values -= encoded_scaling['BZERO']
+    values /= encoded_scaling['BSCALE']
+    np.clip(values, first, last, out=values)
+    np.rint(values, out=values)
+    values[nan] = blank
+    return values.astype(encoding)
+
+
+def image_payload(data, header, scaling=None, encoding=None, percentiles=(0.5, 99.5)):
+    """
+    Serialize an image as a FITS file with an empty primary HDU and one
+    image extension, both with ``header``.
+
+    The payload is allocated once and the data are copied into it in FITS
+    (big-endian) byte order directly from ``data``, so that a memory-mapped
+    array is never loaded in full beforehand. Encoded images are encoded
+    and copied in strips.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The image, with a data type supported by `supports_payload`, or any
+        numeric data type if ``encoding`` is given.
+    header : `~astropy.io.fits.Header`
+        Non-structural keywords of the image, e.g. its WCS.
+    scaling : dict, optional
+        Scaling keywords (see ``SCALING_KEYWORDS``) of raw ``data``.
+    encoding : {'float32', 'int16', 'uint8'}, optional
+        Encode the physical values of the image as float32, or as int16 or
+        uint8 codes with the scaling keywords of `encoding_scaling`, with
+        NaN pixels encoded as BLANK. The size of the payload and the bytes
+        saved are logged at the INFO level. By default, ``data`` is
+        serialized as is.
+    percentiles : tuple of float, optional
+        Clipping percentiles of the integer encodings, see
+        `encoding_scaling`.
+
+    Returns
+    -------
+    bytearray
+        The FITS file.
+    """
+    scaling = scaling or {}
+    if encoding is None:
+        if not supports_payload(data):
+            raise TypeError(f"Cannot serialize image data of type {data.dtype} to FITS.")
+        big_endian = np.dtype(data.dtype).newbyteorder('>')
+        encoded_scaling = scaling
+    elif encoding in ENCODINGS:
+        big_endian = np.dtype(encoding).newbyteorder('>')
+        encoded_scaling = {} if encoding == 'float32' else encoding_scaling(
+            data, encoding, scaling, percentiles
+        )
+    else:
+        raise ValueError(f"`encoding` must be one of {ENCODINGS}. Received {encoding=}")
+
+    primary_header = fits.PrimaryHDU(header=header).header.tostring().encode('ascii')
+
+    image_header = fits.Header([
+        ('XTENSION', 'IMAGE', 'Image extension'),
+        ('BITPIX', _BITPIX[big_endian.name]),
+        ('NAXIS', data.ndim),
+        *((f'NAXIS{axis}', length) for axis, length in enumerate(data.shape[::-1], 1)),
+        ('PCOUNT', 0),
+        ('GCOUNT', 1),
+    ])
+    image_header.extend(header)
+    for keyword, value in encoded_scaling.items():
+        image_header[keyword] = value
+    image_header = image_header.tostring().encode('ascii')
+
+    data_offset = len(primary_header) + len(image_header)
+    n_bytes = data.size * big_endian.itemsize
+    payload = bytearray(data_offset + _padded_size(n_bytes))
+    payload[:len(primary_header)] = primary_header
+    payload[len(primary_header):data_offset] = image_header
+    image = np.ndarray(data.shape, dtype=big_endian, buffer=payload, offset=data_offset)
+
+    if encoding is None:
+        image[...] = data
+        return payload
+
+    strip_size = max(1, _ENCODE_STRIP_SIZE * len(data) // max(data.size, 1))
+    for start in range(0, len(data), strip_size):
+        strip = slice(start, start + strip_size)
+        image[strip] = _encode(data[strip], scaling, encoding, encoded_scaling)
+
+    log.info(
+        "Encoded a %s image as %s: %d bytes instead of %d, %d bytes saved",
+        data.dtype, encoding, n_bytes, data.nbytes, data.nbytes - n_bytes
+    )
+    return payload
+
+
+def content_hash(data, header):
+    """
+    Return a hash of an image and its header, to recognize images already
+    sent to a widget.
+
+    The shape, data type, header and data are hashed in full, in strips of
+    rows, so that images modified in place are recognized as new images.
+    Hashing costs much less than sending the image.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The image.
+    header : `~astropy.io.fits.Header`
+        The header sent with the image.
+
+    Returns
+    -------
+    str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((data.shape, np.dtype(data.dtype).str)).encode())
+    digest.update(header.tostring().encode('ascii'))
+
+    if data.ndim and len(data):
+        row_bytes = data.nbytes // len(data)
+        rows_per_strip = max(1, _ENCODE_STRIP_SIZE // max(row_bytes, 1))
+        for start in range(0, len(data), rows_per_strip):
+            strip = data[start:start + rows_per_strip]
+            digest.update(np.ascontiguousarray(strip).view(np.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+def progressive_factors(shape, preview_size=512):
+    """
+    Return the binning factors of the levels of a progressive load, from the
+    preview to the full resolution image.
+
+    The preview is binned by the smallest power of two that makes both axes
+    at most ``preview_size`` pixels long, and each following level halves
+    the binning factor, down to 1.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the image.
+    preview_size : int, optional
+        Maximum size of the preview in pixels. Defaults to 512.
+
+    Returns
+    -------
+    list of int
+    """
+    factor = 1
+    while max(shape) > factor * preview_size:
+        factor *= 2
+
+    factors = [factor]
+    while factor > 1:
+        factor //= 2
+        factors.append(factor)
+    return factors
+
+
+def block_mean(data, factor, scaling=None, strip_size=256):
+    """
+    Bin a 2D image by averaging blocks of ``factor`` x ``factor`` pixels.
+
+    Rows and columns past the last full block are dropped. NaN pixels, and
+    integer pixels equal to BLANK, are ignored in the mean. The image is
+    processed in strips of ``strip_size`` binned rows so that only a strip of
+    a memory-mapped image is loaded at a time.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The 2D image.
+    factor : int
+        The binning factor.
+    scaling : dict, optional
+        BSCALE, BZERO and BLANK keywords of raw ``data``, applied to the
+        binned image.
+    strip_size : int, optional
+        Number of binned rows computed at once.
+
+    Returns
+    -------
+    `~numpy.ndarray`
+        The binned float32 image, of shape ``data.shape // factor``.
+    """
+    scaling = scaling or {}
+    n_rows, n_cols = data.shape[0] // factor, data.shape[1] // factor
+    binned = np.empty((n_rows, n_cols), dtype=np.float32)
+
+    for start in range(0, n_rows, strip_size):
+        stop = min(start + strip_size, n_rows)
+        strip = np.array(
+            data[start * factor:stop * factor, :n_cols * factor], dtype=np.float32
+        )
+        if 'BLANK' in scaling:
+            strip[data[start * factor:stop * factor, :n_cols * factor] == scaling['BLANK']] = np.nan
+        blocks = strip.reshape(stop - start, factor, n_cols, factor)
+        with warnings.catch_warnings():
+            # blocks of NaN pixels stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            binned[start:stop] = np.nanmean(blocks, axis=(1, 3))
+
+    if 'BSCALE' in scaling:
+        binned *= scaling['BSCALE']
+    if 'BZERO' in scaling:
+        binned += scaling['BZERO']
+    return binned
+
+
+def binned_wcs(wcs, factor):
+    """
+    Return the celestial WCS of an image binned by `block_mean`.
+
+    The center of binned pixel ``i`` is the center of the block of original
+    pixels ``factor * i`` to ``factor * (i + 1) - 1``. Distortions (SIP)
+    are dropped.
+
+    Parameters
+    ----------
+    wcs : `~astropy.wcs.WCS`
+        WCS of the original image.
+    factor : int
+        The binning factor.
+
+    Returns
+    -------
+    `~astropy.wcs.WCS`
+    """
+    binned = wcs.deepcopy()
+    binned.sip = None
+    binned.wcs.crpix = (wcs.wcs.crpix - 0.5) / factor + 0.5
+    if binned.wcs.has_cd():
+        binned.wcs.cd = wcs.wcs.cd * factor
+    else:
+        binned.wcs.cdelt = wcs.wcs.cdelt * factor
+    return binned
+
+
+def viewport_window(shape, corners, viewport_shape, margin=0.25):
+    """
+    Return the window of a 2D image to send for a viewport.
+
+    The window is centered on the viewport and covers it with ``margin``
+    of its size on each side, so that small pans do not need a new cutout.
+    Its binning factor is the power of two closest to the number of image
+    pixels per screen pixel. The window may extend past the edges of
+    the image, see `cutout`.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the image.
+    corners : array-like
+        (n, 2) zero-based x, y pixel coordinates of the viewport corners in
+        the image. If any is not finite, e.g. when the viewport shows the
+        whole sky, the window covers the whole image.
+    viewport_shape : tuple of int
+        Shape of the viewport in screen pixels.
+    margin : float, optional
+        Fraction of the viewport size added on each side. Defaults to 0.25.
+
+    Returns
+    -------
+    tuple of int
+        ``(x0, y0, nx, ny, factor)``: the window starts at the pixel
+        ``(x0, y0)`` of the image and spans ``nx`` by ``ny`` blocks of
+        ``factor`` x ``factor`` pixels.
+    """
+    corners = np.asarray(corners, dtype=np.float64)
+    if not np.all(np.isfinite(corners)):
+        corners = np.array([[-0.5, -0.5], [shape[1] - 0.5, shape[0] - 0.5]])
+
+    # pixel edges are at half-integer pixel coordinates
+    low = corners.min(axis=0) + 0.5
+    high = corners.max(axis=0) + 0.5
+    span = np.maximum(high - low, 1)
+
+    image_pixels_per_screen_pixel = np.max(span / np.asarray(viewport_shape)[::-1])
+    factor = 2 ** max(0, int(np.round(np.log2(image_pixels_per_screen_pixel))))
+
+    # rounded first so that projection round-off does not add a block
+    half_size = np.ceil(np.round(span * (0.5 + margin) / factor, 3)).astype(int)
+    start = np.round((low + high) / 2 - half_size * factor).astype(int)
+    return int(start[0]), int(start[1]), int(2 * half_size[0]), int(2 * half_size[1]), factor
+
+
+def _window_blocks(start, n_blocks, factor, length):
+    # range of the blocks of a window axis that lie within the image
+    first = max(0, -(start // factor))
+    stop = min(n_blocks, (length - start) // factor)
+    return first, max(first, stop)
+
+
+def cutout(data, window, scaling=None):
+    """
+    Cut and bin the window of a 2D image returned by `viewport_window`.
+
+    Blocks of the window outside of the image, or partly outside, are NaN.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The 2D image.
+    window : tuple of int
+        ``(x0, y0, nx, ny, factor)`` window.
+    scaling : dict, optional
+        BSCALE, BZERO and BLANK keywords of raw ``data``, see `block_mean`.
+
+    Returns
+    -------
+    `~numpy.ndarray`
+        The (ny, nx) float32 cutout.
+    """
+    x0, y0, nx, ny, factor = window
+    image = np.full((ny, nx), np.nan, dtype=np.float32)
+
+    row_start, row_stop = _window_blocks(y0, ny, factor, data.shape[0])
+    col_start, col_stop = _window_blocks(x0, nx, factor, data.shape[1])
+    if row_stop > row_start and col_stop > col_start:
+        image[row_start:row_stop, col_start:col_stop] = block_mean(
+            data[y0 + row_start * factor:y0 + row_stop * factor,
+                 x0 + col_start * factor:x0 + col_stop * factor],
+            factor, scaling,
+        )
+    return image
+
+
+def window_wcs(wcs, window):
+    """
+    Return the celestial WCS of a `cutout` of an image.
+
+    Parameters
+    ----------
+    wcs : `~astropy.wcs.WCS`
+        WCS of the image.
+    window : tuple of int
+        ``(x0, y0, nx, ny, factor)`` window.
+
+    Returns
+    -------
+    `~astropy.wcs.WCS`
+    """
+    x0, y0, _, _, factor = window
+    shifted = wcs.deepcopy()
+    shifted.wcs.crpix = wcs.wcs.crpix - [x0, y0]
+    return binned_wcs(shifted, factor)
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process in bytes, or `None`
+    on platforms without the `resource` module.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,489 @@
+"""
+Compact, array-backed sky footprints.
+
+A `FootprintArray` holds the footprints of many rows (e.g. the exposures of
+an exposure table) in a few contiguous buffers instead of one formatted STC-S
+string per row. Each row is made of zero or more shapes, each shape being a
+polygon or a circle. The footprints are only serialized, to STC-S strings,
+`regions` objects or a binary buffer, when asked, and the array can be used
+as an astropy `~astropy.table.Table` column.
+"""
+import numpy as np
+from astropy.table import serialize as _table_serialize
+from astropy.utils.data_info import MixinInfo
+
+__all__ = [
+    'CIRCLE',
+    'POLYGON',
+    'FootprintArray',
+]
+
+# Shape kinds
+POLYGON = 0
+CIRCLE = 1
+
+_BYTES_HEADER = np.dtype([('magic', 'S4'), ('n_rows', '<i8'), ('n_shapes', '<i8'),
+                          ('n_vertices', '<i8')])
+_BYTES_MAGIC = b'MAFP'
+
+
+def _concatenated_ranges(starts, stops):
+    """Return the concatenation of ``np.arange(start, stop)`` for each pair."""
+    lengths = stops - starts
+    if not len(lengths):
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(lengths.sum(), dtype=np.int64) + offsets
+
+
+def _offsets(lengths):
+    """Return the (n + 1) offsets of consecutive blocks with ``lengths``."""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _mix(values):
+    """Scramble the bits of uint64 ``values`` with the splitmix64 finalizer."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class FootprintArrayInfo(MixinInfo):
+    """
+    Container for meta information like name, description, format.
+    """
+    # the footprints are serialized as one STC-S string per row, e.g. in ECSV
+    _represent_as_dict_primary_data = 'stcs'
+
+    @property
+    def unit(self):
+        return None
+
+    @property
+    def dtype(self):
+        return np.dtype(object)
+
+    def _represent_as_dict(self):
+        return {'stcs': self._parent.to_stcs()}
+
+    def _construct_from_dict(self, map):
+        return self._parent_cls.from_stcs(map['stcs'])
+
+    def new_like(self, cols, length, metadata_conflicts='warn', name=None):
+        """
+        Return a `FootprintArray` of ``length`` rows without shapes, with the
+        merged info of ``cols``, to be filled by e.g. `~astropy.table.vstack`.
+
+        Parameters
+        ----------
+        cols : list
+            The FootprintArray columns to merge.
+        length : int
+            Number of rows.
+        metadata_conflicts : str, optional
+            How to handle metadata conflicts: 'warn', 'error' or 'silent'.
+        name : str, optional
+            Name of the output column.
+
+        Returns
+        -------
+        FootprintArray
+        """
+        info_attrs = ('meta', 'format', 'description')
+        attrs = self.merge_cols_attributes(cols, metadata_conflicts, name, info_attrs)
+        out = self._parent_cls.empty(length)
+        for attr in ('name',) + info_attrs:
+            if attr in attrs:
+                setattr(out.info, attr, attrs[attr])
+        return out
+
+
+class FootprintArray:
+    """
+    The sky footprints of ``n_rows`` rows, each made of zero or more shapes.
+
+    The vertices of all shapes are held in one contiguous (n_vertices, 2)
+    float64 buffer of RA/Dec in degrees. Polygons have all their vertices in
+    the buffer, circles only their center.
+
+    Parameters
+    ----------
+    kinds : array-like
+        (n_shapes,) kind of each shape, `POLYGON` or `CIRCLE`.
+    vertex_offsets : array-like
+        (n_shapes + 1,) the vertices of shape ``i`` are
+        ``vertices[vertex_offsets[i]:vertex_offsets[i + 1]]``.
+    vertices : array-like
+        (n_vertices, 2) RA/Dec of the vertices in degrees.
+    radii : array-like
+        (n_shapes,) radius of the circles in degrees, ignored for polygons.
+    row_offsets : array-like, optional
+        (n_rows + 1,) the shapes of row ``j`` are
+        ``row_offsets[j]:row_offsets[j + 1]``. Defaults to one shape per row.
+    """
+
+    info = FootprintArrayInfo()
+
+    def __init__(self, kinds, vertex_offsets, vertices, radii, row_offsets=None):
+        self.kinds = np.ascontiguousarray(kinds, dtype=np.uint8)
+        self.vertex_offsets = np.ascontiguousarray(vertex_offsets, dtype=np.int64)
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 2)
+        self.radii = np.ascontiguousarray(radii, dtype=np.float64)
+        if row_offsets is None:
+            row_offsets = np.arange(len(self.kinds) + 1)
+        self.row_offsets = np.ascontiguousarray(row_offsets, dtype=np.int64)
+
+        n_shapes = len(self.kinds)
+        if len(self.vertex_offsets) != n_shapes + 1 or len(self.radii) != n_shapes:
+            raise ValueError(
+                "`vertex_offsets` must have one more element than `kinds`, and `radii` "
+                "as many elements as `kinds`."
+            )
+        if self.vertex_offsets[-1] != len(self.vertices) or self.row_offsets[-1] != n_shapes:
+            raise ValueError(
+                "The last offsets must be the number of vertices and the number of shapes."
+            )
+
+    @classmethod
+    def empty(cls, n_rows=0):
+        """Return a `FootprintArray` of ``n_rows`` rows without shapes."""
+        return cls(
+            np.zeros(0), np.zeros(1), np.zeros((0, 2)), np.zeros(0),
+            np.zeros(n_rows + 1),
+        )
+
+    @classmethod
+    def concatenate(cls, footprint_arrays):
+        """
+        Concatenate the rows of several `FootprintArray` objects.
+
+        Parameters
+        ----------
+        footprint_arrays : iterable of FootprintArray
+            The arrays to concatenate, in order.
+
+        Returns
+        -------
+        FootprintArray
+        """
+        footprint_arrays = list(footprint_arrays)
+        if not footprint_arrays:
+            return cls.empty()
+
+        vertex_starts = np.cumsum([0] + [len(f.vertices) for f in footprint_arrays])
+        shape_starts = np.cumsum([0] + [len(f.kinds) for f in footprint_arrays])
+        return cls(
+            np.concatenate([f.kinds for f in footprint_arrays]),
+            np.concatenate(
+                [f.vertex_offsets[:-1] + start
+                 for f, start in zip(footprint_arrays, vertex_starts)]
+                + [vertex_starts[-1:]]
+            ),
+            np.concatenate([f.vertices for f in footprint_arrays]),
+            np.concatenate([f.radii for f in footprint_arrays]),
+            np.concatenate(
+                [f.row_offsets[:-1] + start
+                 for f, start in zip(footprint_arrays, shape_starts)]
+                + [shape_starts[-1:]]
+            ),
+        )
+
+    def __len__(self):
+        return len(self.row_offsets) - 1
+
+    @property
+    def shape(self):
+        return (len(self),)
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def n_shapes(self):
+        """Number of shapes in each row."""
+        return np.diff(self.row_offsets)
+
+    def __getitem__(self, item):
+        """
+        Return the STC-S string of a row for an integer index, or a new
+        `FootprintArray` of the selected rows for a slice, a boolean mask or
+        an array of indices.
+        """
+        if isinstance(item, (int, np.integer)):
+            n_rows = len(self)
+            if not -n_rows <= item < n_rows:
+                raise IndexError(f"index {item} is out of bounds for {n_rows} rows")
+            return self._row_stcs(item % n_rows)
+        return self.take(np.arange(len(self))[item])
+
+    def __setitem__(self, item, value):
+        """
+        Replace the rows selected by ``item`` with the rows of ``value``, a
+        `FootprintArray` or STC-S strings, as done by e.g. `~astropy.table.vstack`.
+        A single row is broadcast to all the selected rows.
+        """
+        rows = np.arange(len(self))[item].reshape(-1)
+        if not isinstance(value, FootprintArray):
+            value = self.from_stcs(np.atleast_1d(value))
+        if len(value) == 1:
+            value = value.take(np.zeros(len(rows), dtype=np.int64))
+        if len(value) != len(rows):
+            raise ValueError(
+                f"Cannot assign {len(value)} footprints to {len(rows)} rows."
+            )
+
+        order = np.arange(len(self))
+        order[rows] = len(self) + np.arange(len(rows))
+        replaced = self.concatenate([self, value]).take(order)
+        self.kinds = replaced.kinds
+        self.vertex_offsets = replaced.vertex_offsets
+        self.vertices = replaced.vertices
+        self.radii = replaced.radii
+        self.row_offsets = replaced.row_offsets
+
+    def take(self, indices, axis=None):
+        """
+        Return a new `FootprintArray` with the rows at ``indices``.
+
+        Parameters
+        ----------
+        indices : array-like
+            Indices of the rows to take.
+        axis : int, optional
+            Only None or 0 are supported, as the array is one-dimensional.
+
+        Returns
+        -------
+        FootprintArray
+            The rows, with a copy of the column ``info`` if any, as expected
+            by e.g. `~astropy.table.Table.sort`.
+        """
+        if axis not in (None, 0):
+            raise ValueError(f"`axis` must be None or 0. Received {axis=}")
+        rows = np.asarray(indices, dtype=np.int64).reshape(-1)
+        shapes = _concatenated_ranges(self.row_offsets[rows], self.row_offsets[rows + 1])
+        vertices = _concatenated_ranges(
+            self.vertex_offsets[shapes], self.vertex_offsets[shapes + 1]
+        )
+        out = self.__class__(
+            self.kinds[shapes],
+            _offsets(np.diff(self.vertex_offsets)[shapes]),
+            self.vertices[vertices],
+            self.radii[shapes],
+            _offsets(np.diff(self.row_offsets)[rows]),
+        )
+        if 'info' in self.__dict__:
+            out.info = self.info
+        return out
+
+    def copy(self):
+        return self.take(np.arange(len(self)))
+
+    def _quantized_rows(self, tolerance):
+        """
+        Return the shapes of each row as a sequence of integers, the kind,
+        number of vertices and radius of each shape followed by its vertices,
+        all in units of ``tolerance``, and the (n_rows + 1) offsets of the rows
+        in the sequence.
+        """
+        n_vertices = np.diff(self.vertex_offsets)
+        shape_starts = _offsets(3 + 2 * n_vertices)
+        quantized = np.empty(shape_starts[-1], dtype=np.int64)
+        is_vertex = np.ones(len(quantized), dtype=bool)
+        for i, values in enumerate([
+                self.kinds, n_vertices,
+                np.round(np.nan_to_num(self.radii) / tolerance)
+        ]):
+            quantized[shape_starts[:-1] + i] = values
+            is_vertex[shape_starts[:-1] + i] = False
+        quantized[is_vertex] = np.round(self.vertices.reshape(-1) / tolerance)
+        return quantized, shape_starts[self.row_offsets]
+
+    def unique(self, tolerance=1e-5):
+        """
+        Find the rows with the same footprints.
+
+        The footprints are compared after rounding their coordinates and radii
+        to multiples of ``tolerance``: a hash of the rounded values is computed
+        for all rows at once, and the rows with the same hash are checked to
+        be equal.
+
+        Parameters
+        ----------
+        tolerance : float, optional
+            Rounding of the coordinates in degrees. Defaults to 1e-5 degrees,
+            36 milliarcseconds.
+
+        Returns
+        -------
+        index : `~numpy.ndarray`
+            (n_unique,) the first row of each distinct footprint, in order.
+        inverse : `~numpy.ndarray`
+            (n_rows,) the distinct footprint of each row, such that
+            ``take(index).take(inverse)`` has the footprints of all rows.
+        """
+        n_rows = len(self)
+        quantized, offsets = self._quantized_rows(tolerance)
+        lengths = np.diff(offsets)
+        row_of_value = np.repeat(np.arange(n_rows), lengths)
+        position = np.arange(len(quantized)) - offsets[:-1][row_of_value]
+        hashes = _mix(_mix(quantized.view(np.uint64)) + position.astype(np.uint64))
+        sums = np.zeros(len(hashes) + 1, dtype=np.uint64)
+        np.cumsum(hashes, dtype=np.uint64, out=sums[1:])
+        row_hashes = _mix(sums[offsets[1:]] - sums[offsets[:-1]] + lengths.astype(np.uint64))
+        _, index, inverse = np.unique(row_hashes, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        # rows are compared to the first row with the same hash
+        first = index[inverse]
+        rows = np.flatnonzero(first != np.arange(n_rows))
+        same_length = lengths[rows] == lengths[first[rows]]
+        compared = rows[same_length]
+        different = (
+            quantized[_concatenated_ranges(offsets[compared], offsets[compared + 1])]
+            != quantized[_concatenated_ranges(offsets[first[compared]],
+                                              offsets[first[compared] + 1])]
+        )
+        if not np.all(same_length) or np.any(different):
+            # hash collisions, too rare to be worth a vectorized solution
+            groups = {}
+            inverse = np.array([
+                groups.setdefault(quantized[start:stop].tobytes(), len(groups))
+                for start, stop in zip(offsets[:-1], offsets[1:])
+            ], dtype=np.int64)
+            index = np.unique(inverse, return_index=True)[1]
+            return index, inverse
+
+        # numbered in the order of their first row
+        order = np.argsort(index)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return index[order], rank[inverse]
+
+    def __iter__(self):
+        for stcs in self.to_stcs():
+            yield str(stcs)
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} rows={len(self)} shapes={len(self.kinds)} '
+                f'vertices={len(self.vertices)}>')
+
+    def _row_stcs(self, row):
+        return str(self.take([row]).to_stcs()[0])
+
+    def to_stcs(self):
+        """
+        Serialize the footprints to STC-S, in bulk with
+        `~mast_aladin.utils.stcs.format_stcs`.
+
+        The strings are formatted as by
+        `~mast_aladin.utils.selectSIAF.computeStcsFootprint`, with the shapes
+        of a row concatenated.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            (n_rows,) array of STC-S strings, empty for rows without shapes.
+        """
+        from mast_aladin.utils.stcs import format_stcs
+
+        return format_stcs(self)
+
+    @classmethod
+    def from_stcs(cls, strings):
+        """
+        Parse STC-S footprints, in bulk with `~mast_aladin.utils.stcs.parse_stcs`.
+
+        Parameters
+        ----------
+        strings : iterable of str
+            The STC-S strings, e.g. the ``s_region`` column of a table.
+
+        Returns
+        -------
+        FootprintArray
+            The footprints, with one row per string.
+        """
+        from mast_aladin.utils.stcs import parse_stcs
+
+        return parse_stcs(strings)
+
+    def to_regions(self):
+        """
+        Convert the footprints to `regions` sky regions.
+
+        Returns
+        -------
+        `~regions.Regions`
+            One `~regions.PolygonSkyRegion` or `~regions.CircleSkyRegion` per
+            shape, in row order. Rows with several shapes give several regions.
+        """
+        import astropy.units as u
+        from astropy.coordinates import SkyCoord
+        from regions import CircleSkyRegion, PolygonSkyRegion, Regions
+
+        regions = []
+        for shape, kind in enumerate(self.kinds):
+            start, stop = self.vertex_offsets[shape:shape + 2]
+            vertices = self.vertices[start:stop]
+            if kind == CIRCLE:
+                regions.append(CircleSkyRegion(
+                    center=SkyCoord(*vertices[0], unit='deg'),
+                    radius=self.radii[shape] * u.deg,
+                ))
+            else:
+                regions.append(PolygonSkyRegion(
+                    vertices=SkyCoord(vertices[:, 0], vertices[:, 1], unit='deg')
+                ))
+        return Regions(regions)
+
+    def to_bytes(self):
+        """
+        Serialize the footprints to a compact little-endian binary buffer,
+        read back with `from_bytes`.
+        """
+        header = np.array(
+            [(_BYTES_MAGIC, len(self), len(self.kinds), len(self.vertices))],
+            dtype=_BYTES_HEADER,
+        )
+        return b''.join([
+            header.tobytes(),
+            self.row_offsets.astype('<i8').tobytes(),
+            self.vertex_offsets.astype('<i8').tobytes(),
+            self.radii.astype('<f8').tobytes(),
+            self.vertices.astype('<f8').tobytes(),
+            self.kinds.tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """
+        Read footprints serialized with `to_bytes`. The arrays are views of
+        ``buffer`` when possible.
+        """
+        header = np.frombuffer(buffer, dtype=_BYTES_HEADER, count=1)[0]
+        if header['magic'] != _BYTES_MAGIC:
+            raise ValueError("The buffer does not hold serialized footprints.")
+        n_rows, n_shapes, n_vertices = (int(header[name])
+                                        for name in ('n_rows', 'n_shapes', 'n_vertices'))
+
+        offset = _BYTES_HEADER.itemsize
+        arrays = []
+        for dtype, count in (('<i8', n_rows + 1), ('<i8', n_shapes + 1), ('<f8', n_shapes),
+                             ('<f8', 2 * n_vertices), ('u1', n_shapes)):
+            arrays.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=offset))
+            offset += arrays[-1].nbytes
+        row_offsets, vertex_offsets, radii, vertices, kinds = arrays
+        return cls(kinds, vertex_offsets, vertices, radii, row_offsets)
+
+
+# astropy only reconstructs the serialized mixin columns of the classes it
+# knows about, e.g. when reading ECSV tables, so register FootprintArray
+_CLASS_NAME = f'{FootprintArray.__module__}.{FootprintArray.__name__}'
+if _CLASS_NAME not in _table_serialize.__construct_mixin_classes:
+    _table_serialize.__construct_mixin_classes += (_CLASS_NAME,)
@@ -1,25 +1,299 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, lru_cache
+from pathlib import Path
 
+import astropy.units as u
+import numpy as np
+from astropy.coordinates.matrix_utilities import rotation_matrix
 from astropy.table import Table
 from pysiaf.utils.rotations import attitude_matrix
 from mast_aladin.utils.selectSIAF import (
     defineApertures,
     getVertices,
-    computeStcsFootprint,
 )
+from mast_aladin.utils.footprint_array import CIRCLE, POLYGON, FootprintArray
+from mast_aladin.utils.aperture_store import (
+    MAX_VERTICES,
+    ApertureStore,
+    StoredAperture,
+    _idl_to_tel_coefficients,
+    _is_planar,
+    load_aperture_store,
+)
+
+
+# Unit conversion factors, taken from astropy.units so that the vectorized
+# transforms below agree with the pysiaf transforms to the last bit.
+_ARCSEC_TO_DEG = u.arcsec.to(u.deg)
+_DEG_TO_RAD = np.deg2rad(1.)
+_RAD_TO_DEG = u.rad.to(u.deg)
+_FULL_CIRCLE_RAD = (360.0 * u.deg).to_value(u.rad)
+
+
+def _tel_unit_vectors(v2, v3):
+    """
+    Return the (3, ...) unit vectors of telescope V2/V3 positions in arcsec,
+    as in `pysiaf.utils.rotations.tel_to_sky`.
+    """
+    v2_rad = (np.asarray(v2) * _ARCSEC_TO_DEG) * _DEG_TO_RAD
+    v3_rad = (np.asarray(v3) * _ARCSEC_TO_DEG) * _DEG_TO_RAD
+    return np.array([
+        np.cos(v2_rad) * np.cos(v3_rad),
+        np.sin(v2_rad) * np.cos(v3_rad),
+        np.sin(v3_rad),
+    ])
+
+
+def _unit_vectors_to_sky(vectors):
+    """
+    Return RA/Dec in degrees of (3, ...) sky unit vectors, with RA in [0, 360).
+    """
+    norm = np.sqrt(vectors[0]**2 + vectors[1]**2 + vectors[2]**2)
+    ra = np.arctan2(vectors[1], vectors[0])
+    dec = np.arcsin(vectors[2] / norm)
+    ra = np.where(ra < 0.0, ra + _FULL_CIRCLE_RAD, ra)
+    return ra * _RAD_TO_DEG, dec * _RAD_TO_DEG
+
+
+def tel_to_sky(att_matrix, v2, v3):
+    """
+    Transform telescope V2/V3 coordinates (arcsec) to RA/Dec (degrees).
+
+    Vectorized equivalent of ``aperture.tel_to_sky`` that does not need an
+    aperture object.
+
+    Parameters
+    ----------
+    att_matrix : array-like
+        The 3x3 attitude matrix.
+    v2, v3 : float or array-like
+        Telescope coordinates in arcsec.
+
+    Returns
+    -------
+    ra, dec : float or `~numpy.ndarray`
+        Sky coordinates in degrees, with the shape of ``v2``.
+    """
+    vectors = _tel_unit_vectors(v2, v3)
+    if vectors.ndim == 1:
+        sky = np.dot(att_matrix, vectors)
+    else:
+        sky = np.dot(att_matrix, vectors.reshape(3, -1)).reshape(vectors.shape)
+    return _unit_vectors_to_sky(sky)
+
+
+def _degrees(angle):
+    """Return an angle in degrees, given as a Quantity or a number."""
+    if isinstance(angle, u.Quantity):
+        return angle.to_value(u.deg)
+    return angle
+
+
+def attitude_matrices(v2, v3, ra, dec, pas):
+    """
+    Compute the attitude matrices of a pointing at many position angles.
+
+    Vectorized equivalent of calling `pysiaf.utils.rotations.attitude_matrix`
+    for each position angle: the rotations that do not depend on the
+    position angle are only computed once.
+
+    Parameters
+    ----------
+    v2, v3 : float
+        Telescope coordinates in arcsec placed on the target.
+    ra, dec : float or `~astropy.units.Quantity`
+        Target coordinates, in degrees if not a Quantity.
+    pas : float or array-like
+        Position angles in degrees.
+
+    Returns
+    -------
+    `~numpy.ndarray`
+        (..., 3, 3) attitude matrices, with the shape of ``pas`` in front.
+    """
+    pas = np.asarray(pas, dtype=float)
+
+    # same rotations, in the same order, as pysiaf (JWST convention)
+    m = np.dot(
+        rotation_matrix(-1 * _degrees(v3) / 3600., axis='y'),
+        rotation_matrix(-1 * -_degrees(v2) / 3600., axis='z'),
+    )
+    m = np.matmul(rotation_matrix(-1 * -1. * pas, axis='x'), m)
+    m = np.matmul(rotation_matrix(-1 * -_degrees(dec), axis='y'), m)
+    m = np.matmul(rotation_matrix(-1 * _degrees(ra), axis='z'), m)
+    return m
+
+
+class ApertureGeometry:
+    """
+    The attitude-independent geometry of a list of apertures.
+
+    The ideal-frame vertices of all apertures are stacked into one array and
+    transformed to telescope unit vectors once, so that projecting every
+    aperture onto the sky for a given attitude is a single matrix product.
+
+    Parameters
+    ----------
+    apertures : list
+        pysiaf apertures or `~mast_aladin.utils.aperture_store.StoredAperture`
+        objects.
+    """
+
+    def __init__(self, apertures):
+        self.apertures = list(apertures)
+        n_apertures = len(self.apertures)
+
+        self.n_vertices = np.zeros(n_apertures, dtype=int)
+        idl_vertices = np.full((n_apertures, MAX_VERTICES, 2), np.nan)
+        coefficients = np.full((n_apertures, 2, 3), np.nan)
+        planar = np.ones(n_apertures, dtype=bool)
+
+        for i, ap in enumerate(self.apertures):
+            xVertices, yVertices = getVertices(ap)
+
+            # Skip PICK (pickle) which do not have vertices
+            if xVertices is None or yVertices is None:
+                continue
+
+            vertices = np.column_stack([np.atleast_1d(xVertices), np.atleast_1d(yVertices)])
+            self.n_vertices[i] = len(vertices)
+            idl_vertices[i, :len(vertices)] = vertices
+
+            if isinstance(ap, StoredAperture):
+                planar[i] = bool(ap._record['planar'])
+                coefficients[i] = ap.idl_to_tel_coefficients
+            else:
+                planar[i] = _is_planar(ap)
+                if planar[i]:
+                    coefficients[i] = _idl_to_tel_coefficients(
+                        ap.VIdlParity, ap.V3IdlYAngle, ap.V2Ref, ap.V3Ref
+                    )
+
+        # planar idl->tel transform for all apertures at once, in the same
+        # order of operations as pysiaf
+        x = idl_vertices[..., 0]
+        y = idl_vertices[..., 1]
+        v2 = (coefficients[:, 0, 0, None] * x + coefficients[:, 0, 1, None] * y
+              ) + coefficients[:, 0, 2, None]
+        v3 = (coefficients[:, 1, 0, None] * x + coefficients[:, 1, 1, None] * y
+              ) + coefficients[:, 1, 2, None]
+
+        for i in np.flatnonzero(~planar & (self.n_vertices > 0)):
+            n = self.n_vertices[i]
+            v2[i, :n], v3[i, :n] = self.apertures[i].idl_to_tel(x[i, :n], y[i, :n])
+
+        self.idl_vertices = idl_vertices
+        self.tel_vertices = np.stack([v2, v3], axis=-1)
+        self._kinds = np.where(self.n_vertices == 1, CIRCLE, POLYGON)
+        self._radii = np.array([
+            ap.maj / 3600.0 if n == 1 else np.nan
+            for ap, n in zip(self.apertures, self.n_vertices)
+        ])
+        self._unit_vectors = _tel_unit_vectors(v2, v3).reshape(3, -1)
+
+    def __len__(self):
+        return len(self.apertures)
+
+    def sky_vertices(self, att_matrix):
+        """
+        Project the vertices of all apertures onto the sky.
+
+        Parameters
+        ----------
+        att_matrix : array-like
+            The 3x3 attitude matrix, or a stack of them with shape (..., 3, 3)
+            such as returned by `attitude_matrices`.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            (..., n_apertures, MAX_VERTICES, 2) array of RA/Dec in degrees.
+            Circular apertures only fill the first vertex (their center) and
+            apertures without vertices are all NaN.
+        """
+        att_matrix = np.asarray(att_matrix)
+        sky = np.moveaxis(np.dot(att_matrix, self._unit_vectors), -2, 0)
+        ra, dec = _unit_vectors_to_sky(sky)
+        return np.stack([ra, dec], axis=-1).reshape(
+            att_matrix.shape[:-2] + (len(self), MAX_VERTICES, 2)
+        )
+
+    def s_regions(self, sky_vertices):
+        """
+        Format the STC-S footprint of each aperture from the output of
+        `sky_vertices`, in bulk as by
+        `~mast_aladin.utils.selectSIAF.computeStcsFootprint`. Apertures
+        without vertices give an empty string.
+        """
+        return self.footprints(sky_vertices).to_stcs().tolist()
+
+    def footprints(self, sky_vertices, combine=False):
+        """
+        Build a `~mast_aladin.utils.footprint_array.FootprintArray` from the
+        output of `sky_vertices`, without formatting STC-S strings.
+
+        Parameters
+        ----------
+        sky_vertices : `~numpy.ndarray`
+            (n_apertures, MAX_VERTICES, 2) sky vertices of the apertures.
+        combine : bool, optional
+            Put the footprints of all apertures in one row, as for `s_region`.
+            Defaults to False, which gives one row per aperture. Apertures
+            without vertices give a row without shapes.
+
+        Returns
+        -------
+        FootprintArray
+        """
+        has_shape = self.n_vertices > 0
+        valid = np.arange(MAX_VERTICES) < self.n_vertices[:, None]
+        row_offsets = [0, np.count_nonzero(has_shape)] if combine else np.concatenate(
+            [[0], np.cumsum(has_shape)]
+        )
+        return FootprintArray(
+            self._kinds[has_shape],
+            np.concatenate([[0], np.cumsum(self.n_vertices[has_shape])]),
+            sky_vertices[valid],
+            self._radii[has_shape],
+            row_offsets,
+        )
+
+
+def sky_vertices(apertures, att_matrix):
+    """
+    Project the vertices of multiple apertures onto the sky in one operation.
+
+    Parameters
+    ----------
+    apertures : list or ApertureGeometry
+        The apertures to project.
+    att_matrix : array-like
+        The 3x3 attitude matrix.
+
+    Returns
+    -------
+    `~numpy.ndarray`
+        (n_apertures, n_vertices, 2) array of RA/Dec in degrees, see
+        `ApertureGeometry.sky_vertices`.
+    """
+    if not isinstance(apertures, ApertureGeometry):
+        apertures = ApertureGeometry(apertures)
+    return apertures.sky_vertices(att_matrix)
 
 
 def s_region(apertures, att_matrix):
     """
     Generate a combined STCS region string from multiple apertures.
 
-    This function processes a list of apertures, applies an attitude matrix
-    transformation, retrieves their vertices in sky coordinates, and combines
-    their individual STCS footprints into a single region string.
+    This function projects the vertices of all apertures onto the sky with
+    the attitude matrix in one batched operation (see `sky_vertices`), and
+    combines their individual STCS footprints into a single region string.
 
     Args:
-        apertures (list): A list of aperture objects to process. Each aperture should support
-                         set_attitude_matrix(), idl_to_sky(), and have vertex information.
+        apertures (list or ApertureGeometry): A list of aperture objects to process.
+                         Each aperture should support idl_to_tel() and have
+                         vertex information.
         att_matrix (array-like): The 3x3 attitude matrix to apply to each aperture for
                                coordinate transformation.
 
@@ -32,18 +306,31 @@ def s_region(apertures, att_matrix):
         - Apertures without vertices (e.g., HST/FGS PICK) are skipped.
         - Each aperture's footprint is appended to the combined result.
     """
-    combined_s_region = ''
-
-    for ap in apertures:
-        ap.set_attitude_matrix(att_matrix)
-        xVertices, yVertices = getVertices(ap)
-
-        # Skip PICK (pickle) which do not have vertices
-        if (xVertices is not None and yVertices is not None):
-            skyRa, skyDec = ap.idl_to_sky(xVertices, yVertices)
-            ap_s_region = computeStcsFootprint(ap, skyRa, skyDec)
-            combined_s_region += ap_s_region
-    return combined_s_region
+    if not isinstance(apertures, ApertureGeometry):
+        apertures = ApertureGeometry(apertures)
+    return ''.join(apertures.s_regions(apertures.sky_vertices(att_matrix)))
+
+
+# Names and types of the columns of exposure tables. The type of the columns
+# set to None is inferred from the values: int64 if they are all integers,
+# float64 otherwise.
+EXP_TABLE_COLUMNS = {
+    'telescope': str,
+    'instrument': str,
+    'aperture': str,
+    'targ_ra': np.float64,
+    'targ_dec': np.float64,
+    'aper_ra': np.float64,
+    'aper_dec': np.float64,
+    'program_num': np.int64,
+    'obs_num': np.int64,
+    'position_angle': None,
+    'exp_num': np.int64,
+    'x_off': None,
+    'y_off': None,
+    'pattern_point': np.int64,
+    's_region': str,
+}
 
 
 def exp_list_to_table(exp_list):
@@ -75,28 +362,69 @@ def exp_list_to_table(exp_list):
         - y_off: Y offset from pattern
         - pattern_point: Pattern point identifier
         - s_region: STCS Sky region
+
+        The column types are given by ``EXP_TABLE_COLUMNS``. If the s_region
+        values are `~mast_aladin.utils.footprint_array.FootprintArray`
+        objects, they are concatenated into a FootprintArray column.
     """
-    names = [
-        'telescope',
-        'instrument',
-        'aperture',
-        'targ_ra',
-        'targ_dec',
-        'aper_ra',
-        'aper_dec',
-        'program_num',
-        'obs_num',
-        'position_angle',
-        'exp_num',
-        'x_off',
-        'y_off',
-        'pattern_point',
-        's_region',
-    ]
-    table = Table(names=names, data=exp_list)
+    footprints = None
+    if len(exp_list) and isinstance(_exp_s_region(exp_list[0]), FootprintArray):
+        footprints = FootprintArray.concatenate(_exp_s_region(exp) for exp in exp_list)
+        exp_list = [
+            {**exp, 's_region': ''} if isinstance(exp, dict) else tuple(exp[:-1]) + ('',)
+            for exp in exp_list
+        ]
+
+    table = Table(
+        names=list(EXP_TABLE_COLUMNS),
+        dtype=list(EXP_TABLE_COLUMNS.values()),
+        rows=exp_list,
+    )
+    if footprints is not None:
+        table.replace_column('s_region', footprints)
     return table
 
 
+def _exp_s_region(exp):
+    # s_region is the last column of the exposure rows
+    return exp['s_region'] if isinstance(exp, dict) else exp[-1]
+
+
+def _allocate_exp_columns(n_rows):
+    """
+    Preallocate the columns of an exposure table with ``n_rows`` rows.
+    String columns and columns with an inferred type are object arrays until
+    converted by `_exp_columns_to_table`.
+    """
+    return {
+        name: np.empty(n_rows, dtype=object if dtype in (str, None) else dtype)
+        for name, dtype in EXP_TABLE_COLUMNS.items()
+    }
+
+
+def _exp_columns_to_table(columns, n_rows=None, copy=False, footprints=None):
+    """
+    Convert columns allocated by `_allocate_exp_columns` to an astropy Table
+    with the schema of `exp_list_to_table`, keeping the first ``n_rows``.
+    Set ``copy`` if the columns will be reused. If ``footprints`` is a list
+    of `FootprintArray`, they replace the s_region column.
+    """
+    data = []
+    for name, dtype in EXP_TABLE_COLUMNS.items():
+        column = columns[name][:n_rows]
+        if name == 's_region' and footprints is not None:
+            column = FootprintArray.concatenate(footprints)
+        elif dtype is str:
+            column = column.astype(str) if len(column) else np.zeros(0, dtype='U1')
+        elif dtype is None:
+            # int64 if the values are all integers, as in `exp_list_to_table`
+            column = np.array(column.tolist(), dtype=None if len(column) else np.float64)
+        elif copy:
+            column = column.copy()
+        data.append(column)
+    return Table(data, names=list(EXP_TABLE_COLUMNS), copy=False)
+
+
 class ExpResultGenerator(ABC):
     """
     """
@@ -112,6 +440,261 @@ class ExpResultGenerator(ABC):
     ) -> list:
         pass
 
+    def get_exp_table(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+        footprint_array=False,
+    ) -> Table:
+        """
+        Generate the exposures as an astropy Table.
+
+        The result is the same as ``exp_list_to_table(self.get_exp_list(...))``
+        but the columns are preallocated and filled directly, without
+        building a dictionary per exposure. The arguments are the same as
+        for ``get_exp_list``; ``pa`` defaults to the position angle of an
+        Observation, or 0 otherwise.
+
+        Set ``footprint_array`` to get the s_region column as a
+        `~mast_aladin.utils.footprint_array.FootprintArray` of the vertices
+        instead of formatting STC-S strings.
+
+        Returns
+        -------
+        astropy.table.Table
+            Table with the columns described in `exp_list_to_table`.
+        """
+        columns, n_rows, footprints = self._exp_table_columns(
+            pa, program_num, obs_num, exp_num, pattern_point, pointing, footprint_array
+        )
+        return _exp_columns_to_table(columns, n_rows, footprints=footprints)
+
+    def _exp_table_columns(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+        footprint_array=False,
+    ):
+        """
+        Fill the columns of `get_exp_table`. Return the columns, the number
+        of rows and the list of footprints (None unless ``footprint_array``)
+        to pass to `_exp_columns_to_table`.
+        """
+        columns = _allocate_exp_columns(self._exp_count())
+        footprints = [] if footprint_array else None
+        n_rows = 0
+        for exposure, fill_args in self._iter_exp_leaves(
+            pa, program_num, obs_num, exp_num, pattern_point, pointing
+        ):
+            n_rows = exposure._fill_exp_columns(
+                columns, n_rows, footprints=footprints, **fill_args
+            )
+        return columns, n_rows, footprints
+
+    def iter_exposures(
+        self,
+        chunk_size=10000,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        """
+        Generate the exposures as a stream of astropy Tables.
+
+        Observations and patterns are expanded lazily while the chunks are
+        consumed, so memory use does not grow with the number of exposures.
+        Concatenating the chunks gives the same table as `get_exp_table`.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Number of rows in each chunk, except the last one which may be
+            shorter. Defaults to 10000.
+        pa, program_num, obs_num, exp_num, pattern_point, pointing : optional
+            As for `get_exp_table`.
+
+        Yields
+        ------
+        astropy.table.Table
+            Chunks of the table described in `exp_list_to_table`.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"`chunk_size` must be at least 1. Received {chunk_size=}")
+
+        columns = _allocate_exp_columns(chunk_size)
+        n_rows = 0
+        for exposure, fill_args in self._iter_exp_leaves(
+            pa, program_num, obs_num, exp_num, pattern_point, pointing
+        ):
+            n_leaf_rows = exposure._exp_count()
+            if n_rows + n_leaf_rows > len(columns['s_region']):
+                # make room for the rows of this exposure past the chunk end
+                extra = _allocate_exp_columns(n_rows + n_leaf_rows - len(columns['s_region']))
+                columns = {
+                    name: np.concatenate([column, extra[name]])
+                    for name, column in columns.items()
+                }
+            n_rows = exposure._fill_exp_columns(columns, n_rows, **fill_args)
+
+            while n_rows >= chunk_size:
+                yield _exp_columns_to_table(columns, chunk_size, copy=True)
+                n_rows -= chunk_size
+                for column in columns.values():
+                    column[:n_rows] = column[chunk_size:chunk_size + n_rows]
+
+        if n_rows:
+            yield _exp_columns_to_table(columns, n_rows, copy=True)
+
+    def sweep_pa(self, pas, s_region=False):
+        """
+        Compute the footprints of the exposures at many position angles.
+
+        This is equivalent to calling ``get_exp_table(pa=pa)`` for each
+        position angle, but the attitude matrices of each pointing are
+        computed for all the angles at once and the apertures are projected
+        onto the sky in one operation. The position angles override the
+        position angle of any Observation.
+
+        Parameters
+        ----------
+        pas : array-like
+            Position angles in degrees.
+        s_region : bool, optional
+            Also return the STC-S footprints. Defaults to False.
+
+        Returns
+        -------
+        vertices : `~numpy.ndarray`
+            (n_pa, n_exposures, n_vertices, 2) array of RA/Dec in degrees,
+            with one row per row of `get_exp_table`. The vertices of an
+            exposure are in blocks of ``MAX_VERTICES``, one block per
+            aperture, padded with NaN. Circular apertures only fill the first
+            vertex of their block (their center).
+        s_regions : `~numpy.ndarray`
+            (n_pa, n_exposures) array of STC-S strings, as in the s_region
+            column of `get_exp_table`. Only returned if ``s_region`` is set.
+        """
+        pas = np.atleast_1d(np.asarray(pas, dtype=float))
+        blocks = []
+        s_region_blocks = []
+        for exposure, fill_args in self._iter_exp_leaves():
+            if isinstance(exposure, _ExpListLeaf):
+                raise NotImplementedError(
+                    f"{type(self).__name__} does not expand into Exposure objects; "
+                    "override `_iter_exp_leaves` to use `sweep_pa`."
+                )
+            pointing = fill_args['pointing']
+            if pointing is None:
+                pointing = exposure.pointing
+            geometry = exposure.aperture_geometry
+            aperture_vertices = geometry.sky_vertices(pointing.attitude_matrices(pas))
+
+            if exposure._separate_apertures:
+                blocks.append(aperture_vertices)
+            else:
+                blocks.append(aperture_vertices.reshape(len(pas), 1, -1, 2))
+
+            if s_region:
+                # formatted at once for all position angles
+                s_region_blocks.append(FootprintArray.concatenate(
+                    geometry.footprints(pa_vertices, combine=not exposure._separate_apertures)
+                    for pa_vertices in aperture_vertices
+                ).to_stcs().reshape(len(pas), -1))
+
+        n_rows = sum(block.shape[1] for block in blocks)
+        n_vertices = max((block.shape[2] for block in blocks), default=MAX_VERTICES)
+        vertices = np.full((len(pas), n_rows, n_vertices, 2), np.nan)
+        start = 0
+        for block in blocks:
+            vertices[:, start:start + block.shape[1], :block.shape[2]] = block
+            start += block.shape[1]
+
+        if not s_region:
+            return vertices
+        s_regions = np.concatenate(
+            s_region_blocks, axis=1
+        ) if s_region_blocks else np.empty((len(pas), 0), dtype=object)
+        return vertices, s_regions.astype(str)
+
+    def _exp_count(self) -> int:
+        """
+        Return the number of exposures (table rows) generated.
+
+        Subclasses should override this to avoid generating the exposures
+        with ``get_exp_list``.
+        """
+        return len(self.get_exp_list())
+
+    def _iter_exp_leaves(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        """
+        Expand this generator into the Exposure objects it is made of.
+
+        Yields ``(exposure, fill_args)`` pairs in output order, where
+        ``fill_args`` are the keyword arguments to pass to
+        ``exposure._fill_exp_columns`` to write its rows. The arguments have
+        the same semantics as for ``get_exp_list``.
+
+        By default, the rows of ``get_exp_list`` are yielded as a single
+        leaf. Subclasses made of Exposure objects should override this,
+        which is also required by `sweep_pa`.
+        """
+        yield _ExpListLeaf(self.get_exp_list(
+            pa=0 if pa is None else pa,
+            program_num=program_num,
+            obs_num=obs_num,
+            exp_num=exp_num,
+            pattern_point=pattern_point,
+            pointing=pointing,
+        )), {}
+
+
+class _ExpListLeaf:
+    """
+    Leaf of `ExpResultGenerator._iter_exp_leaves` writing the rows of an
+    exposure list into the columns of an exposure table.
+    """
+
+    def __init__(self, exp_list):
+        self.exp_list = exp_list
+
+    def _exp_count(self):
+        return len(self.exp_list)
+
+    def _fill_exp_columns(self, columns, start, footprints=None):
+        stop = start + len(self.exp_list)
+        for row, exp in enumerate(self.exp_list, start):
+            if not isinstance(exp, dict):
+                exp = dict(zip(EXP_TABLE_COLUMNS, exp))
+            for name, value in exp.items():
+                if name == 's_region' and footprints is not None:
+                    if not isinstance(value, FootprintArray):
+                        value = FootprintArray.from_stcs([value])
+                    footprints.append(value)
+                elif name == 's_region' and isinstance(value, FootprintArray):
+                    columns[name][row] = ''.join(value.to_stcs())
+                else:
+                    columns[name][row] = value
+        return stop
+
 
 class Pointing:
     """
@@ -176,6 +759,138 @@ class Pointing:
         att_matrix = attitude_matrix(self.v2, self.v3, self.ra, self.dec, pa)
         return att_matrix
 
+    def attitude_matrices(self, pas):
+        """
+        Return the (n_pa, 3, 3) attitude matrices of this pointing at the
+        position angles ``pas``, see `attitude_matrices`.
+        """
+        return attitude_matrices(self.v2, self.v3, self.ra, self.dec, np.atleast_1d(pas))
+
+
+class PointingSet:
+    """
+    A columnar set of pointings that share a target on the sky.
+
+    The V2/V3 coordinates and the pattern offsets of all pointings are held
+    in arrays instead of one `Pointing` object per point. Iterating over the
+    set or indexing it yields `Pointing` objects.
+    """
+
+    @property
+    def v2(self):
+        return self._v2
+
+    @property
+    def v3(self):
+        return self._v3
+
+    @property
+    def ra(self):
+        return self._ra
+
+    @property
+    def dec(self):
+        return self._dec
+
+    @property
+    def x_off(self):
+        return self._x_off
+
+    @property
+    def y_off(self):
+        return self._y_off
+
+    def __init__(self, v2, v3, ra, dec, x_off=0, y_off=0):
+        """
+        Initialize a PointingSet.
+
+        Parameters
+        ----------
+        v2 : array-like
+            V2 coordinate of each pointing.
+        v3 : array-like
+            V3 coordinate of each pointing.
+        ra : float
+            Right ascension of the shared target in degrees.
+        dec : float
+            Declination of the shared target in degrees.
+        x_off : array-like, optional
+            X-axis offset used to compute each v2 (default: 0).
+        y_off : array-like, optional
+            Y-axis offset used to compute each v3 (default: 0).
+        """
+        self._v2 = np.atleast_1d(v2)
+        self._v3 = np.atleast_1d(v3)
+        self._ra = ra
+        self._dec = dec
+        self._x_off = np.broadcast_to(x_off, self._v2.shape)
+        self._y_off = np.broadcast_to(y_off, self._v2.shape)
+
+    def __len__(self):
+        return len(self._v2)
+
+    def __getitem__(self, index):
+        return Pointing(
+            self._v2[index].item(),
+            self._v3[index].item(),
+            self.ra,
+            self.dec,
+            x_off=self._x_off[index].item(),
+            y_off=self._y_off[index].item(),
+        )
+
+    def __iter__(self):
+        for v2, v3, x_off, y_off in zip(
+            self._v2.tolist(), self._v3.tolist(), self._x_off.tolist(), self._y_off.tolist()
+        ):
+            yield Pointing(v2, v3, self.ra, self.dec, x_off=x_off, y_off=y_off)
+
+    @classmethod
+    def from_offsets(cls, exposure, x_off, y_off):
+        """
+        Create the pointings that place the target at ideal-frame offsets
+        from the reference point of an exposure, transforming all offsets in
+        a single call.
+
+        Parameters
+        ----------
+        exposure : Exposure
+            Has the target and aperture that define the initial pointing
+            before offsets are applied.
+        x_off, y_off : array-like
+            X and Y offsets (arcsec) in ideal detector coordinates.
+        """
+        x_off = np.atleast_1d(x_off)
+        y_off = np.atleast_1d(y_off)
+        ref_aperture_siaf = exposure.ref_aperture_siaf
+        if ref_aperture_siaf is None:
+            # If the reference aperture doesn't exist (e.g., when
+            # pseudoaperture jwst fgs all was selected), use the first
+            # aperture object in the list to try the offset calculation.
+            ref_aperture_siaf = exposure.aperture_list[0]
+
+        if len(x_off):
+            # Negate the offsets since they will define ideal coords on
+            # which to place the target, but the user is picturing moving
+            # the aperture in the direction of the ideal axes.
+            v2, v3 = ref_aperture_siaf.idl_to_tel(
+                -x_off,
+                -y_off,
+                V2Ref_arcsec=exposure.V2Ref,
+                V3Ref_arcsec=exposure.V3Ref
+                )
+        else:
+            v2 = v3 = np.zeros(0)
+
+        return cls(
+            v2,
+            v3,
+            exposure.target_ra,
+            exposure.target_dec,
+            x_off=x_off,
+            y_off=y_off,
+        )
+
 
 class Exposure(ExpResultGenerator):
 
@@ -235,7 +950,8 @@ class Exposure(ExpResultGenerator):
         )
 
     def __init__(self, target_ra, target_dec, x_off=0, y_off=0,
-                 telescope='roman', instrument='WFI', aperture='ALL'):
+                 telescope='roman', instrument='WFI', aperture='ALL',
+                 aperture_store=None):
         """
         Initialize an Exposure which represents a telescope aperture pointed at a sky position.
 
@@ -266,6 +982,12 @@ class Exposure(ExpResultGenerator):
             Name of the instrument. Default is 'WFI'.  See telescope for allowed values.
         aperture : str, optional
             Aperture specification. Default is 'ALL'.  See telescope for allowed values.
+        aperture_store : bool, str, Path or ApertureStore, optional
+            Load the apertures from a precompiled aperture store instead of
+            parsing the SIAF with pysiaf. `True` uses the store at the
+            default location, a path loads the store at that path. The store
+            is built with ``python -m mast_aladin.utils.aperture_store``.
+            Default is `None`, which uses pysiaf.
         """
 
         self._target_ra = target_ra
@@ -275,13 +997,29 @@ class Exposure(ExpResultGenerator):
         self._telescope = telescope
         self._instrument = instrument
         self._aperture = aperture
+        self._aperture_store = aperture_store
+
+        siaf_loader = None
+        if aperture_store is not None and aperture_store is not False:
+            if aperture_store is True:
+                aperture_store = load_aperture_store()
+            elif isinstance(aperture_store, (str, Path)):
+                aperture_store = load_aperture_store(aperture_store)
+            elif not isinstance(aperture_store, ApertureStore):
+                raise TypeError(
+                    "`aperture_store` must be a bool, a path or an ApertureStore. "
+                    f"Received {aperture_store=}"
+                )
+            else:
+                self._aperture_store = aperture_store.path
+            siaf_loader = aperture_store.siaf
 
         (
             self._aperture_list,
             aper_v2_ref,
             aper_v3_ref,
             self._ref_aperture_siaf,
-        ) = defineApertures(telescope, instrument, aperture)
+        ) = defineApertures(telescope, instrument, aperture, siafLoader=siaf_loader)
 
         self._ref_aper_v2_ref = aper_v2_ref
         self._ref_aper_v3_ref = aper_v3_ref
@@ -300,6 +1038,16 @@ class Exposure(ExpResultGenerator):
             V3Ref_arcsec=aper_v3_ref
             )
 
+    def __reduce__(self):
+        # Pickle the arguments and reference point rather than the SIAF
+        # apertures, which are rebuilt once per aperture selection by the
+        # process that unpickles the exposure, e.g. the workers of
+        # Program.get_exp_list.
+        return _restore_exposure, (type(self), (
+            self.target_ra, self.target_dec, self.x_off, self.y_off,
+            self.telescope, self.instrument, self.aperture, self._aperture_store,
+        ), self.V2Ref, self.V3Ref)
+
     def get_exp_list(
         self,
         pa=0,
@@ -339,14 +1087,15 @@ class Exposure(ExpResultGenerator):
         if pointing is None:
             pointing = self.pointing
         att_matrix = pointing.attitude_matrix(pa)
+        geometry = self.aperture_geometry
+        s_regions = geometry.s_regions(geometry.sky_vertices(att_matrix))
 
-        if (
-            self.telescope.lower() == 'roman'
-            and self.instrument.lower() == 'wfi'
-            and self.aperture.lower() == 'all'
-        ):
+        if self._separate_apertures:
             # Separate the 18 detectors into separate "exposures".
-            for ap in self.aperture_list:
+            aper_ras, aper_decs = tel_to_sky(att_matrix, *self._aperture_refs)
+            for ap, ap_s_region, aper_ra, aper_dec in zip(
+                self.aperture_list, s_regions, aper_ras, aper_decs
+            ):
                 exp = self._base_exp_obj(
                     pa,
                     program_num,
@@ -357,8 +1106,7 @@ class Exposure(ExpResultGenerator):
                     pointing.y_off,
                 )
                 exp['aperture'] = ap.AperName
-                exp['s_region'] = s_region([ap], att_matrix)
-                aper_ra, aper_dec = ap.tel_to_sky(ap.V2Ref, ap.V3Ref)
+                exp['s_region'] = ap_s_region
                 exp['aper_ra'] = aper_ra
                 exp['aper_dec'] = aper_dec
                 exp_list.append(exp)
@@ -373,15 +1121,125 @@ class Exposure(ExpResultGenerator):
                 pointing.x_off,
                 pointing.y_off,
             )
-            exp['s_region'] = s_region(self.aperture_list, att_matrix)
-            aper_ra, aper_dec = self.aperture_list[0].tel_to_sky(self._ref_aper_v2_ref,
-                                                                 self._ref_aper_v3_ref)
+            exp['s_region'] = ''.join(s_regions)
+            aper_ra, aper_dec = tel_to_sky(att_matrix, self._ref_aper_v2_ref,
+                                           self._ref_aper_v3_ref)
             exp['aper_ra'] = aper_ra
             exp['aper_dec'] = aper_dec
             exp_list.append(exp)
 
         return exp_list
 
+    def _exp_count(self):
+        return len(self.aperture_list) if self._separate_apertures else 1
+
+    def _iter_exp_leaves(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        yield self, dict(
+            pa=0 if pa is None else pa,
+            program_num=program_num,
+            obs_num=obs_num,
+            exp_num=exp_num,
+            pattern_point=pattern_point,
+            pointing=pointing,
+        )
+
+    def _fill_exp_columns(
+        self,
+        columns,
+        start,
+        pa=0,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+        footprints=None,
+    ):
+        """
+        Write the rows of this exposure into ``columns`` from row ``start``
+        on, with the same arguments as ``get_exp_list``. Return the index
+        after the last row written.
+
+        If ``footprints`` is a list, the footprints of the rows are appended
+        to it as a `FootprintArray` and the s_region column is not filled.
+        """
+        if pointing is None:
+            pointing = self.pointing
+        att_matrix = pointing.attitude_matrix(pa)
+        geometry = self.aperture_geometry
+        vertices = geometry.sky_vertices(att_matrix)
+        if footprints is None:
+            s_regions = geometry.s_regions(vertices)
+        else:
+            footprints.append(
+                geometry.footprints(vertices, combine=not self._separate_apertures)
+            )
+
+        if self._separate_apertures:
+            stop = start + len(self.aperture_list)
+            rows = slice(start, stop)
+            columns['aperture'][rows] = [ap.AperName for ap in self.aperture_list]
+            if footprints is None:
+                columns['s_region'][rows] = s_regions
+            columns['aper_ra'][rows], columns['aper_dec'][rows] = tel_to_sky(
+                att_matrix, *self._aperture_refs
+            )
+        else:
+            stop = start + 1
+            rows = slice(start, stop)
+            columns['aperture'][rows] = self.aperture
+            if footprints is None:
+                columns['s_region'][start] = ''.join(s_regions)
+            columns['aper_ra'][rows], columns['aper_dec'][rows] = tel_to_sky(
+                att_matrix, self._ref_aper_v2_ref, self._ref_aper_v3_ref
+            )
+
+        columns['telescope'][rows] = self.telescope
+        columns['instrument'][rows] = self.instrument
+        columns['targ_ra'][rows] = self.target_ra.degree
+        columns['targ_dec'][rows] = self.target_dec.degree
+        columns['program_num'][rows] = program_num
+        columns['obs_num'][rows] = obs_num
+        columns['position_angle'][rows] = pa
+        columns['exp_num'][rows] = exp_num
+        columns['x_off'][rows] = pointing.x_off
+        columns['y_off'][rows] = pointing.y_off
+        columns['pattern_point'][rows] = pattern_point
+
+        return stop
+
+    @cached_property
+    def aperture_geometry(self):
+        """
+        The `ApertureGeometry` of ``aperture_list``, used to project all
+        apertures onto the sky at once.
+        """
+        return ApertureGeometry(self.aperture_list)
+
+    @property
+    def _separate_apertures(self):
+        # Roman WFI with all detectors gives one "exposure" per detector
+        return (
+            self.telescope.lower() == 'roman'
+            and self.instrument.lower() == 'wfi'
+            and self.aperture.lower() == 'all'
+        )
+
+    @cached_property
+    def _aperture_refs(self):
+        return (
+            np.array([ap.V2Ref for ap in self.aperture_list]),
+            np.array([ap.V3Ref for ap in self.aperture_list]),
+        )
+
     def _base_exp_obj(
         self,
         pa=0,
@@ -414,6 +1272,34 @@ class Exposure(ExpResultGenerator):
         return base_exp_obj
 
 
+@lru_cache(maxsize=64)
+def _exposure_template(cls, telescope, instrument, aperture, aperture_store):
+    """
+    Return an exposure of an aperture selection, with its aperture geometry
+    computed, to share with the exposures unpickled in this process.
+    """
+    template = cls(0 * u.deg, 0 * u.deg, telescope=telescope, instrument=instrument,
+                   aperture=aperture, aperture_store=aperture_store)
+    template.aperture_geometry, template._aperture_refs
+    return template
+
+
+def _restore_exposure(cls, args, v2_ref, v3_ref):
+    """
+    Unpickle an Exposure pickled by ``Exposure.__reduce__``.
+    """
+    target_ra, target_dec, x_off, y_off = args[:4]
+    exposure = cls.__new__(cls)
+    exposure.__dict__.update(_exposure_template(cls, *args[4:]).__dict__)
+    exposure._target_ra = target_ra
+    exposure._target_dec = target_dec
+    exposure._x_off = x_off
+    exposure._y_off = y_off
+    exposure._V2Ref = v2_ref
+    exposure._V3Ref = v3_ref
+    return exposure
+
+
 class Pattern(ExpResultGenerator):
 
     @property
@@ -474,6 +1360,24 @@ class Pattern(ExpResultGenerator):
 
         return exp_list
 
+    def _exp_count(self):
+        return len(self.pointings) * self.exposure._exp_count()
+
+    def _iter_exp_leaves(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        for p in self.pointings:
+            yield from self.exposure._iter_exp_leaves(
+                pa, program_num, obs_num, exp_num, pattern_point, p
+            )
+            pattern_point += 1
+
 
 class CustomPattern(Pattern):
 
@@ -498,39 +1402,10 @@ class CustomPattern(Pattern):
         return self._offsets
 
     def _generate_pointings(self):
-        pointings = []
-        V2Ref_arcsec = self.exposure.V2Ref
-        V3Ref_arcsec = self.exposure.V3Ref
-        ref_aperture_siaf = self.exposure.ref_aperture_siaf
-
-        ra = self.exposure.target_ra
-        dec = self.exposure.target_dec
-
-        for offset in self.offsets:
-            total_x_off = offset[0]
-            total_y_off = offset[1]
-
-            # Negate the offsets since they will define ideal coords on
-            # which to place the target, but the user is picturing moving
-            # the aperture in the direction of the ideal axes.
-            offset_v2, offset_v3 = ref_aperture_siaf.idl_to_tel(
-                -total_x_off,
-                -total_y_off,
-                V2Ref_arcsec=V2Ref_arcsec,
-                V3Ref_arcsec=V3Ref_arcsec
-                )
-
-            pointing = Pointing(
-                offset_v2,
-                offset_v3,
-                ra,
-                dec,
-                x_off=total_x_off,
-                y_off=total_y_off
-                )
-            pointings.append(pointing)
-
-        return pointings
+        # X and Y are converted separately to keep the type of each
+        x_off = np.array([x_off for x_off, _ in self.offsets])
+        y_off = np.array([y_off for _, y_off in self.offsets])
+        return PointingSet.from_offsets(self.exposure, x_off, y_off)
 
 
 class DitherPattern(Pattern):
@@ -604,49 +1479,16 @@ class DitherPattern(Pattern):
         return self._col_y_off
 
     def _generate_pointings(self):
-        pointings = []
-        V2Ref_arcsec = self.exposure.V2Ref
-        V3Ref_arcsec = self.exposure.V3Ref
-        ref_aperture_siaf = self.exposure.ref_aperture_siaf
-        if ref_aperture_siaf is None:
-            # If the reference aperture doesn't exist (e.g., when
-            # pseudoaperture jwst fgs all was selected), use the first
-            # aperture object in the list to try the offset calculation.
-            ref_aperture_siaf = self.exposure.aperture_list[0]
-        ra = self.exposure.target_ra
-        dec = self.exposure.target_dec
-
-        for col in range(0, self._num_cols):
-            col_x_off = col * self._col_x_off
-            col_y_off = col * self._col_y_off
-            for row in range(0, self._num_rows):
-                row_x_off = row * self._row_x_off
-                row_y_off = row * self._row_y_off
-                total_x_off = col_x_off + row_x_off
-                total_y_off = col_y_off + row_y_off
-
-                # Negate the offsets since they will define ideal coords on
-                # which to place the target, but the user is picturing moving
-                # the aperture in the direction of the ideal axes.
-                offset_v2, offset_v3 = ref_aperture_siaf.idl_to_tel(
-                    -total_x_off,
-                    -total_y_off,
-                    V2Ref_arcsec=V2Ref_arcsec,
-                    V3Ref_arcsec=V3Ref_arcsec
-                    )
-
-                pointing = Pointing(
-                    offset_v2,
-                    offset_v3,
-                    ra,
-                    dec,
-                    x_off=total_x_off,
-                    y_off=total_y_off
-                    )
-
-                pointings.append(pointing)
+        # columns are the outer loop and rows the inner loop of the grid
+        col, row = np.meshgrid(
+            np.arange(self._num_cols), np.arange(self._num_rows), indexing='ij'
+        )
+        col = col.ravel()
+        row = row.ravel()
+        total_x_off = col * self._col_x_off + row * self._row_x_off
+        total_y_off = col * self._col_y_off + row * self._row_y_off
 
-        return pointings
+        return PointingSet.from_offsets(self.exposure, total_x_off, total_y_off)
 
 
 class Observation(ExpResultGenerator):
@@ -740,6 +1582,23 @@ class Observation(ExpResultGenerator):
 
         return exp_list
 
+    def _exp_count(self):
+        return sum(c._exp_count() for c in self.contents)
+
+    def _iter_exp_leaves(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        if pa is None:
+            pa = self.pa
+        for c in self.contents:
+            yield from c._iter_exp_leaves(pa=pa, program_num=program_num, obs_num=obs_num)
+
 
 class Program(ExpResultGenerator):
     @property
@@ -785,6 +1644,7 @@ class Program(ExpResultGenerator):
         exp_num=0,
         pattern_point=0,
         pointing=None,
+        workers=None,
     ) -> list:
         """
         Generate a list of exposure dictionaries for this program. Delegate
@@ -795,14 +1655,94 @@ class Program(ExpResultGenerator):
         the contained observations, although a non-zero obs_num can be
         specified as the starting number for contained observations.
 
+        Args:
+            workers (int, optional): Number of processes used to expand the
+                observations in parallel. The result is identical to the
+                serial one. Defaults to None, expanding them in this process.
+
         Returns:
             list: A list of exposure dictionaries, each containing exposure metadata
                 (aperture, s_region, aper_ra, aper_dec, etc.) and observation parameters.
         """
         exp_list = []
-        for c in self.contents:
-            sub_list = c.get_exp_list(program_num=self.program_num, obs_num=obs_num)
+        for sub_list in self._map_observations('get_exp_list', obs_num, workers):
             exp_list.extend(sub_list)
-            obs_num += 1
 
         return exp_list
+
+    def get_exp_table(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+        footprint_array=False,
+        workers=None,
+    ) -> Table:
+        """
+        Generate the exposures of this program as an astropy Table. See
+        `get_exp_list` and `ExpResultGenerator.get_exp_table` for the
+        arguments.
+        """
+        if workers is None or not self.contents:
+            return super().get_exp_table(obs_num=obs_num, footprint_array=footprint_array)
+
+        # the workers send back their columns, converted to a table once
+        results = list(self._map_observations(
+            '_exp_table_columns', obs_num, workers, footprint_array=footprint_array
+        ))
+        columns = {
+            name: np.concatenate([columns[name][:n_rows] for columns, n_rows, _ in results])
+            for name in EXP_TABLE_COLUMNS
+        }
+        footprints = None
+        if footprint_array:
+            footprints = [footprint for _, _, sub_list in results for footprint in sub_list]
+        return _exp_columns_to_table(columns, footprints=footprints)
+
+    def _map_observations(self, method, obs_num=0, workers=None, **kwargs):
+        """
+        Call ``method`` on each observation with its program and observation
+        numbers, and ``kwargs``, in a pool of ``workers`` processes if given.
+        The results are returned in observation order.
+        """
+        tasks = [
+            (c, method, dict(kwargs, program_num=self.program_num, obs_num=obs_num + i))
+            for i, c in enumerate(self.contents)
+        ]
+        if workers is None:
+            return map(_expand_observation, tasks)
+        if workers < 1:
+            raise ValueError(f"`workers` must be at least 1. Received {workers=}")
+
+        # a few chunks per worker to balance uneven observations
+        chunksize = max(1, len(tasks) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_expand_observation, tasks, chunksize=chunksize))
+
+    def _exp_count(self):
+        return sum(c._exp_count() for c in self.contents)
+
+    def _iter_exp_leaves(
+        self,
+        pa=None,
+        program_num=0,
+        obs_num=0,
+        exp_num=0,
+        pattern_point=0,
+        pointing=None,
+    ):
+        for c in self.contents:
+            yield from c._iter_exp_leaves(program_num=self.program_num, obs_num=obs_num)
+            obs_num += 1
+
+
+def _expand_observation(task):
+    """
+    Expand one observation of a Program. Defined at module level so that it
+    can be sent to worker processes.
+    """
+    observation, method, kwargs = task
+    return getattr(observation, method)(**kwargs)
@@ -0,0 +1,432 @@
+"""
+Spatial index of sky footprints.
+
+The footprints of a `~mast_aladin.utils.footprint_array.FootprintArray` are
+bounded by spherical caps, whose centers are indexed by a k-d tree of unit
+vectors, so that the footprints intersecting a region of the sky, e.g. the
+viewport of the widget, are found without testing every footprint. Many
+footprints can also be summarized by the HEALPix cells they cover, with
+`coverage_moc`, which requires astropy-healpix.
+"""
+import logging
+
+import numpy as np
+from ipyaladin.utils.exceptions import WidgetNotReadyError, WidgetReducedError
+from scipy.spatial import cKDTree
+
+from mast_aladin.utils.footprint_array import (
+    CIRCLE, FootprintArray, _concatenated_ranges, _offsets,
+)
+from mast_aladin.utils.hips import _healpix
+
+__all__ = [
+    'FootprintIndex',
+    'bounding_caps',
+    'coverage_moc',
+    'viewport_cap',
+]
+
+log = logging.getLogger(__name__)
+
+# maximum order of the HEALPix cells of `coverage_moc`
+_MAX_ORDER = 29
+# number of points sampled by `coverage_moc` on top of the vertices and
+# shape centers, above which the order of the cells is lowered, and number
+# of points sampled at once
+_MAX_SAMPLES = 2**23
+_SAMPLE_CHUNK_SIZE = 2**20
+# radius in degrees of the bounding caps above which shapes are covered by
+# their cap, as gnomonic projections do not reach 90 degrees
+_LARGE_SHAPE_RADIUS = 60.
+# radius in degrees of the caps of the smallest radius class of
+# `FootprintIndex`, whose classes double in radius
+_SMALLEST_CLASS_RADIUS = 2.**-10
+
+
+def _unit_vectors(ra, dec):
+    """Return the (n, 3) unit vectors of RA/Dec in degrees."""
+    ra, dec = np.radians(ra), np.radians(dec)
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+
+
+def _angles(vectors, others):
+    """Return the angles in degrees between unit vectors, row by row."""
+    # more accurate than the arc cosine of the dot product for small angles
+    cross = np.linalg.norm(np.cross(vectors, others), axis=-1)
+    return np.degrees(np.arctan2(cross, np.einsum('...i,...i', vectors, others)))
+
+
+def _cap(vectors):
+    """Return the center and radius in degrees of a cap bounding unit vectors."""
+    center = vectors.mean(axis=0)
+    norm = np.linalg.norm(center)
+    if not np.isfinite(norm) or norm < 1e-12:
+        return np.array([0., 0., 1.]), 180.
+    center /= norm
+    return center, float(_angles(vectors, center).max())
+
+
+def bounding_caps(footprints):
+    """
+    Compute a spherical cap bounding the footprint of each row.
+
+    The cap is centered on the mean of the unit vectors of the vertices of
+    the row, and its radius is the largest angle to a vertex, plus the
+    radius of circles.
+
+    Parameters
+    ----------
+    footprints : `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints.
+
+    Returns
+    -------
+    centers : `~numpy.ndarray`
+        (n_rows, 3) unit vectors of the centers of the caps, NaN for rows
+        without shapes.
+    radii : `~numpy.ndarray`
+        (n_rows,) radii of the caps in degrees, NaN for rows without shapes.
+    """
+    n_rows = len(footprints)
+    n_vertices = np.diff(footprints.vertex_offsets)
+    shape_rows = np.repeat(np.arange(n_rows), footprints.n_shapes)
+    vertex_shapes = np.repeat(np.arange(len(footprints.kinds)), n_vertices)
+    vertex_rows = shape_rows[vertex_shapes]
+    vectors = _unit_vectors(footprints.vertices[:, 0], footprints.vertices[:, 1])
+
+    centers = np.column_stack([
+        np.bincount(vertex_rows, weights=vectors[:, i], minlength=n_rows) for i in range(3)
+    ]).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    shape_radii = np.where(footprints.kinds == CIRCLE, footprints.radii, 0)
+    vertex_radii = _angles(vectors, centers[vertex_rows]) + shape_radii[vertex_shapes]
+    # the vertices of a row are contiguous
+    radii = np.full(n_rows, np.nan)
+    row_vertices = footprints.vertex_offsets[footprints.row_offsets]
+    has_vertices = np.diff(row_vertices) > 0
+    if np.any(has_vertices):
+        radii[has_vertices] = np.maximum.reduceat(
+            vertex_radii, row_vertices[:-1][has_vertices]
+        )
+    centers[~has_vertices] = np.nan
+    return centers, radii
+
+
+def _cell_size(order):
+    """Return the approximate width in degrees of the HEALPix cells of ``order``."""
+    return 58.6 / 2**order
+
+
+def _tangent_bases(centers):
+    """Return the unit vectors pointing east and north at unit vectors."""
+    east = np.cross([0., 0., 1.], centers)
+    norm = np.linalg.norm(east, axis=-1, keepdims=True)
+    # any direction is east at the poles
+    east = np.where(norm > 1e-12, east / np.maximum(norm, 1e-12), [1., 0., 0.])
+    return east, np.cross(centers, east)
+
+
+def _normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+class _ShapeSampler:
+    """
+    Points sampling the shapes of footprints, to find the HEALPix cells they
+    cover, see `coverage_moc`.
+
+    The inside of a shape is sampled on a grid of its gnomonic projection
+    centered on its bounding cap, where the great circle edges of polygons
+    are straight lines, and its boundary along its edges or circle. Shapes
+    smaller than the grid spacing are sampled by their vertices and center.
+    """
+
+    def __init__(self, footprints):
+        self.footprints = footprints
+        # one shape per row
+        self.centers, self.radii = bounding_caps(FootprintArray(
+            footprints.kinds, footprints.vertex_offsets, footprints.vertices, footprints.radii
+        ))
+        self.east, self.north = _tangent_bases(self.centers)
+        self.is_circle = footprints.kinds == CIRCLE
+        self.vectors = _unit_vectors(footprints.vertices[:, 0], footprints.vertices[:, 1])
+        self.n_vertices = np.diff(footprints.vertex_offsets)
+        self.vertex_shapes = np.repeat(np.arange(len(self.n_vertices)), self.n_vertices)
+
+        # the next vertex of each polygon vertex, and the lengths in degrees
+        # of the edges
+        self.next_vertex = np.arange(1, len(self.vectors) + 1)
+        self.next_vertex[footprints.vertex_offsets[1:] - 1] = footprints.vertex_offsets[:-1]
+        chords = np.linalg.norm(self.vectors[self.next_vertex] - self.vectors, axis=1)
+        self.edge_lengths = np.degrees(2 * np.arcsin(np.minimum(chords / 2, 1)))
+        self.circumferences = 360 * np.sin(np.radians(np.minimum(self.radii, 90)))
+
+    def grid_sizes(self, shapes, spacing):
+        """Return the number of grid points along each axis of ``shapes``."""
+        extent = np.tan(np.radians(self.radii[shapes])) / np.radians(spacing)
+        return 2 * np.floor(extent).astype(np.int64) + 1
+
+    def _edge_points(self, vertices, spacing):
+        return np.maximum(1, np.ceil(self.edge_lengths[vertices] / spacing)).astype(np.int64)
+
+    def _circle_points(self, circles, spacing):
+        return np.maximum(4, np.ceil(self.circumferences[circles] / spacing)).astype(np.int64)
+
+    def n_points(self, shapes, spacing):
+        """Return the number of points sampling each of ``shapes``."""
+        polygon_points = np.bincount(
+            self.vertex_shapes, weights=self._edge_points(slice(None), spacing),
+            minlength=len(self.n_vertices)
+        )[shapes]
+        boundary = np.where(
+            self.is_circle[shapes], self._circle_points(shapes, spacing), polygon_points
+        )
+        return self.grid_sizes(shapes, spacing)**2 + boundary
+
+    def interior(self, shapes, spacing):
+        """Return the unit vectors of the grid points inside ``shapes``."""
+        sizes = self.grid_sizes(shapes, spacing)
+        gridded = sizes > 1
+        shapes, sizes = shapes[gridded], sizes[gridded]
+        n_grid = sizes**2
+        point_shapes = np.repeat(shapes, n_grid)
+        local = np.arange(n_grid.sum()) - np.repeat(_offsets(n_grid)[:-1], n_grid)
+        point_sizes = np.repeat(sizes, n_grid)
+        step = np.radians(spacing)
+        x = (local % point_sizes - (point_sizes - 1) // 2) * step
+        y = (local // point_sizes - (point_sizes - 1) // 2) * step
+
+        # the caps of circles are the circles
+        inside = x**2 + y**2 <= np.tan(np.radians(self.radii[point_shapes]))**2
+        polygon_points = np.flatnonzero(inside & ~self.is_circle[point_shapes])
+        inside[polygon_points] = self._in_polygons(
+            point_shapes[polygon_points], x[polygon_points], y[polygon_points]
+        )
+
+        point_shapes, x, y = point_shapes[inside], x[inside], y[inside]
+        return _normalized(
+            self.centers[point_shapes]
+            + x[:, None] * self.east[point_shapes] + y[:, None] * self.north[point_shapes]
+        )
+
+    def _in_polygons(self, point_shapes, x, y):
+        """
+        Return whether points of the gnomonic projections of their polygons
+        are inside them, by counting the edges crossed by rays toward +x.
+        """
+        shapes, point_indices = np.unique(point_shapes, return_inverse=True)
+        # the vertices of the polygons, projected
+        vertices = _concatenated_ranges(
+            self.footprints.vertex_offsets[shapes], self.footprints.vertex_offsets[shapes + 1]
+        )
+        centers = self.centers[self.vertex_shapes[vertices]]
+        depth = np.einsum('ij,ij->i', self.vectors[vertices], centers)
+        projected = np.zeros((len(self.vectors), 2))
+        projected[vertices, 0] = np.einsum(
+            'ij,ij->i', self.vectors[vertices], self.east[self.vertex_shapes[vertices]]
+        ) / depth
+        projected[vertices, 1] = np.einsum(
+            'ij,ij->i', self.vectors[vertices], self.north[self.vertex_shapes[vertices]]
+        ) / depth
+
+        n_edges = self.n_vertices[point_shapes]
+        pair_points = np.repeat(np.arange(len(point_shapes)), n_edges)
+        starts = self.footprints.vertex_offsets[point_shapes[pair_points]] + (
+            np.arange(n_edges.sum()) - np.repeat(_offsets(n_edges)[:-1], n_edges)
+        )
+        (x0, y0), (x1, y1) = projected[starts].T, projected[self.next_vertex[starts]].T
+        px, py = x[pair_points], y[pair_points]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = ((y0 > py) != (y1 > py)) & (px < x0 + (py - y0) * (x1 - x0) / (y1 - y0))
+        return np.bincount(pair_points, weights=crosses, minlength=len(point_shapes)) % 2 == 1
+
+    def boundary(self, shapes, spacing):
+        """
+        Return the unit vectors of points along the boundaries of ``shapes``,
+        and of their centers.
+        """
+        polygons = shapes[~self.is_circle[shapes]]
+        vertices = _concatenated_ranges(
+            self.footprints.vertex_offsets[polygons], self.footprints.vertex_offsets[polygons + 1]
+        )
+        edge_points = self._edge_points(vertices, spacing)
+        if np.all(edge_points == 1):
+            polygon_points = self.vectors[vertices]
+        else:
+            point_vertices = np.repeat(vertices, edge_points)
+            t = np.arange(edge_points.sum()) - np.repeat(_offsets(edge_points)[:-1], edge_points)
+            t = (t / np.repeat(edge_points, edge_points))[:, None]
+            # the normalized chords of great circle arcs are on the arcs
+            polygon_points = _normalized(
+                (1 - t) * self.vectors[point_vertices]
+                + t * self.vectors[self.next_vertex[point_vertices]]
+            )
+
+        circles = shapes[self.is_circle[shapes]]
+        circle_points = self._circle_points(circles, spacing)
+        point_circles = np.repeat(circles, circle_points)
+        angle = 2 * np.pi * (
+            np.arange(circle_points.sum()) - np.repeat(_offsets(circle_points)[:-1], circle_points)
+        ) / np.repeat(circle_points, circle_points)
+        radius = np.radians(self.radii[point_circles])[:, None]
+        circle_vectors = np.cos(radius) * self.centers[point_circles] + np.sin(radius) * (
+            np.cos(angle)[:, None] * self.east[point_circles]
+            + np.sin(angle)[:, None] * self.north[point_circles]
+        )
+        return np.concatenate([polygon_points, circle_vectors, self.centers[shapes]])
+
+
+def coverage_moc(footprints, max_cells, min_size=0.):
+    """
+    Summarize footprints by the HEALPix cells they cover, as a MOC of one
+    order.
+
+    The cells are found at the highest order with cells of at least
+    ``min_size``, and at most about 8 million points sampling the
+    footprints on top of their vertices: grids of points half a cell apart
+    inside the shapes, and points along their boundaries. Shapes larger than
+    60 degrees are covered by their bounding caps. The cells are then
+    merged into their parent cells until there are at most ``max_cells``.
+
+    Parameters
+    ----------
+    footprints : `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints.
+    max_cells : int
+        Maximum number of cells.
+    min_size : float, optional
+        Minimum size of the cells in degrees. Defaults to 0, the cells of
+        order 29.
+
+    Returns
+    -------
+    dict
+        The MOC, with the order as key and the sorted cells as value, as
+        accepted by `ipyaladin.Aladin.add_moc`.
+    """
+    healpix = _healpix()
+    sampler = _ShapeSampler(footprints)
+    small = np.flatnonzero(sampler.radii <= _LARGE_SHAPE_RADIUS)
+    large = np.flatnonzero(sampler.radii > _LARGE_SHAPE_RADIUS)
+
+    order = int(np.clip(np.floor(np.log2(58.6 / max(min_size, 1e-12))), 0, _MAX_ORDER))
+    budget = _MAX_SAMPLES + len(footprints.vertices) + len(footprints.kinds)
+    while order > 0 and (
+        sampler.n_points(small, _cell_size(order) / 2).sum(dtype=np.float64)
+        + (12 * 4**order if len(large) else 0)
+    ) > budget:
+        order -= 1
+    spacing = _cell_size(order) / 2
+    nside = 2**order
+
+    def to_cells(vectors):
+        return np.unique(healpix.xyz_to_healpix(*vectors.T, nside, order='nested'))
+
+    found = [np.zeros(0, dtype=np.int64)]
+    # the shapes are sampled in chunks of about `_SAMPLE_CHUNK_SIZE` points
+    chunks = np.cumsum(sampler.n_points(small, spacing)) // _SAMPLE_CHUNK_SIZE
+    for chunk in np.unique(chunks):
+        shapes = small[chunks == chunk]
+        found.append(to_cells(sampler.interior(shapes, spacing)))
+        found.append(to_cells(sampler.boundary(shapes, spacing)))
+    if len(large):
+        # the cells of centers within a cell of the caps
+        all_cells = np.arange(12 * 4**order)
+        cell_vectors = np.column_stack(healpix.healpix_to_xyz(all_cells, nside, order='nested'))
+        for shape in large:
+            angles = _angles(cell_vectors, sampler.centers[shape])
+            found.append(all_cells[angles <= sampler.radii[shape] + _cell_size(order)])
+    cells = np.unique(np.concatenate(found))
+
+    # the 4 cells of order k + 1 in a cell of order k have the same index
+    # divided by 4
+    while order > 0 and len(cells) > max_cells:
+        cells = np.unique(cells // 4)
+        order -= 1
+    return {str(order): cells.tolist()}
+
+
+def viewport_cap(aladin):
+    """
+    Return the center unit vector and radius in degrees of a cap bounding
+    the viewport of a mast-aladin widget, or `None` while the widget has no
+    viewport, e.g. before it is shown or while it is scrolled out of view.
+    Viewports without finite corners, such as views of the whole sky, give
+    the whole sky.
+    """
+    if not aladin._wcs:
+        return None
+    try:
+        vertices = aladin.get_viewport_region().vertices
+    except (WidgetNotReadyError, WidgetReducedError) as err:
+        log.debug("No viewport: %s", err)
+        return None
+    return _cap(_unit_vectors(vertices.ra.deg, vertices.dec.deg))
+
+
+class FootprintIndex:
+    """
+    Index of the bounding caps of footprints, see `bounding_caps`.
+
+    The caps are grouped in classes of radii within a factor 2, each indexed
+    by its own k-d tree, so that a few large footprints, such as TESS
+    sectors in a table of HST exposures, do not widen the search for the
+    small ones.
+
+    Parameters
+    ----------
+    footprints : `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints. Rows without shapes are never found.
+    """
+
+    def __init__(self, footprints):
+        self.centers, self.radii = bounding_caps(footprints)
+        rows = np.flatnonzero(np.isfinite(self.radii))
+        radius_classes = np.ceil(np.log2(
+            np.maximum(self.radii[rows], _SMALLEST_CLASS_RADIUS) / _SMALLEST_CLASS_RADIUS
+        )).astype(int)
+
+        # the rows, k-d tree and largest radius of each class
+        self._classes = []
+        for radius_class in np.unique(radius_classes):
+            class_rows = rows[radius_classes == radius_class]
+            self._classes.append((
+                class_rows, cKDTree(self.centers[class_rows]), self.radii[class_rows].max()
+            ))
+
+    def __len__(self):
+        return len(self.radii)
+
+    def query(self, center, radius):
+        """
+        Find the footprints whose caps intersect a cap.
+
+        Parameters
+        ----------
+        center : array-like
+            Unit vector of the center of the cap.
+        radius : float
+            Radius of the cap in degrees.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Sorted indices of the rows.
+        """
+        center = np.asarray(center, dtype=float)
+        candidates = [np.zeros(0, dtype=np.int64)]
+        for rows, tree, max_radius in self._classes:
+            if radius + max_radius >= 180:
+                candidates.append(rows)
+                continue
+            # the caps of the candidates of a class are at most its largest
+            # radius away
+            chord = 2 * np.sin(np.radians(radius + max_radius) / 2)
+            found = tree.query_ball_point(center, chord)
+            candidates.append(rows[np.asarray(found, dtype=np.int64)])
+        candidates = np.sort(np.concatenate(candidates))
+
+        angles = _angles(self.centers[candidates], center)
+        return candidates[angles <= radius + self.radii[candidates]]
@@ -0,0 +1,646 @@
+"""
+Build local HiPS (Hierarchical Progressive Surveys) of images, and serve them
+to the Aladin Lite widget.
+
+A HiPS is a hierarchy of tiles: images of the HEALPix cells of the sky at
+increasing orders, which Aladin Lite streams as needed for the current view,
+so that large mosaics render at any zoom without sending whole images to the
+widget. `HipsBuilder` resamples FITS and ASDF images onto the FITS tiles of
+the finest order with a pool of processes, and bins them into the tiles of
+the lower orders. It records the tiles covered by each input, so that a
+rebuild after inputs are added, changed or removed only renders the tiles
+they cover. `HipsServer` serves a HiPS directory over HTTP from the kernel,
+see `~mast_aladin.MastAladin.add_hips`.
+
+Building HiPS requires the optional dependency astropy-healpix.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import functools
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import threading
+import urllib.parse
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import ICRS, SkyCoord
+from astropy.io import fits
+from astropy.wcs import WCS
+from astropy.wcs.utils import proj_plane_pixel_scales, wcs_to_celestial_frame
+
+from mast_aladin.utils.fits_ingest import SCALING_KEYWORDS, _physical
+from mast_aladin.utils.wcs_cache import gwcs_to_fits_header
+
+__all__ = [
+    'HipsBuilder',
+    'HipsServer',
+    'tile_lonlat',
+    'tile_offsets',
+    'tile_path',
+]
+
+log = logging.getLogger(__name__)
+
+# records the inputs of a HiPS and the tiles they cover, for rebuilds
+MANIFEST = 'mast_aladin_inputs.json'
+
+# maximum order of the HEALPix cells of tile pixels
+_MAX_ORDER = 29
+
+# inputs opened by the current process, by path, modification time and size
+_open_inputs = {}
+
+
+def _healpix():
+    """
+    Import astropy-healpix, the optional dependency of HiPS and of the
+    coverage of footprints.
+    """
+    try:
+        import astropy_healpix
+    except ImportError:
+        raise ImportError(
+            "HiPS and footprint coverage require astropy-healpix, install it with "
+            "`pip install astropy-healpix`."
+        ) from None
+    return astropy_healpix
+
+
+def tile_path(directory, order, index):
+    """
+    Return the path of the FITS tile of HEALPix cell ``index`` at ``order`` in
+    the HiPS ``directory``.
+    """
+    return (
+        Path(directory) / f'Norder{order}' / f'Dir{index // 10000 * 10000}'
+        / f'Npix{index}.fits'
+    )
+
+
+def tile_offsets(tile_width):
+    """
+    Return the offsets ``dx, dy`` of the pixel centers of a tile within its
+    HEALPix cell, as ``(tile_width, tile_width)`` arrays.
+
+    In FITS tiles, ``dx`` decreases along the columns and ``dy`` increases
+    along the rows, so that tiles are stored with a flipped parity, as by
+    the HiPS 1.0 standard.
+    """
+    centers = (np.arange(tile_width) + 0.5) / tile_width
+    dx = np.repeat(centers[::-1, None], tile_width, axis=1)
+    dy = np.repeat(centers[None, :], tile_width, axis=0)
+    return dx, dy
+
+
+def tile_lonlat(order, index, tile_width):
+    """
+    Return the ICRS longitudes and latitudes in degrees of the pixel centers
+    of the tile of HEALPix cell ``index`` at ``order``.
+    """
+    dx, dy = tile_offsets(tile_width)
+    lon, lat = _healpix().healpix_to_lonlat(
+        np.full(dx.shape, index), 2**order, dx=dx, dy=dy, order='nested'
+    )
+    return lon.deg, lat.deg
+
+
+def _tile_pixels(wcs, order, index, tile_width, node_step=8):
+    """
+    Return the zero-based pixel coordinates in the image of ``wcs`` of the
+    pixel centers of a tile.
+
+    The coordinates are computed exactly at the corners of blocks of
+    ``node_step`` tile pixels, and interpolated bilinearly in between.
+    """
+    node_step = min(node_step, tile_width)
+    edges = np.arange(0, tile_width + 1, node_step) / tile_width
+    dx = np.repeat(edges[::-1, None], len(edges), axis=1)
+    dy = np.repeat(edges[None, :], len(edges), axis=0)
+    lon, lat = _healpix().healpix_to_lonlat(
+        np.full(dx.shape, index), 2**order, dx=dx, dy=dy, order='nested'
+    )
+    # pixel coordinates do not wrap around like longitudes
+    nodes = wcs.all_world2pix(*_to_frame(wcs, lon.deg, lat.deg), 0, quiet=True)
+
+    centers = (np.arange(tile_width) + 0.5) / node_step
+    left = np.minimum(centers.astype(np.intp), len(edges) - 2)
+    weight = centers - left
+
+    def interpolate(node_values):
+        columns = node_values[:, left] + (node_values[:, left + 1] - node_values[:, left]) * weight
+        return columns[left] + (columns[left + 1] - columns[left]) * weight[:, None]
+
+    return [interpolate(node_values) for node_values in nodes]
+
+
+def _open_input(path, extension=1):
+    """
+    Return the raw 2D image data, the celestial WCS (with its distortions)
+    and the scaling keywords of a FITS or ASDF file, opened once per process.
+    """
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size, extension)
+    if key in _open_inputs:
+        return _open_inputs[key][:3]
+
+    if Path(path).suffix.lower() == '.asdf':
+        import roman_datamodels.datamodels as rdd
+
+        file = rdd.open(path, memmap=True)
+        data = np.asarray(file.data)
+        wcs = WCS(gwcs_to_fits_header(file.meta.wcs, path=path))
+        scaling = {}
+    else:
+        file = fits.open(path, memmap=True, do_not_scale_image_data=True)
+        hdu = file[extension if len(file) > 1 else 0]
+        data = hdu.data
+        wcs = WCS(hdu.header, file)
+        scaling = {
+            keyword: hdu.header[keyword]
+            for keyword in SCALING_KEYWORDS
+            if keyword in hdu.header
+        }
+
+    if data is None or data.ndim != 2:
+        file.close()
+        raise ValueError(f"{path} does not contain a 2D image.")
+
+    _open_inputs[key] = (data, wcs.celestial, scaling, file)
+    return data, wcs.celestial, scaling
+
+
+def _close_inputs():
+    """Close the inputs opened by the current process."""
+    for *_, file in _open_inputs.values():
+        file.close()
+    _open_inputs.clear()
+
+
+def _to_frame(wcs, lon, lat):
+    """Return ICRS ``lon, lat`` in degrees in the celestial frame of ``wcs``."""
+    frame = wcs_to_celestial_frame(wcs)
+    if isinstance(frame, ICRS):
+        return lon, lat
+    coords = SkyCoord(lon, lat, unit='deg', frame='icrs').transform_to(frame)
+    return coords.spherical.lon.deg, coords.spherical.lat.deg
+
+
+def _to_icrs(wcs, lon, lat):
+    """Return ``lon, lat`` in degrees in the frame of ``wcs`` in ICRS."""
+    frame = wcs_to_celestial_frame(wcs)
+    if isinstance(frame, ICRS):
+        return lon, lat
+    coords = SkyCoord(lon, lat, unit='deg', frame=frame).icrs
+    return coords.ra.deg, coords.dec.deg
+
+
+def _sample(data, scaling, x, y):
+    """
+    Sample raw ``data`` at the zero-based pixel coordinates ``x, y`` by
+    bilinear interpolation, as float32 physical values with NaN outside of
+    the image.
+    """
+    n_rows, n_cols = data.shape
+    values = np.full(x.shape, np.nan, dtype=np.float32)
+    inside = (x > -0.5) & (x < n_cols - 0.5) & (y > -0.5) & (y < n_rows - 0.5)
+    if not inside.any():
+        return values
+
+    x = np.clip(x[inside], 0, n_cols - 1)
+    y = np.clip(y[inside], 0, n_rows - 1)
+    x0 = np.floor(x).astype(np.intp)
+    y0 = np.floor(y).astype(np.intp)
+    x1 = np.minimum(x0 + 1, n_cols - 1)
+    y1 = np.minimum(y0 + 1, n_rows - 1)
+    wx = (x - x0).astype(np.float32)
+    wy = (y - y0).astype(np.float32)
+
+    # only the pixels sampled are read from memory-mapped data
+    flat = data.reshape(-1)
+    top = _physical(flat[y0 * n_cols + x0], scaling)
+    top += (_physical(flat[y0 * n_cols + x1], scaling) - top) * wx
+    bottom = _physical(flat[y1 * n_cols + x0], scaling)
+    bottom += (_physical(flat[y1 * n_cols + x1], scaling) - bottom) * wx
+    top += (bottom - top) * wy
+    values[inside] = top
+    return values
+
+
+def _write_tile(path, tile):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # written to a temporary file first, so that the tiles served while a
+    # HiPS is rebuilt are always complete
+    temporary = path.with_suffix(f'.{os.getpid()}.tmp')
+    fits.PrimaryHDU(tile).writeto(temporary, overwrite=True)
+    os.replace(temporary, path)
+
+
+def _render_tile(directory, order, index, tile_width, inputs):
+    """
+    Resample ``inputs``, a list of ``(path, extension)``, onto a tile, as the
+    mean of the inputs that cover each pixel, and write it. Empty tiles are
+    deleted.
+
+    Returns whether the tile was written.
+    """
+    total = np.zeros((tile_width, tile_width), dtype=np.float32)
+    count = np.zeros((tile_width, tile_width), dtype=np.float32)
+    for path, extension in inputs:
+        data, wcs, scaling = _open_input(path, extension)
+        x, y = _tile_pixels(wcs, order, index, tile_width)
+        values = _sample(data, scaling, x, y)
+        valid = np.isfinite(values)
+        total[valid] += values[valid]
+        count[valid] += 1
+
+    path = tile_path(directory, order, index)
+    if not count.any():
+        path.unlink(missing_ok=True)
+        return False
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        _write_tile(path, total / count)
+    return True
+
+
+def _merge_tile(directory, order, index, tile_width):
+    """
+    Bin the four tiles of order ``order + 1`` in HEALPix cell ``index`` into
+    its tile, by means of blocks of 2 x 2 pixels, and write it. Empty tiles
+    are deleted.
+
+    Returns whether the tile was written.
+    """
+    half = tile_width // 2
+    tile = np.full((tile_width, tile_width), np.nan, dtype=np.float32)
+    written = False
+    for child in range(4):
+        child_path = tile_path(directory, order + 1, 4 * index + child)
+        if not child_path.exists():
+            continue
+        with fits.open(child_path) as hdu_list:
+            blocks = hdu_list[0].data.astype(np.float32).reshape(half, 2, half, 2)
+        valid = np.isfinite(blocks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            binned = np.where(valid, blocks, 0).sum(axis=(1, 3)) / valid.sum(axis=(1, 3))
+
+        # the two bits of the child index are its offsets along dx and dy,
+        # see `tile_offsets`
+        along_dx, along_dy = child & 1, child >> 1
+        rows = slice((1 - along_dx) * half, (2 - along_dx) * half)
+        columns = slice(along_dy * half, (along_dy + 1) * half)
+        tile[rows, columns] = binned
+        written = True
+
+    path = tile_path(directory, order, index)
+    if not written or np.isnan(tile).all():
+        path.unlink(missing_ok=True)
+        return False
+    _write_tile(path, tile)
+    return True
+
+
+def _call(arguments):
+    function, *arguments = arguments
+    return function(*arguments)
+
+
+class HipsBuilder:
+    """
+    Build a HiPS of FITS and ASDF images in a local directory.
+
+    Tiles are FITS images of float32 physical values, with NaN where no
+    input covers the sky. Where inputs overlap, tiles hold the mean of the
+    inputs. The inputs are resampled with their full WCS, including
+    distortions, so the tiles are accurately registered even though Aladin
+    Lite drops the distortions of images loaded with
+    `~mast_aladin.MastAladin.add_fits`.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the HiPS.
+    order : int, optional
+        HEALPix order of the finest tiles. Defaults to the lowest order with
+        pixels no larger than the pixels of the sharpest input.
+    tile_width : int, optional
+        Width in pixels of the tiles, a power of two. Defaults to 512.
+    extension : int, optional
+        FITS extension containing the image data, if the files have more
+        than one HDU. Defaults to 1.
+    workers : int, optional
+        Number of processes. Defaults to the number of CPUs. With one
+        worker, the tiles are built in the current process.
+    title : str, optional
+        Title of the HiPS, shown by Aladin Lite. Defaults to the name of
+        ``directory``.
+    """
+
+    def __init__(
+            self, directory, order=None, tile_width=512, extension=1, workers=None,
+            title=None
+            ):
+        if tile_width < 2 or tile_width & (tile_width - 1):
+            raise ValueError(f"The tile width must be a power of two, got {tile_width}.")
+        self.directory = Path(directory)
+        self.order = order
+        self.tile_width = tile_width
+        self.extension = extension
+        self.workers = workers
+        self.title = title or self.directory.name
+
+    def _settings(self):
+        return dict(order=self.order, tile_width=self.tile_width, extension=self.extension)
+
+    def _read_manifest(self):
+        path = self.directory / MANIFEST
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def _describe(self, path):
+        """
+        Return the description of an input recorded in the manifest: its
+        file stats, native order, data range, and the tiles it covers at
+        its native order.
+        """
+        data, wcs, scaling = _open_input(path, self.extension)
+
+        # the lowest order with tile pixels no larger than the input pixels,
+        # whose size is sqrt(pi / 3) / nside radians
+        pixel_scale = np.deg2rad(proj_plane_pixel_scales(wcs).min())
+        order = int(np.ceil(np.log2(np.sqrt(np.pi / 3) / pixel_scale)))
+        tile_bits = int(np.log2(self.tile_width))
+        order = int(np.clip(order - tile_bits, 0, _MAX_ORDER - tile_bits))
+
+        flat = data.reshape(-1)
+        sample = _physical(flat[::max(1, flat.size // 2**20)], scaling)
+        if np.isnan(sample).all():
+            data_range = cut = [0., 0.]
+        else:
+            data_range = [float(np.nanmin(sample)), float(np.nanmax(sample))]
+            cut = [float(value) for value in np.nanpercentile(sample, (0.5, 99.5))]
+
+        stat = os.stat(path)
+        return dict(
+            mtime_ns=stat.st_mtime_ns, size=stat.st_size, order=order,
+            data_range=data_range, cut=cut,
+        ), wcs, data.shape
+
+    def _covered_tiles(self, wcs, shape, order):
+        """
+        Return the sorted HEALPix cells at ``order`` covered by an image.
+
+        Positions on a grid at a quarter of the size of the cells, and along
+        the edges of the image, give the cells they fall in, and their
+        neighbours catch the cells overlapping the image between positions.
+        """
+        healpix = _healpix()
+        nside = 2**order
+        cell_size = np.rad2deg(np.sqrt(np.pi / 3) / nside)
+        step = max(1., cell_size / proj_plane_pixel_scales(wcs).max() / 4)
+
+        n_rows, n_cols = shape
+        columns = np.append(np.arange(-0.5, n_cols - 0.5, step), n_cols - 0.5)
+        rows = np.append(np.arange(-0.5, n_rows - 0.5, step), n_rows - 0.5)
+        x, y = np.meshgrid(columns, rows)
+        lon, lat = _to_icrs(wcs, *wcs.all_pix2world(x.ravel(), y.ravel(), 0))
+        cells = np.unique(healpix.lonlat_to_healpix(
+            lon * u.deg, lat * u.deg, nside, order='nested'
+        ))
+        neighbours = healpix.neighbours(cells, nside, order='nested').ravel()
+        return np.union1d(cells, neighbours[neighbours >= 0]).tolist()
+
+    @staticmethod
+    def _map(executor, workers, function, tasks):
+        tasks = [(function, *task) for task in tasks]
+        if executor is None:
+            return list(map(_call, tasks))
+        chunksize = max(1, len(tasks) // (4 * workers))
+        return list(executor.map(_call, tasks, chunksize=chunksize))
+
+    def build(self, images):
+        """
+        Build or update the HiPS of ``images``.
+
+        If the directory holds a HiPS built with the same settings, only the
+        tiles covered by the images added, changed (by modification time or
+        size) or removed since are rebuilt.
+
+        Parameters
+        ----------
+        images : list of str or Path
+            FITS files, and ASDF files with an ``.asdf`` suffix.
+
+        Returns
+        -------
+        int
+            Number of tiles written or deleted, at all orders.
+        """
+        paths = [str(Path(image).resolve()) for image in images]
+        if not paths:
+            raise ValueError("No images to build a HiPS of.")
+
+        manifest = self._read_manifest()
+        if manifest is None or manifest['settings'] != self._settings():
+            # a new HiPS, or a HiPS built with other settings
+            for order_directory in self.directory.glob('Norder*'):
+                shutil.rmtree(order_directory)
+            manifest = dict(settings=self._settings(), order=None, inputs={})
+        previous = manifest['inputs']
+
+        inputs = {}
+        changed = set()
+        for path in paths:
+            stat = os.stat(path)
+            entry = previous.get(path)
+            if entry is None or (entry['mtime_ns'], entry['size']) != (
+                    stat.st_mtime_ns, stat.st_size):
+                entry, wcs, shape = self._describe(path)
+                entry['wcs'], entry['shape'] = wcs.to_header_string(relax=True), shape
+                changed.add(path)
+            inputs[path] = entry
+        removed = set(previous) - set(inputs)
+
+        order = self.order
+        if order is None:
+            order = max(entry['order'] for entry in inputs.values())
+        if order != manifest['order']:
+            # the finest order changed, every tile is rebuilt
+            for order_directory in self.directory.glob('Norder*'):
+                shutil.rmtree(order_directory)
+            changed = set(inputs)
+            removed = set()
+
+        affected = set()
+        for path in changed | removed:
+            affected.update(previous.get(path, {}).get('tiles', []))
+        for path in changed:
+            entry = inputs[path]
+            wcs = WCS(fits.Header.fromstring(entry['wcs']))
+            entry['tiles'] = self._covered_tiles(wcs, entry['shape'], order)
+            affected.update(entry['tiles'])
+        affected = sorted(affected)
+
+        log.info(
+            "Building %d tiles of order %d of the HiPS in %s for %d changed and %d "
+            "removed images", len(affected), order, self.directory, len(changed), len(removed)
+        )
+        covered_by = {}
+        for path, entry in inputs.items():
+            for index in entry['tiles']:
+                covered_by.setdefault(index, []).append((path, self.extension))
+
+        workers = self.workers or os.cpu_count()
+        executor = ProcessPoolExecutor(workers) if workers > 1 and affected else None
+        n_updated = 0
+        try:
+            self._map(executor, workers, _render_tile, [
+                (self.directory, order, index, self.tile_width, covered_by.get(index, []))
+                for index in affected
+            ])
+            n_updated += len(affected)
+            for parent_order in range(order - 1, -1, -1):
+                affected = sorted({index // 4 for index in affected})
+                self._map(executor, workers, _merge_tile, [
+                    (self.directory, parent_order, index, self.tile_width)
+                    for index in affected
+                ])
+                n_updated += len(affected)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _close_inputs()
+
+        manifest.update(order=order, inputs=inputs)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / MANIFEST).write_text(json.dumps(manifest))
+        self._write_properties(order, inputs)
+        return n_updated
+
+    def _write_properties(self, order, inputs):
+        """Write the ``properties`` file describing the HiPS."""
+        healpix = _healpix()
+        cells = sorted({index for entry in inputs.values() for index in entry['tiles']})
+        lon, lat = healpix.healpix_to_lonlat(cells, 2**order, order='nested')
+        cells = SkyCoord(lon, lat)
+        # the direction of the mean of the unit vectors of the cells
+        x, y, z = cells.cartesian.xyz.value.mean(axis=1)
+        center = SkyCoord(np.arctan2(y, x), np.arctan2(z, np.hypot(x, y)), unit='rad')
+        fov = 2 * cells.separation(center).max().deg
+        fov = float(np.clip(fov + np.rad2deg(np.sqrt(np.pi / 3) / 2**order), 0, 180))
+
+        lows, highs = zip(*(entry['cut'] for entry in inputs.values()))
+        minima, maxima = zip(*(entry['data_range'] for entry in inputs.values()))
+        properties = {
+            'creator_did': f'ivo://mast-aladin/P/local/{self.directory.name}',
+            'obs_title': self.title,
+            'dataproduct_type': 'image',
+            'hips_version': '1.4',
+            'hips_builder': 'mast-aladin',
+            'hips_release_date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ'),
+            'hips_status': 'private master unclonable',
+            'hips_frame': 'equatorial',
+            'hips_order': order,
+            'hips_order_min': 0,
+            'hips_tile_width': self.tile_width,
+            'hips_tile_format': 'fits',
+            'hips_pixel_bitpix': -32,
+            'hips_pixel_cut': f'{min(lows):g} {max(highs):g}',
+            'hips_data_range': f'{min(minima):g} {max(maxima):g}',
+            'hips_initial_ra': f'{center.ra.deg:.6f}',
+            'hips_initial_dec': f'{center.dec.deg:.6f}',
+            'hips_initial_fov': f'{fov:.6f}',
+        }
+        (self.directory / 'properties').write_text(
+            ''.join(f'{key:<20}= {value}\n' for key, value in properties.items())
+        )
+
+
+# paths of the files of a HiPS that are served to Aladin Lite
+_SERVED_PATH = re.compile(r'/(properties|Moc\.fits|Norder\d+/(Allsky|Dir\d+/Npix\d+)\.fits)')
+
+
+class _HipsRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the tiles and properties of a HiPS to Aladin Lite, from any
+    origin. Any other path, e.g. the manifest of the inputs or a directory,
+    is not found.
+    """
+
+    def send_head(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if not _SERVED_PATH.fullmatch(path):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return None
+        return super().send_head()
+
+    def list_directory(self, path):
+        self.send_error(HTTPStatus.NOT_FOUND)
+        return None
+
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        # rebuilt tiles replace the tiles cached by the browser
+        self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class HipsServer:
+    """
+    Serve a HiPS directory over HTTP from the kernel, in a daemon thread.
+
+    The widget loads the tiles from the browser, so the server must be
+    reachable from it: by default, it listens on the local host, for
+    notebooks running on the same machine as the browser. On a remote
+    Jupyter server, the port can be exposed through a proxy (e.g.
+    jupyter-server-proxy) whose address is given as ``url``.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the HiPS.
+    host : str, optional
+        Host to listen on. Defaults to ``127.0.0.1``.
+    port : int, optional
+        Port to listen on. Defaults to 0, any free port.
+    url : str, optional
+        URL of the HiPS for the browser. Defaults to
+        ``http://{host}:{port}``.
+    """
+
+    def __init__(self, directory, host='127.0.0.1', port=0, url=None):
+        self.directory = Path(directory)
+        handler = functools.partial(_HipsRequestHandler, directory=str(self.directory))
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._url = url
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        """Port the server listens on."""
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        """URL of the HiPS for the browser."""
+        if self._url is not None:
+            return self._url
+        return f'http://{self._server.server_address[0]}:{self.port}'
+
+    def close(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
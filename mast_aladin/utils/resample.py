@@ -0,0 +1,264 @@
+"""
+Resample distorted images onto a linear (undistorted) celestial grid.
+
+Aladin Lite does not support SIP or other distortions of the FITS WCS, so
+`~mast_aladin.MastAladin.add_fits` drops them by default and overlays are
+misregistered on distorted frames. `resample_to_linear` instead resamples
+the image onto the grid of the same WCS without distortions.
+
+The pixel mapping from the linear grid to the image is computed exactly on
+a coarse grid of nodes, interpolated in between, and cached per WCS, and the
+image is sampled by bilinear interpolation in blocks of rows processed by a
+thread pool.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+__all__ = [
+    'MappingCache',
+    'linear_wcs',
+    'mapping_cache',
+    'resample_to_linear',
+]
+
+
+def linear_wcs(wcs):
+    """
+    Return the celestial WCS ``wcs`` without its distortions (SIP and
+    lookup tables).
+    """
+    linear = wcs.deepcopy()
+    linear.sip = None
+    linear.cpdis1 = linear.cpdis2 = None
+    linear.det2im1 = linear.det2im2 = None
+    linear.wcs.ctype = [ctype.replace('-SIP', '') for ctype in linear.wcs.ctype]
+    return linear
+
+
+def _linear_weights(coordinates, n_nodes):
+    """
+    Return the index of the node left of each of ``coordinates``, in node
+    units, and the weight of the node to its right.
+    """
+    left = np.minimum(coordinates.astype(np.intp), n_nodes - 2)
+    return left, (coordinates - left).astype(np.float32)
+
+
+def _interpolate_columns(nodes, node_step, n_cols):
+    """
+    Linearly interpolate ``nodes`` along the rows of nodes to every column.
+    """
+    left, weight = _linear_weights(np.arange(n_cols) / node_step, nodes.shape[-1])
+    nodes = nodes.astype(np.float32)
+    return nodes[..., left] + (nodes[..., left + 1] - nodes[..., left]) * weight
+
+
+def _interpolate_rows(columns, node_step, rows):
+    """
+    Linearly interpolate ``columns``, interpolated along the rows of nodes
+    by `_interpolate_columns`, to ``rows``.
+    """
+    left, weight = _linear_weights(rows / node_step, columns.shape[-2])
+    top = columns[..., left, :]
+    return top + (columns[..., left + 1, :] - top) * weight[:, None]
+
+
+def _bilinear_sample(data, x, y):
+    """
+    Sample ``data`` at the zero-based pixel coordinates ``x, y`` by bilinear
+    interpolation, with NaN outside of the image.
+    """
+    n_rows, n_cols = data.shape
+    outside = ~((x >= 0) & (x <= n_cols - 1) & (y >= 0) & (y <= n_rows - 1))
+    x = np.clip(x, 0, n_cols - 1, dtype=np.float32)
+    y = np.clip(y, 0, n_rows - 1, dtype=np.float32)
+    # the last pixels are interpolated from the pixels before them
+    x_floor = np.minimum(np.floor(x), n_cols - 2)
+    y_floor = np.minimum(np.floor(y), n_rows - 2)
+    wx = x - x_floor
+    wy = y - y_floor
+
+    flat = data.ravel()
+    index = y_floor.astype(np.intp) * n_cols + x_floor.astype(np.intp)
+    top = flat[index]
+    top += (flat[index + 1] - top) * wx
+    bottom = flat[index + n_cols]
+    bottom += (flat[index + n_cols + 1] - bottom) * wx
+    top += (bottom - top) * wy
+    top[outside] = np.nan
+    return top
+
+
+class MappingCache:
+    """
+    Bounded LRU cache of the pixel mappings computed by
+    `resample_to_linear`, keyed by the WCS and shape of the image.
+
+    Each mapping holds two float32 coordinates per output pixel, e.g. 128 MB
+    for a 4k x 4k image. The mappings stay in memory until they are evicted
+    or `clear` is called.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of mappings to keep. Defaults to 2.
+    """
+
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._mappings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._mappings)
+
+    def get(self, key):
+        with self._lock:
+            mapping = self._mappings.get(key)
+            if mapping is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._mappings.move_to_end(key)
+            return mapping
+
+    def put(self, key, mapping):
+        with self._lock:
+            self._mappings[key] = mapping
+            while len(self._mappings) > self.maxsize:
+                self._mappings.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached mappings and reset the hit/miss counters."""
+        with self._lock:
+            self._mappings.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+mapping_cache = MappingCache()
+
+
+def _cache_key(wcs, shape, node_step):
+    """
+    Return the key of the mapping of an image in a `MappingCache`.
+
+    The header of the WCS only names the lookup table distortions, so their
+    tables are hashed too.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for table in (wcs.cpdis1, wcs.cpdis2, wcs.det2im1, wcs.det2im2):
+        if table is None:
+            digest.update(b'-')
+            continue
+        digest.update(repr((table.crpix, table.crval, table.cdelt)).encode())
+        digest.update(np.ascontiguousarray(table.data, dtype=np.float32).view(np.uint8))
+    return wcs.to_header_string(relax=True), digest.hexdigest(), shape, node_step
+
+
+def _output_grid(wcs, linear, shape):
+    """
+    Return the offset of the linear grid that holds the whole distorted
+    image, relative to the image grid, and its shape.
+    """
+    n_rows, n_cols = shape
+    edge_x = np.concatenate([np.arange(n_cols), np.full(n_rows, n_cols - 1),
+                             np.arange(n_cols), np.zeros(n_rows)])
+    edge_y = np.concatenate([np.zeros(n_cols), np.arange(n_rows),
+                             np.full(n_cols, n_rows - 1), np.arange(n_rows)])
+    x, y = linear.world_to_pixel_values(*wcs.pixel_to_world_values(edge_x, edge_y))
+    start = np.floor([np.min(x), np.min(y)]).astype(int)
+    stop = np.ceil([np.max(x), np.max(y)]).astype(int) + 1
+    return start, tuple((stop - start)[::-1])
+
+
+def _mapping_nodes(wcs, linear, start, shape, node_step):
+    """
+    Return the (2, n_node_rows, n_node_cols) image pixel coordinates of
+    nodes every ``node_step`` pixels of the linear grid.
+    """
+    n_rows, n_cols = shape
+    node_x = np.arange(0, n_cols + node_step, node_step)
+    node_y = np.arange(0, n_rows + node_step, node_step)
+    grid_x, grid_y = np.meshgrid(node_x + start[0], node_y + start[1])
+
+    world = linear.pixel_to_world_values(grid_x, grid_y)
+    # exact, iterative inverse of the distortions, on the nodes only
+    return np.stack(wcs.all_world2pix(*world, 0, quiet=True))
+
+
+def resample_to_linear(
+        data, wcs, block_rows=256, workers=None, node_step=16, cache=True
+        ):
+    """
+    Resample a 2D image with a distorted WCS onto the grid of its WCS
+    without distortions.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray`
+        The 2D image.
+    wcs : `~astropy.wcs.WCS`
+        Celestial WCS of the image, with SIP or lookup table distortions.
+    block_rows : int, optional
+        Number of output rows resampled by each task.
+    workers : int, optional
+        Number of threads. Defaults to the number of CPUs.
+    node_step : int, optional
+        Spacing in pixels of the nodes where the pixel mapping is computed
+        exactly.
+    cache : bool or `MappingCache`, optional
+        Cache of the pixel mappings. `True` (default) uses the process-wide
+        `mapping_cache`, `False` disables caching.
+
+    Returns
+    -------
+    resampled : `~numpy.ndarray`
+        The float32 resampled image, large enough to hold the whole image,
+        with NaN outside of it.
+    linear : `~astropy.wcs.WCS`
+        WCS of ``resampled``, without distortions.
+    """
+    linear = linear_wcs(wcs)
+    if not wcs.has_distortion:
+        return np.asarray(data, dtype=np.float32), linear
+
+    if cache is True:
+        cache = mapping_cache
+    elif cache is False:
+        cache = None
+    key = _cache_key(wcs, data.shape, node_step)
+    cached = None if cache is None else cache.get(key)
+    if cached is None:
+        start, shape = _output_grid(wcs, linear, data.shape)
+        columns = _interpolate_columns(
+            _mapping_nodes(wcs, linear, start, shape, node_step), node_step, shape[1]
+        )
+        mapping = np.empty((2,) + shape, dtype=np.float32)
+    else:
+        start, mapping = cached
+
+    linear.wcs.crpix = linear.wcs.crpix - start
+    image = np.asarray(data, dtype=np.float32)
+    resampled = np.empty(mapping.shape[1:], dtype=np.float32)
+
+    def resample_block(block_start):
+        rows = np.arange(block_start, min(block_start + block_rows, len(resampled)))
+        block = slice(rows[0], rows[-1] + 1)
+        if cached is None:
+            mapping[:, block] = _interpolate_rows(columns, node_step, rows)
+        resampled[block] = _bilinear_sample(image, mapping[0, block], mapping[1, block])
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+        list(executor.map(resample_block, range(0, len(resampled), block_rows)))
+
+    if cached is None and cache is not None:
+        cache.put(key, (start, mapping))
+    return resampled, linear
@@ -8,15 +8,147 @@
 ###############################################################
 # Imports
 
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pysiaf
 from astropy.coordinates import SkyCoord
 from regions import CircleSkyRegion, PolygonSkyRegion
 ###############################################################
+# Process-wide cache of parsed SIAF files
+
+# Names accepted by pysiaf.Siaf that defineApertures can request
+JWST_SIAF_NAMES = ('FGS', 'MIRI', 'NIRCAM', 'NIRSPEC', 'NIRISS')
+SIAF_NAMES = ('ROMAN', 'HST') + JWST_SIAF_NAMES
+
+
+class SiafCache:
+    """
+    Bounded LRU cache of parsed `pysiaf.Siaf` objects.
+
+    Parsing a SIAF XML file is by far the most expensive part of building an
+    ``Exposure``, so parsed SIAFs are shared by everything in the process.
+    Entries are keyed by the upper-cased name passed to `pysiaf.Siaf`, i.e.
+    the telescope for Roman and HST and the instrument for JWST.
+
+    Note that the aperture objects are shared as well; callers must set the
+    attitude matrix on an aperture immediately before using it.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of parsed SIAFs to keep. The least recently used
+        entry is evicted when the cache is full. Default is
+        ``len(SIAF_NAMES)`` so that every SIAF fits.
+    """
+
+    def __init__(self, maxsize=len(SIAF_NAMES)):
+        if maxsize < 1:
+            raise ValueError(f"`maxsize` must be at least 1. Received {maxsize=}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._siafs = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._siafs)
+
+    def __contains__(self, name):
+        return self._key(name) in self._siafs
+
+    @staticmethod
+    def _key(name):
+        return str(name).upper()
+
+    def get(self, name):
+        """
+        Return the parsed SIAF for ``name``, parsing it on the first request.
+
+        Parameters
+        ----------
+        name : str
+            Telescope (Roman, HST) or JWST instrument name.
+
+        Returns
+        -------
+        `pysiaf.Siaf`
+        """
+        key = self._key(name)
+        with self._lock:
+            siaf = self._siafs.get(key)
+            if siaf is not None:
+                self.hits += 1
+                self._siafs.move_to_end(key)
+                return siaf
+
+            self.misses += 1
+            siaf = pysiaf.Siaf(name)
+            self._siafs[key] = siaf
+            while len(self._siafs) > self.maxsize:
+                self._siafs.popitem(last=False)
+            return siaf
+
+    def preload(self, *names):
+        """
+        Parse SIAFs ahead of time, e.g. to warm up a kernel before planning.
+
+        Parameters
+        ----------
+        *names : str
+            Telescope or JWST instrument names. ``'jwst'`` expands to all of
+            the JWST instruments. If no names are given, every SIAF used by
+            `defineApertures` is loaded.
+        """
+        if not names:
+            names = SIAF_NAMES
+        for name in names:
+            if self._key(name) == 'JWST':
+                for instrument in JWST_SIAF_NAMES:
+                    self.get(instrument)
+            else:
+                self.get(name)
+
+    def clear(self):
+        """Drop all cached SIAFs and reset the hit/miss counters."""
+        with self._lock:
+            self._siafs.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Return a dict with the cache statistics.
+        """
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._siafs),
+            maxsize=self.maxsize,
+            names=list(self._siafs),
+        )
+
+
+siaf_cache = SiafCache()
+
+
+def getSiaf(name):
+    """
+    Return the parsed SIAF for a telescope or JWST instrument from the
+    process-wide `siaf_cache`.
+    """
+    return siaf_cache.get(name)
+###############################################################
 # Take user input to create list of aperture siaf info and v2,v3 reference points
 
 
-def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
+def defineApertures(selectedTelescope, selectedInstrument, selectedAperture, siafLoader=None):
+
+    # siafLoader maps a telescope/instrument name to a SIAF-like object; by
+    # default SIAFs are parsed by pysiaf and shared through siaf_cache
+    if siafLoader is None:
+        siafLoader = getSiaf
 
     # Create lists of individual apertures that make up selected
     # instrument FOV and get v2,v3 of reference point
@@ -24,7 +156,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
     ref_aperture = None
 
     if selectedTelescope.lower() == 'roman':
-        telescopeSiaf = pysiaf.Siaf(selectedTelescope)
+        telescopeSiaf = siafLoader(selectedTelescope)
         if selectedInstrument.lower() == 'wfi':
             if selectedAperture.lower() == 'all':
                 apertureNames = [
@@ -65,7 +197,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
 
     elif selectedTelescope.lower() == 'jwst':
         if selectedInstrument.lower() == 'fgs':
-            telescopeSiaf = pysiaf.Siaf(selectedInstrument)
+            telescopeSiaf = siafLoader(selectedInstrument)
             if selectedAperture.lower() == 'all':
                 apertureNames = ['FGS1_FULL', 'FGS2_FULL']
                 V2Ref = +100.0
@@ -78,7 +210,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
         elif selectedInstrument.lower() == 'miri':
-            telescopeSiaf = pysiaf.Siaf(selectedInstrument)
+            telescopeSiaf = siafLoader(selectedInstrument)
             if selectedAperture.lower() == 'all':
                 apertureNames = ['MIRIM_FULL', 'MIRIM_MASKLYOT',
                                  'MIRIM_MASK1550', 'MIRIM_MASK1140', 'MIRIM_MASK1065']
@@ -92,7 +224,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
         elif selectedInstrument.lower() == 'nircam':
-            telescopeSiaf = pysiaf.Siaf(selectedInstrument)
+            telescopeSiaf = siafLoader(selectedInstrument)
             if selectedAperture.lower() == 'all':
                 apertureNames = [
                     'NRCA1_FULL', 'NRCA1_FULL', 'NRCA3_FULL',
@@ -109,7 +241,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
         elif selectedInstrument.lower() == 'nirspec':
-            telescopeSiaf = pysiaf.Siaf(selectedInstrument)
+            telescopeSiaf = siafLoader(selectedInstrument)
             if selectedAperture.lower() == 'all':
                 apertureNames = ['NRS_FULL_MSA1', 'NRS_FULL_MSA2', 'NRS_FULL_MSA3', 'NRS_FULL_MSA4',
                                  'NRS1_FULL', 'NRS2_FULL']
@@ -123,7 +255,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
         elif selectedInstrument.lower() == 'niriss':
-            telescopeSiaf = pysiaf.Siaf(selectedInstrument)
+            telescopeSiaf = siafLoader(selectedInstrument)
             if selectedAperture.lower() == 'all':
                 apertureNames = ['NIS_CEN', 'NIS_AMIFULL']
                 V2Ref = -300.0
@@ -136,26 +268,26 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
         elif selectedInstrument.lower() == 'all':
-            telescopeSiaf = pysiaf.Siaf('FGS')
+            telescopeSiaf = siafLoader('FGS')
             apertureNames = ['FGS1_FULL', 'FGS2_FULL']
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
-            telescopeSiaf = pysiaf.Siaf('MIRI')
+            telescopeSiaf = siafLoader('MIRI')
             apertureNames = ['MIRIM_FULL', 'MIRIM_MASKLYOT',
                              'MIRIM_MASK1550', 'MIRIM_MASK1140', 'MIRIM_MASK1065']
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
-            telescopeSiaf = pysiaf.Siaf('NIRCAM')
+            telescopeSiaf = siafLoader('NIRCAM')
             apertureNames = ['NRCA1_FULL', 'NRCA1_FULL', 'NRCA3_FULL', 'NRCA4_FULL', 'NRCA5_FULL',
                              'NRCB1_FULL', 'NRCB1_FULL', 'NRCB3_FULL', 'NRCB4_FULL', 'NRCB5_FULL']
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
-            telescopeSiaf = pysiaf.Siaf('NIRSPEC')
+            telescopeSiaf = siafLoader('NIRSPEC')
             apertureNames = ['NRS_FULL_MSA1', 'NRS_FULL_MSA2', 'NRS_FULL_MSA3', 'NRS_FULL_MSA4',
                              'NRS1_FULL', 'NRS2_FULL']
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
-            telescopeSiaf = pysiaf.Siaf('NIRISS')
+            telescopeSiaf = siafLoader('NIRISS')
             apertureNames = ['NIS_CEN', 'NIS_AMIFULL']
             for name in apertureNames:
                 apertureList.append(telescopeSiaf[name])
@@ -165,7 +297,7 @@ def defineApertures(selectedTelescope, selectedInstrument, selectedAperture):
             print('Unrecognized instrument')
 
     elif selectedTelescope.lower() == 'hst':
-        telescopeSiaf = pysiaf.Siaf(selectedTelescope)
+        telescopeSiaf = siafLoader(selectedTelescope)
         if selectedInstrument.lower() == 'acs':
             if selectedAperture.lower() == 'all':
                 apertureNames = ['JWFC1', 'JWFC2', 'JHRC', 'JSBC']
@@ -304,6 +436,7 @@ def getVertices(apertureSiaf):
 
 
 def computeStcsFootprint(apertureSiaf, skyRa, skyDec):
+    # one footprint per call: str.format is faster than the bulk format_stcs
     if apertureSiaf.AperShape == 'QUAD' or apertureSiaf.AperShape == 'RECT':
         apertureSregion = (
             'POLYGON ICRS {:.8f} {:.8f} {:.8f} {:.8f} '
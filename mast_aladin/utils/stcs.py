@@ -0,0 +1,223 @@
+"""
+Bulk STC-S parsing and formatting.
+
+The functions of this module convert whole columns of STC-S footprints to
+and from the flat arrays of a `~mast_aladin.utils.footprint_array.FootprintArray`
+with a handful of numpy operations, instead of one string operation per
+footprint: all strings are tokenized at once, the numbers are converted to
+floats in one call, and the formatted strings are produced by a single
+``%`` formatting of all coordinates.
+
+Only the ``POLYGON`` and ``CIRCLE`` shapes are supported. ``UNION`` and
+strings made of several shapes, such as the multi-polygon footprints of MAST
+products, give rows of several shapes. Coordinate frames and reference
+positions are ignored: coordinates are taken as ICRS, as Aladin Lite does.
+"""
+import re
+import warnings
+
+import numpy as np
+
+from mast_aladin.utils.footprint_array import CIRCLE, POLYGON, FootprintArray, _offsets
+
+__all__ = [
+    'format_stcs',
+    'parse_stcs',
+]
+
+# Words without effect on the shapes of a row
+_IGNORED = {
+    'UNION',
+    'ICRS', 'FK4', 'FK5', 'J2000', 'B1950', 'ECLIPTIC', 'GALACTIC', 'UNKNOWNFRAME',
+    'GEOCENTER', 'BARYCENTER', 'HELIOCENTER', 'TOPOCENTER', 'LSR', 'UNKNOWNREFPOS',
+    'SPHERICAL2', 'CARTESIAN2',
+}
+
+# The rows are joined with the ``INF`` separator, and the shape keywords
+# replaced by the ``-INF`` and ``nan`` sentinels, so that all the tokens can
+# be read by one call to `numpy.fromstring`. The input is upper cased first,
+# so the lower case sentinel cannot come from the input.
+_ROW_SEPARATOR = 'INF'
+_SENTINELS = {'POLYGON': b'-INF', 'CIRCLE': b'nan'}
+_NUMBER_CHARACTERS = b' 0123456789.+-EINFna'
+_WORD_CHARACTER = re.compile(rb'[^ 0-9.+\-EINFna]')
+_SPACES = bytes.maketrans(b'()\t\n\r', b'     ')
+
+_POLYGON_PREFIX = 'POLYGON ICRS '
+_POLYGON_COORDINATE = '%.8f '
+_CIRCLE_FORMAT = 'CIRCLE ICRS %r %r %r '
+
+
+def _strings(strings):
+    """Return the STC-S strings as a list of `str`."""
+    if isinstance(strings, np.ma.MaskedArray):
+        strings = strings.filled('')
+    if isinstance(strings, np.ndarray) and strings.dtype.kind in 'US':
+        return strings.astype(str).tolist()
+    strings = list(strings)
+    if all(isinstance(string, str) for string in strings):
+        return strings
+    return [str(string) for string in strings]
+
+
+def _word(text, position):
+    """Return the token of ``text`` at ``position``, and the position after it."""
+    start = text.rfind(b' ', 0, position) + 1
+    stop = text.find(b' ', position)
+    return text[start:stop].decode(), stop
+
+
+def _tokenize(strings):
+    """
+    Read the strings as one array of floats, with the ``inf``, ``-inf`` and
+    ``nan`` sentinels for the row ends, polygons and circles.
+    """
+    text = f' {_ROW_SEPARATOR} '.join(strings).upper() + f' {_ROW_SEPARATOR} '
+    try:
+        text = b' ' + text.encode('ascii').translate(_SPACES)
+    except UnicodeEncodeError:
+        raise ValueError("STC-S strings must only contain ASCII characters.") from None
+
+    # each distinct word is replaced in all rows at once, so that there are
+    # only a few passes over the text
+    while text.translate(None, _NUMBER_CHARACTERS):
+        word, stop = _word(text, _WORD_CHARACTER.search(text).start())
+        if word in _SENTINELS:
+            replacement = _SENTINELS[word]
+        elif word in _IGNORED:
+            replacement = b''
+        else:
+            raise ValueError(f"Unsupported STC-S token {word!r}.")
+
+        # shapes are usually followed by the same frame in all rows
+        following, _ = _word(text, stop + 1)
+        if replacement and following in _IGNORED:
+            word = f'{word} {following}'
+        text = text.replace(f' {word} '.encode(), b' ' + replacement + b' ')
+
+    with warnings.catch_warnings():
+        # raised by older versions of numpy for tokens that are not numbers
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            tokens = np.fromstring(text, sep=' ')
+        except (DeprecationWarning, ValueError):
+            raise ValueError("Invalid STC-S coordinates.") from None
+    if np.count_nonzero(tokens == np.inf) != len(strings):
+        raise ValueError("Invalid STC-S coordinates.")
+    return tokens
+
+
+def parse_stcs(strings):
+    """
+    Parse STC-S footprints in bulk.
+
+    Parameters
+    ----------
+    strings : iterable of str
+        The STC-S strings, e.g. the ``s_region`` column of a table. Empty
+        strings give rows without shapes.
+
+    Returns
+    -------
+    `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints, with one row per string.
+
+    Raises
+    ------
+    ValueError
+        If a string contains an unsupported shape or operator, coordinates
+        outside of a shape, or a shape with the wrong number of coordinates.
+    """
+    if isinstance(strings, FootprintArray):
+        return strings.copy()
+    strings = _strings(strings)
+    tokens = _tokenize(strings)
+
+    is_row = tokens == np.inf
+    is_polygon = tokens == -np.inf
+    is_circle_token = np.isnan(tokens)
+    is_shape = is_polygon | is_circle_token
+    is_number = ~(is_shape | is_row)
+    is_circle = is_circle_token[is_shape]
+
+    # each coordinate belongs to the last shape before it, in the same row
+    shape_of_token = np.cumsum(is_shape) - 1
+    row_of_token = np.cumsum(is_row) - is_row
+    shape_rows = row_of_token[is_shape]
+    number_shapes = shape_of_token[is_number]
+    if len(number_shapes) and (
+        number_shapes[0] < 0
+        or np.any(row_of_token[is_number] != shape_rows[np.maximum(number_shapes, 0)])
+    ):
+        raise ValueError("STC-S coordinates must follow a shape keyword.")
+    values = tokens[is_number]
+
+    n_values = np.bincount(number_shapes, minlength=len(is_circle))
+    if np.any(n_values[is_circle] != 3):
+        raise ValueError("STC-S circles must have 3 coordinates.")
+    n_polygon_values = n_values[~is_circle]
+    if np.any((n_polygon_values < 6) | (n_polygon_values % 2)):
+        raise ValueError("STC-S polygons must have an even number of at least 6 coordinates.")
+
+    # the third coordinate of a circle is its radius, the others vertices
+    position = np.arange(len(values)) - np.repeat(_offsets(n_values)[:-1], n_values)
+    is_radius = is_circle[number_shapes] & (position == 2)
+    radii = np.full(len(is_circle), np.nan)
+    radii[is_circle] = values[is_radius]
+
+    return FootprintArray(
+        np.where(is_circle, CIRCLE, POLYGON),
+        _offsets(np.where(is_circle, 1, n_values // 2)),
+        values[~is_radius].reshape(-1, 2),
+        radii,
+        _offsets(np.bincount(shape_rows, minlength=len(strings))),
+    )
+
+
+def format_stcs(footprints):
+    """
+    Format footprints to STC-S strings in bulk.
+
+    Polygons are formatted as by
+    `~mast_aladin.utils.selectSIAF.computeStcsFootprint`, with 8 decimals,
+    and circles with the shortest representation of their coordinates. The
+    shapes of a row are concatenated.
+
+    Parameters
+    ----------
+    footprints : `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints.
+
+    Returns
+    -------
+    `~numpy.ndarray`
+        (n_rows,) array of STC-S strings, empty for rows without shapes.
+    """
+    n_rows = len(footprints)
+    if not n_rows:
+        return np.zeros(0, dtype='U1')
+
+    # one format per shape kind and number of vertices, then the row
+    # separators, which cannot be in a formatted string
+    n_vertices = np.diff(footprints.vertex_offsets)
+    is_circle = footprints.kinds == CIRCLE
+    shape_formats, shape_format_indices = np.unique(
+        np.where(is_circle, -1, n_vertices), return_inverse=True
+    )
+    formats = [
+        _CIRCLE_FORMAT if n < 0 else _POLYGON_PREFIX + _POLYGON_COORDINATE * (2 * n)
+        for n in shape_formats
+    ] + ['\n']
+    sequence = np.insert(
+        shape_format_indices.reshape(-1), footprints.row_offsets[1:-1], len(formats) - 1
+    )
+    template = ''.join(np.array(formats, dtype=object)[sequence])
+
+    # the circle radii are formatted after their center
+    values = footprints.vertices
+    if np.any(is_circle):
+        circle_vertices = footprints.vertex_offsets[:-1][is_circle]
+        values = np.insert(
+            values.reshape(-1), 2 * circle_vertices + 2, footprints.radii[is_circle]
+        )
+    return np.array((template % tuple(values.reshape(-1).tolist())).split('\n'), dtype=str)
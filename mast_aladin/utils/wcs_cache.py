@@ -0,0 +1,217 @@
+"""
+Disk-backed cache of the FITS WCS headers that approximate GWCS objects.
+
+`gwcs.wcs.WCS.to_fits` fits a polynomial (SIP) approximation of a GWCS,
+which is the dominant cost of `~mast_aladin.MastAladin.add_asdf`. The
+resulting headers are stored on disk, so that loading the same file again,
+in this session or a later one, skips the fit.
+
+Headers are keyed by the path, modification time and size of the file the
+GWCS was read from, or by a hash of the serialized GWCS for GWCS objects not
+read from a file, and by the options of the fit.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from pathlib import Path
+
+from astropy.config import get_cache_dir_path
+from astropy.io import fits
+
+__all__ = [
+    'FitsHeaderCache',
+    'default_cache_dir',
+    'fits_header_cache',
+    'gwcs_to_fits_header',
+]
+
+
+def default_cache_dir():
+    """
+    Return the default directory of the FITS header cache.
+    """
+    return get_cache_dir_path('mast_aladin') / 'wcs_headers'
+
+
+class FitsHeaderCache:
+    """
+    Size-bounded LRU cache of FITS headers on disk, one file per header.
+
+    Parameters
+    ----------
+    directory : str or Path, optional
+        Directory of the cache, created on the first write. Defaults to
+        `default_cache_dir`.
+    max_bytes : int, optional
+        Maximum total size of the cached headers. The least recently used
+        headers are evicted when it is exceeded. Defaults to 20 MB, about
+        a thousand headers with SIP coefficients.
+    """
+
+    def __init__(self, directory=None, max_bytes=20 * 2**20):
+        self.directory = Path(default_cache_dir() if directory is None else directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._files())
+
+    def _path(self, key):
+        return self.directory / f'{key}.hdr'
+
+    def _files(self):
+        if not self.directory.is_dir():
+            return []
+        return list(self.directory.glob('*.hdr'))
+
+    @staticmethod
+    def key(gwcs, path=None, **fit_options):
+        """
+        Return the cache key of the header approximating ``gwcs``.
+
+        Parameters
+        ----------
+        gwcs : `gwcs.wcs.WCS`
+            The GWCS.
+        path : str or Path, optional
+            File the GWCS was read from. If given, the key is built from the
+            path, modification time and size of the file instead of from
+            the serialized GWCS.
+        **fit_options
+            Keyword arguments of `gwcs.wcs.WCS.to_fits`, e.g. ``degree`` or
+            ``npoints``.
+
+        Returns
+        -------
+        str
+        """
+        import gwcs as gwcs_package
+
+        if path is not None:
+            stat = os.stat(path)
+            source = ['file', str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size]
+        else:
+            import asdf
+
+            serialized = io.BytesIO()
+            asdf.AsdfFile({'wcs': gwcs}).write_to(serialized)
+            source = ['gwcs', hashlib.sha256(serialized.getvalue()).hexdigest()]
+
+        description = json.dumps(
+            [source, gwcs_package.__version__, sorted(fit_options.items())], default=repr
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Return the header cached under ``key``, or `None`.
+        """
+        path = self._path(key)
+        try:
+            header = fits.Header.fromstring(path.read_bytes().decode('ascii'))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # the modification time orders the headers for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return header
+
+    def put(self, key, header):
+        """
+        Cache ``header`` under ``key``, and evict the least recently used
+        headers beyond ``max_bytes``.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # written to a temporary file first, so that concurrent readers never
+        # see a partial header
+        temporary = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        temporary.write_bytes(header.tostring().encode('ascii'))
+        os.replace(temporary, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for path in self._files():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        """Delete all cached headers and reset the hit/miss counters."""
+        for path in self._files():
+            path.unlink(missing_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """
+        Return a dict with the cache statistics.
+        """
+        files = self._files()
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(files),
+            bytes=sum(path.stat().st_size for path in files),
+            max_bytes=self.max_bytes,
+            directory=str(self.directory),
+        )
+
+
+fits_header_cache = FitsHeaderCache()
+
+
+def gwcs_to_fits_header(gwcs, path=None, cache=True, **fit_options):
+    """
+    Return the FITS header approximating a GWCS, from the cache when
+    possible.
+
+    Parameters
+    ----------
+    gwcs : `gwcs.wcs.WCS`
+        The GWCS.
+    path : str or Path, optional
+        File the GWCS was read from, see `FitsHeaderCache.key`.
+    cache : bool or `FitsHeaderCache`, optional
+        Cache to use. `True` (default) uses the process-wide
+        `fits_header_cache`, `False` always fits the GWCS.
+    **fit_options
+        Keyword arguments of `gwcs.wcs.WCS.to_fits`, e.g. ``degree`` (the
+        degree of the SIP polynomials) or ``npoints`` (the number of points
+        of the fitting grid along each axis), which are part of the key.
+
+    Returns
+    -------
+    `~astropy.io.fits.Header`
+    """
+    if cache is False:
+        return fits.Header(gwcs.to_fits(**fit_options)[0])
+    if cache is True:
+        cache = fits_header_cache
+
+    key = cache.key(gwcs, path, **fit_options)
+    header = cache.get(key)
+    if header is None:
+        header = fits.Header(gwcs.to_fits(**fit_options)[0])
+        cache.put(key, header)
+    return header
@@ -0,0 +1,269 @@
+import logging
+import threading
+
+import numpy as np
+
+from mast_aladin.utils.footprint_array import FootprintArray
+from mast_aladin.utils.footprint_index import (
+    FootprintIndex, _angles, coverage_moc, viewport_cap,
+)
+from mast_aladin.utils.hips import _healpix
+from mast_aladin.windowed_image import _VIEW_TRAITS, _call_later
+
+__all__ = [
+    'ViewportFootprints',
+]
+
+log = logging.getLogger(__name__)
+
+
+class ViewportFootprints:
+    """
+    Footprints of a large table shown in a mast-aladin widget by sending
+    only the footprints around the current viewport.
+
+    The footprints are indexed by `~mast_aladin.utils.footprint_index.FootprintIndex`,
+    and the ones whose bounding caps intersect a cap around the viewport,
+    with a margin, are sent as one overlay layer. When the view changes,
+    the layer is replaced after ``delay`` seconds without further changes,
+    unless it still covers the viewport and the view was not zoomed in by
+    more than a factor 2. The kernel keeps all the footprints, while the
+    widget only holds the ones on screen. Instances are created by
+    `~mast_aladin.MastAladin.load_table` for large tables.
+
+    With ``lod``, views with too many footprints to draw are summarized: if
+    the footprints around the viewport have more than ``max_vertices``
+    vertices, or the view is wider than ``lod_fov``, the layer is a MOC of
+    the HEALPix cells they cover, see
+    `~mast_aladin.utils.footprint_index.coverage_moc`, with at most
+    ``max_vertices / 4`` cells, and cells of at least 1/128 of the view. The
+    exact footprints are drawn again once the view is zoomed in enough.
+
+    Parameters
+    ----------
+    aladin : `~mast_aladin.MastAladin`
+        The widget showing the footprints.
+    stcs : sequence of str or `~mast_aladin.utils.footprint_array.FootprintArray`
+        The footprints of the rows of the table.
+    delay : float, optional
+        Time in seconds without view changes before the footprints are
+        updated. Defaults to 0.3.
+    margin : float, optional
+        Fraction of the viewport radius added around it. Defaults to 0.25.
+    name : str, optional
+        Name of the overlay layer. Defaults to ``footprints``.
+    overlay_options : dict, optional
+        The overlay options of the footprints. See `Aladin Lite's graphic
+        overlay options <https://cds-astro.github.io/aladin-lite/A.html>`_
+    collapse_duplicates : bool, optional
+        If `True`, draw the footprints of rows with the same footprint once,
+        see `~mast_aladin.footprint_upload.FootprintUpload`. Defaults to False.
+    tolerance : float, optional
+        Rounding of the coordinates in degrees when comparing footprints.
+        Defaults to 1e-5 degrees.
+    lod : bool, optional
+        If `True`, summarize the footprints of wide views by their coverage.
+        Requires astropy-healpix. Defaults to False.
+    max_vertices : int, optional
+        Maximum number of vertices drawn at once with ``lod``. Defaults to
+        100000.
+    lod_fov : float, optional
+        Size of the view in degrees, along its diagonal, above which the
+        footprints are always summarized with ``lod``. Defaults to `None`, which only summarizes
+        views with more than ``max_vertices`` vertices.
+
+    Raises
+    ------
+    ValueError
+        If the footprints are not STC-S polygons and circles.
+    ImportError
+        If ``lod`` is set and astropy-healpix is not installed.
+    """
+
+    # MOC options of the coverage of the footprints, with the color of the
+    # footprints if it is set
+    coverage_options = {'fill': True, 'opacity': 0.3}
+
+    def __init__(
+            self, aladin, stcs, delay=0.3, margin=0.25, name='footprints',
+            overlay_options=None, collapse_duplicates=False, tolerance=1e-5,
+            lod=False, max_vertices=100_000, lod_fov=None
+            ):
+        if lod:
+            _healpix()
+        footprints = stcs if isinstance(stcs, FootprintArray) else (
+            FootprintArray.from_stcs(stcs)
+        )
+        strings = None if isinstance(stcs, FootprintArray) else np.asarray(stcs)
+
+        self.n_rows = len(footprints)
+        self.row_footprints = np.arange(self.n_rows)
+        if collapse_duplicates:
+            rows, self.row_footprints = footprints.unique(tolerance)
+            footprints = footprints.take(rows)
+            strings = None if strings is None else strings[rows]
+
+        self.aladin = aladin
+        self.footprints = footprints
+        self.delay = delay
+        self.margin = margin
+        self.overlay_options = dict(overlay_options or {})
+        self.overlay_options['name'] = aladin._overlay_manager.make_unique_name(name)
+        self.lod = lod
+        self.max_vertices = max_vertices
+        self.lod_fov = lod_fov
+        self.index = FootprintIndex(footprints)
+        # the footprints in the widget, the cap they cover, and whether they
+        # are shown by their coverage
+        self.visible = np.zeros(0, dtype=np.int64)
+        self.cap = None
+        self.coverage = False
+
+        self._strings = strings
+        self._n_vertices = np.diff(footprints.vertex_offsets[footprints.row_offsets])
+        self._timer = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.aladin.observe(self._schedule_refresh, _VIEW_TRAITS)
+        self.refresh()
+
+    @property
+    def name(self):
+        """Name of the overlay layer."""
+        return self.overlay_options['name']
+
+    def footprint_rows(self, footprint):
+        """Return the indices of the rows drawn with the footprint ``footprint``."""
+        return np.flatnonzero(self.row_footprints == footprint)
+
+    def row_overlay(self, row):
+        """
+        Return the name of the overlay layer with the footprint of row
+        ``row``, or `None` if it is not in the widget or only its coverage is.
+        """
+        if self.coverage:
+            return None
+        footprint = self.row_footprints[row]
+        index = np.searchsorted(self.visible, footprint)
+        if index < len(self.visible) and self.visible[index] == footprint:
+            return self.name
+        return None
+
+    def _schedule_refresh(self, change=None):
+        """
+        Update the footprints once the view has not changed for ``delay``
+        seconds.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = _call_later(self.delay, self.refresh)
+
+    def _covers(self, center, radius):
+        """
+        Return whether the footprints in the widget cover the cap of
+        ``center`` and ``radius``, at most zoomed in by a factor 2, and are
+        shown as they would be for that view, by their coverage or not.
+        """
+        if self.cap is None:
+            return False
+        cap_center, cap_radius = self.cap
+        if not (
+            _angles(center, cap_center) + radius <= cap_radius
+            and cap_radius <= 2 * (1 + self.margin) * radius
+        ):
+            return False
+        if not self.lod:
+            return True
+        visible = self.index.query(center, self._query_radius(radius))
+        return self._summarize(visible, radius) == self.coverage
+
+    def _query_radius(self, radius):
+        """Radius of the cap of the footprints sent for a viewport of ``radius``."""
+        return min(180., radius * (1 + self.margin))
+
+    def _stcs(self, footprints):
+        if self._strings is None:
+            return self.footprints.take(footprints).to_stcs().tolist()
+        return self._strings[footprints].tolist()
+
+    def _summarize(self, visible, radius):
+        """Return whether to show the coverage of the footprints ``visible``."""
+        return self.lod and bool(
+            (self.lod_fov is not None and 2 * radius > self.lod_fov)
+            or self._n_vertices[visible].sum() > self.max_vertices
+        )
+
+    def _send(self, visible, coverage, radius):
+        if coverage:
+            moc = coverage_moc(
+                self.footprints.take(visible), max(1, self.max_vertices // 4),
+                min_size=2 * radius / 128
+            )
+            options = dict(self.coverage_options, name=self.name)
+            if 'color' in self.overlay_options:
+                options.setdefault('color', self.overlay_options['color'])
+            self.aladin.add_moc(moc, **options)
+            (order, cells), = moc.items()
+            log.info(
+                "Sent the coverage of %d footprints in %d cells of order %s",
+                len(visible), len(cells), order
+            )
+        else:
+            self.aladin.add_graphic_overlay_from_stcs(
+                self._stcs(visible), **self.overlay_options
+            )
+            log.info(
+                "Sent %d of %d footprints around the viewport", len(visible), len(self.index)
+            )
+
+    def refresh(self, force=False):
+        """
+        Send the footprints around the current viewport, if the footprints
+        in the widget do not cover it or ``force`` is `True`.
+
+        Returns
+        -------
+        bool
+            Whether the footprints in the widget were replaced.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            viewport = viewport_cap(self.aladin)
+            if viewport is None:
+                return False
+            center, radius = viewport
+            if not force and self._covers(center, radius):
+                return False
+
+            viewport_radius = radius
+            radius = self._query_radius(radius)
+            visible = self.index.query(center, radius)
+            coverage = self._summarize(visible, viewport_radius)
+            if self.name in self.aladin._overlay_manager:
+                self.aladin.remove_overlay(self.name)
+            if len(visible):
+                self._send(visible, coverage, radius)
+            self.visible = visible
+            self.cap = center, radius
+            self.coverage = coverage
+            return True
+
+    def close(self, remove=False):
+        """
+        Stop updating the footprints.
+
+        Parameters
+        ----------
+        remove : bool, optional
+            If `True`, also remove the overlay layer from the widget.
+        """
+        self.aladin.unobserve(self._schedule_refresh, _VIEW_TRAITS)
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            self._closed = True
+            if remove and self.name in self.aladin._overlay_manager:
+                self.aladin.remove_overlay(self.name)
+            self.visible = np.zeros(0, dtype=np.int64)
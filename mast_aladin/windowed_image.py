@@ -0,0 +1,235 @@
+import itertools
+import logging
+import threading
+
+import numpy as np
+from ipyaladin.utils.exceptions import WidgetNotReadyError, WidgetReducedError
+
+from mast_aladin.utils.fits_ingest import (
+    cutout, image_payload, viewport_window, window_wcs,
+)
+
+__all__ = [
+    'WindowedImage',
+]
+
+log = logging.getLogger(__name__)
+
+# numbers the image layers of windowed images
+_windowed_layers = itertools.count(1)
+
+# traits of the widget that change its viewport. `_wcs` is reset when an
+# image is sent and only holds the new viewport once the widget has sent it
+# back, and `_is_reduced` is unset when the widget is scrolled back into view
+_VIEW_TRAITS = ['_target', '_fov', '_wcs', '_is_reduced']
+
+
+class _KernelTimer:
+    """A cancellable call of ``callback`` on the IO loop of the kernel."""
+
+    def __init__(self, io_loop, delay, callback):
+        self._io_loop = io_loop
+        self._timeout = io_loop.call_later(delay, callback)
+
+    def cancel(self):
+        self._io_loop.remove_timeout(self._timeout)
+
+
+def _call_later(delay, callback):
+    """
+    Call ``callback`` after ``delay`` seconds on the IO loop of the kernel,
+    which sends the comm messages of the widgets, or on a timer thread
+    outside of a kernel. Returns an object with a ``cancel`` method.
+    """
+    try:
+        from IPython import get_ipython
+    except ImportError:
+        io_loop = None
+    else:
+        io_loop = getattr(getattr(get_ipython(), 'kernel', None), 'io_loop', None)
+    if io_loop is not None:
+        return _KernelTimer(io_loop, delay, callback)
+
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class WindowedImage:
+    """
+    An image larger than the screen, shown in a mast-aladin widget by
+    sending only a cutout of the current viewport.
+
+    The cutout covers the viewport with a margin, binned by block means to
+    about the resolution of the screen. When the view changes, it is
+    replaced by a new cutout, after ``delay`` seconds without further
+    changes, unless the previous one still covers the viewport at the
+    right resolution. Instances are created by
+    `~mast_aladin.MastAladin.add_fits` and `~mast_aladin.MastAladin.add_asdf`
+    with ``windowed=True``.
+
+    Parameters
+    ----------
+    aladin : `~mast_aladin.MastAladin`
+        The widget showing the image.
+    data : `~numpy.ndarray`
+        The 2D image, which can be memory-mapped.
+    wcs : `~astropy.wcs.WCS`
+        Celestial WCS of the image.
+    scaling : dict, optional
+        BSCALE, BZERO and BLANK keywords of raw ``data``.
+    image_options : dict, optional
+        The options for the image layer. Every cutout replaces the previous
+        one in the layer named ``image_options['name']``, which defaults to
+        ``windowed_image_NNN``.
+    delay : float, optional
+        Time in seconds without view changes before a new cutout is sent.
+        Defaults to 0.3.
+    margin : float, optional
+        Fraction of the viewport size added on each side of the cutouts.
+        Defaults to 0.25.
+    encoding : {'float32', 'int16', 'uint8'}, optional
+        Reduced precision encoding of the cutouts, see
+        `~mast_aladin.utils.fits_ingest.image_payload`.
+    clip_percentiles : tuple of float, optional
+        Clipping percentiles of the integer encodings.
+    file : `~astropy.io.fits.HDUList` or `~roman_datamodels.datamodels.DataModel`, optional
+        Open file ``data`` is read from, closed by `close`.
+    """
+
+    def __init__(
+            self, aladin, data, wcs, scaling=None, image_options=None,
+            delay=0.3, margin=0.25, encoding=None, clip_percentiles=(0.5, 99.5),
+            file=None
+            ):
+        if data.ndim != 2:
+            raise ValueError(
+                f"Windowed images must be 2D, got an image with {data.ndim} dimensions."
+            )
+
+        self.aladin = aladin
+        self.data = data
+        self.wcs = wcs
+        self.scaling = scaling or {}
+        self.image_options = dict(image_options or {})
+        self.image_options.setdefault(
+            'name', f'windowed_image_{next(_windowed_layers):03d}'
+        )
+        self.delay = delay
+        self.margin = margin
+        self.encoding = encoding
+        self.clip_percentiles = clip_percentiles
+        self.window = None
+
+        self._file = file
+        self._timer = None
+        self._lock = threading.Lock()
+
+        self.aladin.observe(self._schedule_refresh, _VIEW_TRAITS)
+        self.refresh()
+
+    @property
+    def name(self):
+        """Name of the image layer."""
+        return self.image_options['name']
+
+    def _schedule_refresh(self, change=None):
+        """
+        Refresh the cutout once the view has not changed for ``delay``
+        seconds.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = _call_later(self.delay, self.refresh)
+
+    def _viewport(self):
+        """
+        Return the viewport corners in image pixels and the viewport shape in
+        screen pixels, or `None` while the widget has no viewport, e.g.
+        before it is shown or while it is scrolled out of view.
+        """
+        viewport_header = self.aladin._wcs
+        if not viewport_header:
+            return None
+
+        try:
+            vertices = self.aladin.get_viewport_region().vertices
+        except (WidgetNotReadyError, WidgetReducedError) as err:
+            # retried on the next view change
+            log.debug("No viewport for image %s: %s", self.name, err)
+            return None
+        corners = np.column_stack(self.wcs.world_to_pixel_values(vertices.ra.deg, vertices.dec.deg))
+        return corners, (viewport_header['NAXIS2'], viewport_header['NAXIS1'])
+
+    def _covers(self, window, corners):
+        """
+        Return whether ``window`` is the current window or the current window
+        covers ``corners`` at the same resolution.
+        """
+        if self.window is None:
+            return False
+        if window == self.window:
+            return True
+
+        x0, y0, nx, ny, factor = self.window
+        edges = corners + 0.5
+        return bool(
+            window[-1] == factor
+            and np.all(np.isfinite(edges))
+            and np.all(edges >= [x0, y0])
+            and np.all(edges <= [x0 + nx * factor, y0 + ny * factor])
+        )
+
+    def refresh(self, force=False):
+        """
+        Send a new cutout of the current viewport, if the current cutout
+        does not cover it or ``force`` is `True`.
+
+        Returns
+        -------
+        bool
+            Whether a cutout was sent.
+        """
+        with self._lock:
+            if self.data is None:
+                # closed
+                return False
+            viewport = self._viewport()
+            if viewport is None:
+                return False
+            corners, viewport_shape = viewport
+
+            window = viewport_window(self.data.shape, corners, viewport_shape, self.margin)
+            if not force and self._covers(window, corners):
+                return False
+
+            payload = image_payload(
+                cutout(self.data, window, self.scaling),
+                window_wcs(self.wcs, window).to_header(),
+                encoding=self.encoding, percentiles=self.clip_percentiles,
+            )
+            log.info(
+                "Sent a %d x %d cutout binned by %d of image %s (%d bytes)",
+                window[2], window[3], window[-1], self.name, len(payload)
+            )
+            self.window = window
+            self.aladin._forget_layer(self.name)
+            self.aladin._send_fits_payload(payload, self.image_options)
+            return True
+
+    def close(self):
+        """
+        Stop updating the cutouts, and close the file of the image if it
+        was opened by `~mast_aladin.MastAladin.add_fits` or
+        `~mast_aladin.MastAladin.add_asdf`. The last cutout
+        stays in the widget.
+        """
+        self.aladin.unobserve(self._schedule_refresh, _VIEW_TRAITS)
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            self.data = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None